@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Matrix Synapse Admin Inventory Export
+
+This script walks every user, room and media item through the Synapse admin
+list APIs and streams them out as NDJSON, one JSON object per line.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import collections
+import urllib.request
+import urllib.parse
+import urllib.error
+import concurrent.futures
+from typing import Dict, Any, Optional, Iterator, Iterable, Callable, List, TextIO, TypeVar
+
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+DEFAULT_PAGE_SIZE = 500
+DEFAULT_WORKERS = 16
+
+
+class AdminAPIError(Exception):
+    """Non-2xx response from the admin API"""
+    
+    def __init__(self, status: int, errcode: str, message: str):
+        super().__init__(f"HTTP {status} {errcode}: {message}")
+        self.status = status
+        self.errcode = errcode
+        self.retry_after: Optional[float] = None
+
+
+class SynapseAdminClient:
+    """
+    Minimal admin API client on urllib.
+    
+    Safe to share between threads: every request opens its own connection, so
+    concurrency comes from the worker pool rather than from connection reuse.
+    Rate-limited (429) requests are retried after the server's retry_after_ms.
+    """
+    
+    def __init__(self, synapse_url: str, access_token: str, timeout: float = 30, max_retries: int = 5):
+        self.synapse_url = synapse_url.rstrip('/')
+        self.access_token = access_token
+        self.timeout = timeout
+        self.max_retries = max_retries
+        
+    @classmethod
+    def login(cls, synapse_url: str, username: str, password: str, **kwargs) -> 'SynapseAdminClient':
+        """
+        Log in with a password and return a client using the new access token.
+        
+        Args:
+            synapse_url: Base URL of the Synapse server
+            username: Admin username (localpart or full user ID)
+            password: Admin password
+            
+        Returns:
+            SynapseAdminClient for the admin user
+        """
+        body = json.dumps({"type": "m.login.password", "user": username, "password": password}).encode('utf-8')
+        req = urllib.request.Request(
+            f"{synapse_url.rstrip('/')}/_matrix/client/r0/login",
+            data=body,
+            headers={'Content-Type': 'application/json'}
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=30) as response:
+                return cls(synapse_url, json.loads(response.read())["access_token"], **kwargs)
+        except urllib.error.HTTPError as e:
+            raise _api_error(e) from None
+            
+    def request(self, method: str, path: str, params: Optional[Dict[str, Any]] = None,
+                body: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Send an authenticated admin API request.
+        
+        Args:
+            method: HTTP method
+            path: Path below the server root, e.g. /_synapse/admin/v2/users
+            params: Query parameters
+            body: JSON request body
+            
+        Returns:
+            Decoded JSON response
+        """
+        url = f"{self.synapse_url}{path}"
+        if params:
+            url += "?" + urllib.parse.urlencode({k: v for k, v in params.items() if v is not None})
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        
+        for attempt in itertools.count():
+            req = urllib.request.Request(url, data=data, method=method, headers={
+                'Authorization': f"Bearer {self.access_token}",
+                'Content-Type': 'application/json'
+            })
+            try:
+                with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                    return json.loads(response.read() or b'{}')
+            except urllib.error.HTTPError as e:
+                error = _api_error(e)
+                if e.code != 429 or attempt >= self.max_retries:
+                    raise error from None
+                time.sleep(error.retry_after if error.retry_after is not None else 2 ** attempt)
+                
+    def get(self, path: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """GET an admin API path"""
+        return self.request("GET", path, params=params)
+
+
+def _api_error(e: urllib.error.HTTPError) -> AdminAPIError:
+    """Turn a urllib HTTPError into an AdminAPIError, keeping retry_after_ms"""
+    try:
+        data = json.loads(e.read() or b'{}')
+    except ValueError:
+        data = {}
+    error = AdminAPIError(e.code, data.get('errcode', 'M_UNKNOWN'), data.get('error', str(e.reason)))
+    if 'retry_after_ms' in data:
+        error.retry_after = data['retry_after_ms'] / 1000
+    return error
+
+
+def paginate(client: SynapseAdminClient, path: str, items_key: str,
+             params: Optional[Dict[str, Any]] = None, page_size: int = DEFAULT_PAGE_SIZE) -> Iterator[Dict[str, Any]]:
+    """
+    Yield every item of an admin list endpoint, following from/next_token.
+    
+    Args:
+        client: Admin API client
+        path: List endpoint path
+        items_key: Key of the item list in each page ("users", "rooms", "media")
+        params: Extra query parameters
+        page_size: Items requested per page
+        
+    Returns:
+        Iterator over the items; only one page is held in memory at a time
+    """
+    token = None
+    while True:
+        query = dict(params or {}, limit=page_size)
+        if token is not None:
+            query['from'] = token
+        page = client.get(path, query)
+        
+        items = page.get(items_key, [])
+        yield from items
+        
+        # v2/users and user media use next_token; v1/rooms calls it next_batch
+        token = page.get('next_token', page.get('next_batch'))
+        if token is None or not items:
+            return
+
+
+def iter_users(client: SynapseAdminClient, page_size: int = DEFAULT_PAGE_SIZE,
+               deactivated: bool = True, guests: bool = True) -> Iterator[Dict[str, Any]]:
+    """Every local user account from /_synapse/admin/v2/users"""
+    params = {'deactivated': str(deactivated).lower(), 'guests': str(guests).lower()}
+    return paginate(client, "/_synapse/admin/v2/users", "users", params, page_size)
+
+
+def iter_rooms(client: SynapseAdminClient, page_size: int = DEFAULT_PAGE_SIZE) -> Iterator[Dict[str, Any]]:
+    """Every room known to the server from /_synapse/admin/v1/rooms"""
+    return paginate(client, "/_synapse/admin/v1/rooms", "rooms", page_size=page_size)
+
+
+def iter_user_media(client: SynapseAdminClient, user_id: str,
+                    page_size: int = DEFAULT_PAGE_SIZE) -> Iterator[Dict[str, Any]]:
+    """Media uploaded by one user from /_synapse/admin/v1/users/<user_id>/media"""
+    path = f"/_synapse/admin/v1/users/{urllib.parse.quote(user_id, safe='')}/media"
+    return paginate(client, path, "media", page_size=page_size)
+
+
+def concurrent_map(fn: Callable[[T], R], items: Iterable[T], workers: int = DEFAULT_WORKERS,
+                   window: Optional[int] = None) -> Iterator[R]:
+    """
+    Apply fn to items on a thread pool, yielding results in input order.
+    
+    Unlike Executor.map, the input is consumed lazily with at most window
+    calls outstanding, so a paginated iterator can feed it without the whole
+    listing being pulled into memory first.
+    
+    Args:
+        fn: Function to call per item
+        items: Input iterable (may be a generator)
+        workers: Thread pool size
+        window: Maximum calls in flight (defaults to 4 x workers)
+        
+    Returns:
+        Iterator over fn(item) for each item
+    """
+    window = window or workers * 4
+    source = iter(items)
+    pending: collections.deque = collections.deque()
+    
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            for item in itertools.islice(source, window):
+                pending.append(executor.submit(fn, item))
+            while pending:
+                result = pending.popleft().result()
+                for item in itertools.islice(source, 1):
+                    pending.append(executor.submit(fn, item))
+                yield result
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def user_details(client: SynapseAdminClient, user: Dict[str, Any]) -> Dict[str, Any]:
+    """List entry merged with /_synapse/admin/v2/users/<user_id>"""
+    path = f"/_synapse/admin/v2/users/{urllib.parse.quote(user['name'], safe='')}"
+    return {**user, **client.get(path)}
+
+
+def room_details(client: SynapseAdminClient, room: Dict[str, Any]) -> Dict[str, Any]:
+    """List entry merged with /_synapse/admin/v1/rooms/<room_id>"""
+    path = f"/_synapse/admin/v1/rooms/{urllib.parse.quote(room['room_id'], safe='')}"
+    return {**room, **client.get(path)}
+
+
+def iter_all_media(client: SynapseAdminClient, user_ids: Iterable[str], workers: int = DEFAULT_WORKERS,
+                   page_size: int = DEFAULT_PAGE_SIZE) -> Iterator[Dict[str, Any]]:
+    """Media of many users, listed concurrently; each item gains a user_id field"""
+    def fetch(user_id: str) -> List[Dict[str, Any]]:
+        return [dict(item, user_id=user_id) for item in iter_user_media(client, user_id, page_size)]
+        
+    for media in concurrent_map(fetch, user_ids, workers):
+        yield from media
+
+
+def write_ndjson(records: Iterable[Dict[str, Any]], stream: TextIO) -> int:
+    """Write records one JSON object per line; returns the number written"""
+    count = 0
+    for record in records:
+        stream.write(json.dumps(record, separators=(',', ':'), ensure_ascii=False))
+        stream.write('\n')
+        count += 1
+    return count
+
+
+def export_inventory(client: SynapseAdminClient, kinds: List[str], stream: TextIO,
+                     details: bool = False, workers: int = DEFAULT_WORKERS,
+                     page_size: int = DEFAULT_PAGE_SIZE) -> Dict[str, int]:
+    """
+    Stream users, rooms and/or media to NDJSON.
+    
+    Every record carries a "kind" field ("user", "room" or "media") so one
+    file can hold the whole inventory.
+    
+    Args:
+        client: Admin API client
+        kinds: Any of "users", "rooms", "media"
+        stream: Output text stream
+        details: Fetch the per-item detail endpoint for users and rooms
+        workers: Concurrent detail/media requests
+        page_size: Items per list page
+        
+    Returns:
+        Count of records written per kind
+    """
+    counts: Dict[str, int] = {}
+    user_ids: List[str] = []
+    
+    def tagged(kind: str, records: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        for record in records:
+            yield {'kind': kind, **record}
+            
+    if 'users' in kinds or 'media' in kinds:
+        users: Iterable[Dict[str, Any]] = iter_users(client, page_size)
+        if details and 'users' in kinds:
+            users = concurrent_map(lambda u: user_details(client, u), users, workers)
+            
+        def remember(records: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+            for record in records:
+                user_ids.append(record['name'])
+                yield record
+                
+        if 'users' in kinds:
+            counts['users'] = write_ndjson(tagged('user', remember(users)), stream)
+        else:
+            user_ids.extend(u['name'] for u in users)
+            
+    if 'rooms' in kinds:
+        rooms: Iterable[Dict[str, Any]] = iter_rooms(client, page_size)
+        if details:
+            rooms = concurrent_map(lambda r: room_details(client, r), rooms, workers)
+        counts['rooms'] = write_ndjson(tagged('room', rooms), stream)
+        
+    if 'media' in kinds:
+        media = iter_all_media(client, user_ids, workers, page_size)
+        counts['media'] = write_ndjson(tagged('media', media), stream)
+        
+    return counts
+
+
+def main():
+    """Main function to export the server inventory."""
+    parser = argparse.ArgumentParser(description='Export Synapse users, rooms and media as NDJSON')
+    parser.add_argument('kinds', nargs='*', choices=['users', 'rooms', 'media', 'all'], default='all',
+                        help='What to export (default: all)')
+    parser.add_argument('--url', default=os.getenv('SYNAPSE_URL', 'http://localhost:8008'), help='Synapse base URL')
+    parser.add_argument('--token', default=os.getenv('SYNAPSE_ADMIN_TOKEN'), help='Admin access token')
+    parser.add_argument('--username', help='Admin username, to log in instead of passing --token')
+    parser.add_argument('--password', default=os.getenv('SYNAPSE_ADMIN_PASSWORD'), help='Admin password')
+    parser.add_argument('--details', action='store_true', help='Fetch per-user and per-room details')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Concurrent requests')
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE, help='Items per list page')
+    parser.add_argument('--output', '-o', default='-', help='NDJSON output file (default: stdout)')
+    
+    args = parser.parse_args()
+    kinds = ['users', 'rooms', 'media'] if 'all' in args.kinds else args.kinds
+    
+    try:
+        if args.username:
+            client = SynapseAdminClient.login(args.url, args.username, args.password or '')
+        elif args.token:
+            client = SynapseAdminClient(args.url, args.token)
+        else:
+            parser.error('pass --token (or SYNAPSE_ADMIN_TOKEN) or --username/--password')
+            
+        start = time.perf_counter()
+        if args.output == '-':
+            counts = export_inventory(client, kinds, sys.stdout, args.details, args.workers, args.page_size)
+        else:
+            with open(args.output, 'w', encoding='utf-8') as stream:
+                counts = export_inventory(client, kinds, stream, args.details, args.workers, args.page_size)
+        elapsed = time.perf_counter() - start
+    except (AdminAPIError, urllib.error.URLError) as e:
+        print(f"✗ Export failed: {e}", file=sys.stderr)
+        return 1
+        
+    total = sum(counts.values())
+    summary = ", ".join(f"{count} {kind}" for kind, count in counts.items())
+    print(f"✓ Exported {summary} in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.0f} records/s)",
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
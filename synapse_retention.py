@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Matrix Synapse Retention and Purge Orchestrator
+
+This script plans and runs room history purges and old local/remote media
+purges through the admin API, in bounded parallel batches, and records the
+size of the Docker volumes before and after so the reclaimed space is visible.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import urllib.parse
+import urllib.error
+from dataclasses import dataclass, field, asdict
+from typing import Dict, Any, Optional, List, Set, Callable, Iterable
+
+from synapse_admin_export import (
+    AdminAPIError, SynapseAdminClient, iter_rooms, iter_users, iter_all_media, concurrent_map, DEFAULT_WORKERS
+)
+
+
+DEFAULT_VOLUMES = ['voice-stack_media_store', 'voice-stack_postgres_data']
+POSTGRES_CONTAINER = os.getenv('POSTGRES_CONTAINER', 'voice-stack-postgres')
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+@dataclass
+class RetentionPolicy:
+    """What to keep; None disables that kind of purge"""
+    history_days: Optional[int] = None
+    local_media_days: Optional[int] = None
+    remote_media_days: Optional[int] = None
+    keep_rooms: Set[str] = field(default_factory=set)
+    delete_local_events: bool = True  # a household server's events are all local
+    
+    def cutoff_ts(self, days: Optional[int], now_ms: int) -> Optional[int]:
+        """Millisecond timestamp days before now_ms, or None when disabled"""
+        return now_ms - days * DAY_MS if days is not None else None
+
+
+@dataclass
+class PurgePlan:
+    """Work a policy implies for the server right now"""
+    history_before_ts: Optional[int]
+    local_media_before_ts: Optional[int]
+    remote_media_before_ts: Optional[int]
+    rooms: List[Dict[str, Any]] = field(default_factory=list)
+    local_media: List[Dict[str, Any]] = field(default_factory=list)
+    
+    @property
+    def local_media_bytes(self) -> int:
+        return sum(m.get('media_length') or 0 for m in self.local_media)
+        
+    def summary(self) -> Dict[str, Any]:
+        """Counts and cutoffs, without the item lists"""
+        return {
+            'history_before_ts': self.history_before_ts,
+            'rooms': len(self.rooms),
+            'local_media_before_ts': self.local_media_before_ts,
+            'local_media': len(self.local_media),
+            'local_media_bytes': self.local_media_bytes,
+            'remote_media_before_ts': self.remote_media_before_ts
+        }
+
+
+@dataclass
+class TaskResult:
+    """Outcome of one purge operation"""
+    kind: str
+    target: str
+    success: bool
+    elapsed: float
+    detail: Optional[str] = None
+
+
+def plan_purge(client: SynapseAdminClient, policy: RetentionPolicy, workers: int = DEFAULT_WORKERS,
+               now_ms: Optional[int] = None) -> PurgePlan:
+    """
+    Build a purge plan by walking rooms and users' media through the admin API.
+    
+    Args:
+        client: Admin API client
+        policy: Retention policy
+        workers: Concurrent media listings
+        now_ms: Reference time in milliseconds (default: now)
+        
+    Returns:
+        PurgePlan listing the rooms and local media items affected
+    """
+    now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+    plan = PurgePlan(
+        history_before_ts=policy.cutoff_ts(policy.history_days, now_ms),
+        local_media_before_ts=policy.cutoff_ts(policy.local_media_days, now_ms),
+        remote_media_before_ts=policy.cutoff_ts(policy.remote_media_days, now_ms)
+    )
+    
+    if plan.history_before_ts is not None:
+        plan.rooms = [
+            {'room_id': r['room_id'], 'name': r.get('name')} for r in iter_rooms(client)
+            if r['room_id'] not in policy.keep_rooms and r.get('canonical_alias') not in policy.keep_rooms
+        ]
+        
+    if plan.local_media_before_ts is not None:
+        user_ids = (u['name'] for u in iter_users(client))
+        plan.local_media = [
+            m for m in iter_all_media(client, user_ids, workers)
+            if m.get('created_ts', 0) < plan.local_media_before_ts and not m.get('safe_from_quarantine')
+        ]
+        
+    return plan
+
+
+def purge_room_history(client: SynapseAdminClient, room_id: str, before_ts: int, delete_local_events: bool,
+                       poll_interval: float = 2.0, timeout: float = 3600) -> str:
+    """
+    Purge one room's history and wait for the background purge to finish.
+    
+    Returns:
+        Final purge status ("complete"); raises on "failed" or timeout
+    """
+    path = f"/_synapse/admin/v1/purge_history/{urllib.parse.quote(room_id, safe='')}"
+    purge_id = client.request("POST", path, body={
+        "delete_local_events": delete_local_events,
+        "purge_up_to_ts": before_ts
+    })["purge_id"]
+    
+    deadline = time.monotonic() + timeout
+    while True:
+        status = client.get(f"/_synapse/admin/v1/purge_history_status/{purge_id}")["status"]
+        if status == "complete":
+            return status
+        if status == "failed":
+            raise RuntimeError(f"purge {purge_id} failed")
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"purge {purge_id} still {status} after {timeout:.0f}s")
+        time.sleep(poll_interval)
+
+
+def delete_local_media(client: SynapseAdminClient, media: Dict[str, Any]) -> str:
+    """Delete one local media item; the server name comes from the uploader's user ID"""
+    server_name = media['user_id'].split(':', 1)[1]
+    client.request("DELETE", f"/_synapse/admin/v1/media/{server_name}/{urllib.parse.quote(media['media_id'])}")
+    return f"{media.get('media_length') or 0} bytes"
+
+
+def purge_remote_media(client: SynapseAdminClient, before_ts: int) -> str:
+    """Drop cached remote media last accessed before before_ts"""
+    deleted = client.request("POST", "/_synapse/admin/v1/purge_media_cache", params={'before_ts': before_ts})
+    return f"{deleted.get('deleted', 0)} items"
+
+
+def run_batched(kind: str, items: List[Any], task: Callable[[Any], Optional[str]],
+                target: Callable[[Any], str], workers: int) -> List[TaskResult]:
+    """
+    Run task over items with at most workers in flight, printing progress.
+    
+    A failed item is recorded and the rest carry on, so one bad room does not
+    stop a night's purge.
+    
+    Returns:
+        One TaskResult per item
+    """
+    results: List[TaskResult] = []
+    if not items:
+        return results
+        
+    def timed(item: Any) -> TaskResult:
+        start = time.perf_counter()
+        try:
+            detail = task(item)
+            return TaskResult(kind, target(item), True, time.perf_counter() - start, detail)
+        except (AdminAPIError, urllib.error.URLError, RuntimeError, TimeoutError) as e:
+            return TaskResult(kind, target(item), False, time.perf_counter() - start, str(e))
+            
+    started = time.perf_counter()
+    for result in concurrent_map(timed, items, workers, window=workers):
+        results.append(result)
+        done = len(results)
+        if not result.success:
+            print(f"  ✗ {kind} {result.target}: {result.detail}")
+        if done == len(items) or done % max(1, len(items) // 20) == 0:
+            rate = done / (time.perf_counter() - started)
+            print(f"  [{done}/{len(items)}] {kind} ({rate:.1f}/s)")
+    return results
+
+
+def volume_size(volume: str) -> Optional[int]:
+    """Bytes used by a Docker volume, measured with du in a throwaway alpine container"""
+    cmd = ['docker', 'run', '--rm', '-v', f"{volume}:/source:ro", 'alpine', 'du', '-sk', '/source']
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
+    except (subprocess.TimeoutExpired, FileNotFoundError):
+        return None
+    if result.returncode != 0 or not result.stdout.strip():
+        return None
+    return int(result.stdout.split()[0]) * 1024
+
+
+def measure_volumes(volumes: Iterable[str]) -> Dict[str, Optional[int]]:
+    """Sizes of several volumes; None where docker could not measure one"""
+    return {volume: volume_size(volume) for volume in volumes}
+
+
+def vacuum_database(container: str = POSTGRES_CONTAINER) -> bool:
+    """
+    VACUUM FULL the Synapse database so purged rows are returned to the OS.
+    
+    Locks each table while it is rewritten; run it in a maintenance window.
+    """
+    cmd = ['docker', 'exec', container, 'psql', '-U', os.getenv('POSTGRES_USER', 'synapse'),
+           '-d', os.getenv('POSTGRES_DB', 'synapse'), '-c', 'VACUUM (FULL, ANALYZE);']
+    try:
+        return subprocess.run(cmd, capture_output=True, timeout=6 * 3600).returncode == 0
+    except (subprocess.TimeoutExpired, FileNotFoundError):
+        return False
+
+
+def execute_plan(client: SynapseAdminClient, plan: PurgePlan, policy: RetentionPolicy,
+                 workers: int = 4) -> List[TaskResult]:
+    """
+    Run every purge in a plan.
+    
+    Args:
+        client: Admin API client
+        plan: Plan from plan_purge()
+        policy: Policy the plan was built from
+        workers: Purges in flight at once; history purges are heavy on Postgres,
+            so keep this small
+            
+    Returns:
+        TaskResults for every room, media item and the remote media purge
+    """
+    results: List[TaskResult] = []
+    
+    if plan.history_before_ts is not None:
+        print(f"Purging history in {len(plan.rooms)} rooms...")
+        results += run_batched(
+            'history', plan.rooms,
+            lambda r: purge_room_history(client, r['room_id'], plan.history_before_ts, policy.delete_local_events),
+            lambda r: r['room_id'], workers
+        )
+        
+    if plan.local_media_before_ts is not None:
+        print(f"Deleting {len(plan.local_media)} local media items ({_format_bytes(plan.local_media_bytes)})...")
+        results += run_batched('local_media', plan.local_media, lambda m: delete_local_media(client, m),
+                               lambda m: m['media_id'], workers * 4)
+                               
+    if plan.remote_media_before_ts is not None:
+        print("Purging cached remote media...")
+        results += run_batched('remote_media', [plan.remote_media_before_ts],
+                               lambda ts: purge_remote_media(client, ts), lambda ts: f"before {ts}", 1)
+                               
+    return results
+
+
+def _format_bytes(size: Optional[int]) -> str:
+    if size is None:
+        return "n/a"
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(size) < 1024:
+            return f"{size:.1f}{unit}" if unit != 'B' else f"{size}B"
+        size /= 1024
+    return f"{size:.1f}TB"
+
+
+def main():
+    """Main function to plan and run retention purges."""
+    parser = argparse.ArgumentParser(description='Plan and run Synapse history and media purges')
+    parser.add_argument('--url', default=os.getenv('SYNAPSE_URL', 'http://localhost:8008'), help='Synapse base URL')
+    parser.add_argument('--token', default=os.getenv('SYNAPSE_ADMIN_TOKEN'), help='Admin access token')
+    parser.add_argument('--username', help='Admin username, to log in instead of passing --token')
+    parser.add_argument('--password', default=os.getenv('SYNAPSE_ADMIN_PASSWORD'), help='Admin password')
+    parser.add_argument('--history-days', type=int, help='Purge room history older than this')
+    parser.add_argument('--local-media-days', type=int, help='Delete local media uploaded before this')
+    parser.add_argument('--remote-media-days', type=int, help='Drop cached remote media older than this')
+    parser.add_argument('--keep-room', action='append', default=[], help='Room ID or alias to leave alone')
+    parser.add_argument('--keep-local-events', action='store_true',
+                        help='Only purge events that came in over federation')
+    parser.add_argument('--workers', type=int, default=4, help='Purges in flight (media deletes use 4x)')
+    parser.add_argument('--volume', action='append', help='Docker volume to measure (repeatable)')
+    parser.add_argument('--vacuum-full', action='store_true', help='VACUUM FULL Postgres after purging')
+    parser.add_argument('--execute', action='store_true', help='Run the plan (default: only print it)')
+    parser.add_argument('--report', help='Write the plan, results and volume sizes as JSON')
+    
+    args = parser.parse_args()
+    
+    policy = RetentionPolicy(
+        history_days=args.history_days,
+        local_media_days=args.local_media_days,
+        remote_media_days=args.remote_media_days,
+        keep_rooms=set(args.keep_room),
+        delete_local_events=not args.keep_local_events
+    )
+    if policy.history_days is None and policy.local_media_days is None and policy.remote_media_days is None:
+        parser.error('nothing to do: pass --history-days, --local-media-days and/or --remote-media-days')
+    volumes = args.volume or DEFAULT_VOLUMES
+    
+    try:
+        if args.username:
+            client = SynapseAdminClient.login(args.url, args.username, args.password or '')
+        elif args.token:
+            client = SynapseAdminClient(args.url, args.token)
+        else:
+            parser.error('pass --token (or SYNAPSE_ADMIN_TOKEN) or --username/--password')
+            
+        print("Planning purge...")
+        plan = plan_purge(client, policy)
+        summary = plan.summary()
+        print(f"  {summary['rooms']} rooms to purge history in, "
+              f"{summary['local_media']} local media items ({_format_bytes(plan.local_media_bytes)}) to delete")
+              
+        report: Dict[str, Any] = {'policy': dict(asdict(policy), keep_rooms=sorted(policy.keep_rooms)),
+                                  'plan': summary}
+        if args.execute:
+            print("Measuring volumes...")
+            report['volumes_before'] = measure_volumes(volumes)
+            
+            start = time.perf_counter()
+            results = execute_plan(client, plan, policy, args.workers)
+            report['elapsed'] = time.perf_counter() - start
+            report['results'] = [asdict(r) for r in results]
+            report['failed'] = sum(1 for r in results if not r.success)
+            
+            if args.vacuum_full:
+                print("Running VACUUM FULL...")
+                report['vacuum_full'] = vacuum_database()
+                
+            report['volumes_after'] = measure_volumes(volumes)
+            for volume in volumes:
+                before, after = report['volumes_before'][volume], report['volumes_after'][volume]
+                saved = before - after if before is not None and after is not None else None
+                print(f"  {volume}: {_format_bytes(before)} -> {_format_bytes(after)} "
+                      f"(reclaimed {_format_bytes(saved)})")
+        else:
+            print("⚠ Dry run; pass --execute to purge")
+    except (AdminAPIError, urllib.error.URLError) as e:
+        print(f"✗ Retention run failed: {e}")
+        return 1
+        
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+            
+    if report.get('failed'):
+        print(f"✗ {report['failed']} purge operations failed")
+        return 1
+    if args.execute:
+        print("✓ Retention run complete")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
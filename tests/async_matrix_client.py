@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+"""
+Async Matrix Client
+asyncio twin of MatrixClient built on httpx with a shared, bounded connection pool
+"""
+
+import os
+import asyncio
+import json
+import hmac
+import hashlib
+import time
+import mimetypes
+import warnings
+from pathlib import Path
+from urllib.parse import quote
+from typing import Dict, Any, Optional, List, Sequence, Tuple, Union, Iterable, BinaryIO
+from dataclasses import dataclass
+
+import httpx
+
+from matrix_common import (
+    TransactionIdAllocator, HashingReader, MediaDigest, parse_mxc_url, MEDIA_CHUNK_SIZE
+)
+from rate_limit import RateLimitController, endpoint_key
+from room_history import AsyncRoomHistory
+from sync_watcher import AsyncSyncWatcher
+from test_synapse_api import TestConfig
+
+
+@dataclass
+class PoolConfig:
+    """Connection pool tuning from environment variables"""
+    max_connections: int = int(os.getenv('MATRIX_POOL_MAX_CONNECTIONS', '200'))
+    max_keepalive_connections: int = int(os.getenv('MATRIX_POOL_MAX_KEEPALIVE', '50'))
+    keepalive_expiry: float = float(os.getenv('MATRIX_POOL_KEEPALIVE_EXPIRY', '30'))
+    http2: bool = os.getenv('MATRIX_HTTP2', 'false').lower() == 'true'
+    request_timeout: float = float(os.getenv('MATRIX_REQUEST_TIMEOUT', '30'))
+    connect_timeout: float = float(os.getenv('MATRIX_CONNECT_TIMEOUT', '10'))
+
+
+@dataclass
+class SendAck:
+    """Acknowledgement for one message in a pipelined batch"""
+    sequence: int
+    txn_id: str
+    latency: float  # seconds from PUT issued to response received
+    event_id: Optional[str] = None
+    error: Optional[str] = None
+
+
+def create_http_pool(pool_config: Optional[PoolConfig] = None) -> httpx.AsyncClient:
+    """Create an httpx client whose connection pool can be shared by many AsyncMatrixClients.
+
+    Authorization is sent per request, so one pool can carry any number of
+    simulated users without opening a connection set per user.
+    """
+    pool_config = pool_config or PoolConfig()
+
+    limits = httpx.Limits(
+        max_connections=pool_config.max_connections,
+        max_keepalive_connections=pool_config.max_keepalive_connections,
+        keepalive_expiry=pool_config.keepalive_expiry
+    )
+    timeout = httpx.Timeout(pool_config.request_timeout, connect=pool_config.connect_timeout)
+
+    http2 = pool_config.http2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            warnings.warn("HTTP/2 requested but the 'h2' package is not installed; using HTTP/1.1")
+            http2 = False
+
+    return httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2)
+
+
+class AsyncMatrixClient:
+    """Async Matrix client for API interactions"""
+
+    def __init__(self, config: TestConfig, http: Optional[httpx.AsyncClient] = None,
+                 pool_config: Optional[PoolConfig] = None):
+        self.config = config
+        self._owns_http = http is None
+        self.http = http if http is not None else create_http_pool(pool_config)
+        self.access_token: Optional[str] = None
+        self.user_id: Optional[str] = None
+        self.device_id: Optional[str] = None
+        self.txn_ids = TransactionIdAllocator()
+        self.rate_limiter = RateLimitController()
+
+    async def __aenter__(self) -> 'AsyncMatrixClient':
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    async def aclose(self):
+        """Close the connection pool if this client created it"""
+        if self._owns_http:
+            await self.http.aclose()
+
+    def _api_url(self, endpoint: str) -> str:
+        """Build full API URL"""
+        return f"{self.config.synapse_url}/_matrix{endpoint}"
+
+    def _admin_api_url(self, endpoint: str) -> str:
+        """Build full admin API URL"""
+        return f"{self.config.synapse_url}/_synapse/admin{endpoint}"
+
+    def _auth_headers(self, headers: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """Merge the bearer token into request headers"""
+        merged = dict(headers or {})
+        if self.access_token:
+            merged["Authorization"] = f"Bearer {self.access_token}"
+        return merged
+
+    async def request(self, method: str, url: str, headers: Optional[Dict[str, str]] = None,
+                      retry: bool = True, **kwargs) -> httpx.Response:
+        """Send an authenticated request on the shared pool
+
+        Requests go through the client's RateLimitController, so 429s are
+        retried after retry_after_ms unless retry is False.
+        """
+        return await self.rate_limiter.acall(
+            endpoint_key(method, url),
+            lambda: self.http.request(method, url, headers=self._auth_headers(headers), **kwargs),
+            retry=retry
+        )
+
+    async def register_user(self, username: str, password: str, admin: bool = False) -> Dict[str, Any]:
+        """Register a new user using registration shared secret"""
+        # Get nonce
+        nonce_resp = await self.request("GET", self._api_url("/client/r0/admin/register"))
+        nonce_resp.raise_for_status()
+        nonce = nonce_resp.json()["nonce"]
+
+        # Create HMAC
+        mac = hmac.new(
+            key=self.config.registration_secret.encode(),
+            digestmod=hashlib.sha1
+        )
+
+        mac.update(nonce.encode())
+        mac.update(b"\x00")
+        mac.update(username.encode())
+        mac.update(b"\x00")
+        mac.update(password.encode())
+        mac.update(b"\x00")
+        mac.update(b"admin" if admin else b"notadmin")
+
+        data = {
+            "nonce": nonce,
+            "username": username,
+            "password": password,
+            "admin": admin,
+            "mac": mac.hexdigest()
+        }
+
+        resp = await self.request("POST", self._api_url("/client/r0/admin/register"), json=data)
+        resp.raise_for_status()
+        return resp.json()
+
+    async def login(self, username: str, password: str) -> Dict[str, Any]:
+        """Login user and store access token"""
+        data = {
+            "type": "m.login.password",
+            "user": username,
+            "password": password
+        }
+
+        resp = await self.request("POST", self._api_url("/client/r0/login"), json=data)
+        resp.raise_for_status()
+
+        result = resp.json()
+        self.access_token = result["access_token"]
+        self.user_id = result["user_id"]
+        self.device_id = result.get("device_id")
+
+        return result
+
+    def restore_session(self, session) -> None:
+        """Use cached credentials (a session_cache.CachedSession) instead of logging in"""
+        self.access_token = session.access_token
+        self.user_id = session.user_id
+        self.device_id = session.device_id
+
+    async def whoami(self) -> Dict[str, Any]:
+        """Return the user_id (and device_id) the access token belongs to"""
+        resp = await self.request("GET", self._api_url("/client/r0/account/whoami"))
+        resp.raise_for_status()
+        return resp.json()
+
+    async def ensure_user(self, username: str, password: str, admin: bool = False) -> Dict[str, Any]:
+        """Register the user if needed, then login"""
+        try:
+            await self.register_user(username, password, admin=admin)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code != 400:  # User might already exist
+                raise
+
+        return await self.login(username, password)
+
+    async def create_room(self, name: str, topic: str = None, public: bool = False,
+                          invite: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """Create a new room"""
+        data = {
+            "name": name,
+            "preset": "public_chat" if public else "private_chat",
+            "visibility": "public" if public else "private"
+        }
+
+        if topic:
+            data["topic"] = topic
+        if invite:
+            data["invite"] = list(invite)
+
+        resp = await self.request("POST", self._api_url("/client/r0/createRoom"), json=data)
+        resp.raise_for_status()
+        return resp.json()
+
+    async def invite_user(self, room_id: str, user_id: str) -> Dict[str, Any]:
+        """Invite a user to a room"""
+        resp = await self.request(
+            "POST",
+            self._api_url(f"/client/r0/rooms/{room_id}/invite"),
+            json={"user_id": user_id}
+        )
+        resp.raise_for_status()
+        return resp.json()
+
+    async def join_room(self, room_id: str) -> Dict[str, Any]:
+        """Join a room by ID"""
+        resp = await self.request("POST", self._api_url(f"/client/r0/rooms/{room_id}/join"), json={})
+        resp.raise_for_status()
+        return resp.json()
+
+    async def joined_rooms(self) -> List[str]:
+        """Room IDs this user is joined to"""
+        resp = await self.request("GET", self._api_url("/client/r0/joined_rooms"))
+        resp.raise_for_status()
+        return resp.json()["joined_rooms"]
+
+    async def send_state_event(self, room_id: str, event_type: str, content: Dict[str, Any],
+                               state_key: str = "") -> Dict[str, Any]:
+        """Set a piece of room state"""
+        resp = await self.request(
+            "PUT",
+            self._api_url(f"/client/r0/rooms/{room_id}/state/{event_type}/{quote(state_key, safe='')}"),
+            json=content
+        )
+        resp.raise_for_status()
+        return resp.json()
+
+    async def set_presence(self, presence: str, status_msg: Optional[str] = None) -> None:
+        """Set this user's presence (online, unavailable or offline)"""
+        data = {"presence": presence}
+        if status_msg is not None:
+            data["status_msg"] = status_msg
+
+        resp = await self.request("PUT", self._api_url(f"/client/r0/presence/{self.user_id}/status"), json=data)
+        resp.raise_for_status()
+
+    async def send_message(self, room_id: str, message: str, msg_type: str = "m.text") -> Dict[str, Any]:
+        """Send message to room"""
+        txn_id = self.txn_ids.next_id()
+
+        data = {
+            "msgtype": msg_type,
+            "body": message
+        }
+
+        resp = await self.request(
+            "PUT",
+            self._api_url(f"/client/r0/rooms/{room_id}/send/m.room.message/{txn_id}"),
+            json=data
+        )
+        resp.raise_for_status()
+        return resp.json()
+
+    async def _send_acked(self, room_id: str, sequence: int, message: str, msg_type: str,
+                          window: asyncio.Semaphore) -> SendAck:
+        """Send one pipelined message and release its window slot"""
+        txn_id = self.txn_ids.next_id()
+        data = {
+            "msgtype": msg_type,
+            "body": message
+        }
+
+        start = time.perf_counter()
+        try:
+            resp = await self.request(
+                "PUT",
+                self._api_url(f"/client/r0/rooms/{room_id}/send/m.room.message/{txn_id}"),
+                json=data
+            )
+            latency = time.perf_counter() - start
+            if resp.status_code != 200:
+                return SendAck(sequence=sequence, txn_id=txn_id, latency=latency,
+                               error=f"HTTP {resp.status_code}: {resp.text[:200]}")
+            return SendAck(sequence=sequence, txn_id=txn_id, latency=latency,
+                           event_id=resp.json().get("event_id"))
+        except httpx.HTTPError as e:
+            return SendAck(sequence=sequence, txn_id=txn_id,
+                           latency=time.perf_counter() - start, error=str(e))
+        finally:
+            window.release()
+
+    async def send_messages(self, room_id: str, messages: Sequence[str], in_flight: int = 8,
+                            msg_type: str = "m.text", ordered: bool = True) -> List[SendAck]:
+        """Send a batch of messages into one room; acks are returned in submission order
+
+        With ordered (the default) each PUT waits for the previous one's ack,
+        including any 429 retry, so the room timeline matches the list. With
+        ordered=False up to in_flight PUTs are outstanding at once; they travel
+        over separate pooled connections and a throttled one is retried after
+        later ones were accepted, so events may land in any order.
+        """
+        window = asyncio.Semaphore(1 if ordered else max(1, in_flight))
+        tasks = []
+
+        for sequence, message in enumerate(messages):
+            await window.acquire()
+            tasks.append(asyncio.create_task(
+                self._send_acked(room_id, sequence, message, msg_type, window)
+            ))
+            # Let the task reach the connection pool before the next PUT is issued
+            await asyncio.sleep(0)
+
+        return list(await asyncio.gather(*tasks))
+
+    async def _send_room_in_order(self, room_id: str, messages: Sequence[str], msg_type: str,
+                                  window: asyncio.Semaphore) -> List[SendAck]:
+        acks = []
+        for sequence, message in enumerate(messages):
+            await window.acquire()
+            acks.append(await self._send_acked(room_id, sequence, message, msg_type, window))
+        return acks
+
+    async def send_message_batches(self, batches: Dict[str, Sequence[str]], in_flight: int = 8,
+                                   msg_type: str = "m.text", ordered: bool = True) -> Dict[str, List[SendAck]]:
+        """Send batches into several rooms at once
+
+        With ordered (the default) each room has one PUT outstanding, keeping
+        its timeline in list order, and up to in_flight rooms send in parallel.
+        With ordered=False every room pipelines up to in_flight PUTs.
+        """
+        room_ids = list(batches)
+        if ordered:
+            window = asyncio.Semaphore(max(1, in_flight))
+            sends = [self._send_room_in_order(room_id, batches[room_id], msg_type, window) for room_id in room_ids]
+        else:
+            sends = [self.send_messages(room_id, batches[room_id], in_flight, msg_type, ordered=False)
+                     for room_id in room_ids]
+        acks = await asyncio.gather(*sends)
+        return dict(zip(room_ids, acks))
+
+    def sync_watcher(self, timeout_ms: int = 30000,
+                     sync_filter: Optional[Dict[str, Any]] = None) -> AsyncSyncWatcher:
+        """Create a /sync watcher for this client (use as an async context manager)"""
+        return AsyncSyncWatcher(self, timeout_ms=timeout_ms, sync_filter=sync_filter)
+
+    async def get_messages(self, room_id: str, limit: int = 10, from_token: Optional[str] = None,
+                           direction: str = "b",
+                           message_filter: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Get one page of messages from room; pass the response's "end" as from_token for the next"""
+        params = {"limit": limit, "dir": direction}
+        if from_token:
+            params["from"] = from_token
+        if message_filter:
+            params["filter"] = json.dumps(message_filter)
+        resp = await self.request(
+            "GET",
+            self._api_url(f"/client/r0/rooms/{room_id}/messages"),
+            params=params
+        )
+        resp.raise_for_status()
+        return resp.json()
+
+    async def search(self, search_term: str, rooms: Optional[Sequence[str]] = None, limit: int = 10,
+                     order_by: str = "rank") -> Dict[str, Any]:
+        """Full-text search of message bodies; returns the room_events category"""
+        room_filter: Dict[str, Any] = {"limit": limit}
+        if rooms is not None:
+            room_filter["rooms"] = list(rooms)
+
+        data = {"search_categories": {"room_events": {
+            "search_term": search_term,
+            "keys": ["content.body"],
+            "order_by": order_by,
+            "filter": room_filter
+        }}}
+        resp = await self.request("POST", self._api_url("/client/r0/search"), json=data, timeout=300)
+        resp.raise_for_status()
+        return resp.json()["search_categories"]["room_events"]
+
+    def history(self, room_id: str, **kwargs) -> AsyncRoomHistory:
+        """Iterate the room's timeline across pages with ``async for`` (see RoomHistory for options)"""
+        return AsyncRoomHistory(self, room_id, **kwargs)
+
+    async def upload_media(self, file_path: str) -> Dict[str, Any]:
+        """Upload media file"""
+        content_type = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+        filename = Path(file_path).name
+
+        with open(file_path, 'rb') as f:
+            result, _ = await self.upload_media_stream(f, content_type, filename)
+        return result
+
+    async def upload_media_stream(self, source: Union[BinaryIO, Iterable[bytes]], content_type: str,
+                                  filename: str, size: Optional[int] = None) -> Tuple[Dict[str, Any], MediaDigest]:
+        """Stream media from a file object or chunk generator, hashing as it is sent"""
+        reader = HashingReader(source, size=size)
+
+        async def body():
+            while True:
+                # File reads happen off the event loop so other users keep moving
+                chunk = await asyncio.to_thread(reader.read, reader.chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+        # A streamed body cannot be replayed, so a 429 is reported rather than retried
+        resp = await self.request(
+            "POST",
+            self._api_url("/media/r0/upload"),
+            retry=False,
+            content=body(),
+            headers={"Content-Type": content_type, "Content-Length": str(reader.size)},
+            params={"filename": filename}
+        )
+        resp.raise_for_status()
+        return resp.json(), reader.digest
+
+    async def media_config(self) -> Dict[str, Any]:
+        """Media repository limits, e.g. m.upload.size"""
+        resp = await self.request("GET", self._api_url("/media/v3/config"))
+        resp.raise_for_status()
+        return resp.json()
+
+    async def download_media(self, mxc_url: str) -> bytes:
+        """Download media from MXC URL"""
+        server_name, media_id = parse_mxc_url(mxc_url)
+
+        resp = await self.request(
+            "GET",
+            self._api_url(f"/media/r0/download/{server_name}/{media_id}")
+        )
+        resp.raise_for_status()
+        return resp.content
+
+    async def download_media_to(self, mxc_url: str, sink: Optional[BinaryIO] = None,
+                                chunk_size: int = MEDIA_CHUNK_SIZE) -> MediaDigest:
+        """Stream media into sink (or discard it), returning its digest"""
+        server_name, media_id = parse_mxc_url(mxc_url)
+        sha256 = hashlib.sha256()
+        size = 0
+
+        async with self.http.stream(
+            "GET",
+            self._api_url(f"/media/r0/download/{server_name}/{media_id}"),
+            headers=self._auth_headers()
+        ) as resp:
+            if resp.is_error:
+                # Read the (small) error body so callers can inspect the errcode
+                await resp.aread()
+            resp.raise_for_status()
+            async for chunk in resp.aiter_bytes(chunk_size):
+                sha256.update(chunk)
+                size += len(chunk)
+                if sink is not None:
+                    sink.write(chunk)
+
+        return MediaDigest(sha256=sha256.hexdigest(), size=size)
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+End-to-End Message Delivery Latency Benchmark
+Fans one sender out to N recipients, each running its own /sync loop
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import time
+from typing import Dict, Any, List
+
+import httpx
+
+from async_matrix_client import AsyncMatrixClient, create_http_pool, PoolConfig
+from benchmark_results import BenchmarkResult, benchmark_environment, write_benchmark_result, DEFAULT_BENCHMARK_DIR
+from bulk_provisioning import provision_clients
+from latency_stats import LatencyHistogram
+from rate_limit import merge_summaries
+from session_cache import SessionCache
+from sync_watcher import AsyncSyncWatcher
+from test_synapse_api import TestConfig
+
+
+def room_sync_filter(room_id: str) -> Dict[str, Any]:
+    """Only sync the benchmark room's timeline so other traffic does not skew results"""
+    return {
+        "room": {"rooms": [room_id], "timeline": {"limit": 50}, "state": {"lazy_load_members": True}},
+        "presence": {"types": []},
+        "account_data": {"types": []}
+    }
+
+
+class DeliveryBenchmark:
+    """Measures send -> /sync receipt latency for every recipient"""
+
+    def __init__(self, sender: AsyncMatrixClient, recipients: List[AsyncMatrixClient],
+                 delivery_timeout: float = 30):
+        self.sender = sender
+        self.recipients = recipients
+        self.delivery_timeout = delivery_timeout
+
+    async def setup_room(self, room_size: int) -> str:
+        """Create a room and join room_size recipients to it"""
+        room = await self.sender.create_room(f"Delivery Benchmark x{room_size}")
+        room_id = room["room_id"]
+        members = self.recipients[:room_size]
+
+        await asyncio.gather(*(self.sender.invite_user(room_id, m.user_id) for m in members))
+        await asyncio.gather(*(m.join_room(room_id) for m in members))
+        return room_id
+
+    async def _collect(self, event_id: str, sent_at: float, watchers: List[AsyncSyncWatcher],
+                       histograms: List[LatencyHistogram], timeouts: List[int]):
+        sightings = await asyncio.gather(*(
+            w.wait_for_event(event_id, timeout=self.delivery_timeout, sent_at=sent_at) for w in watchers
+        ), return_exceptions=True)
+
+        for i, sighting in enumerate(sightings):
+            if isinstance(sighting, TimeoutError):
+                timeouts[i] += 1
+            elif isinstance(sighting, Exception):
+                raise sighting
+            else:
+                histograms[i].record(sighting.latency)
+
+    async def _send_and_collect(self, i: int, room_id: str, watchers: List[AsyncSyncWatcher],
+                                histograms: List[LatencyHistogram], timeouts: List[int], sends: Dict[str, Any]):
+        sent_at = time.time()
+        try:
+            resp = await self.sender.send_message(room_id, f"delivery probe {i}")
+        except httpx.HTTPError:
+            sends['errors'] += 1
+            return
+        acked_at = time.perf_counter()
+        sends['acked'] += 1
+        sends['first_ack'] = min(sends['first_ack'] or acked_at, acked_at)
+        sends['last_ack'] = acked_at
+        await self._collect(resp["event_id"], sent_at, watchers, histograms, timeouts)
+
+    async def run_case(self, room_id: str, room_size: int, rate: float, messages: int) -> Dict[str, Any]:
+        """Send messages at a fixed rate and record per-recipient delivery latency"""
+        members = self.recipients[:room_size]
+        watchers = [AsyncSyncWatcher(m, sync_filter=room_sync_filter(room_id)) for m in members]
+        await asyncio.gather(*(w.start() for w in watchers))
+        for client in [self.sender] + members:
+            client.rate_limiter.reset_stats()
+
+        histograms = [LatencyHistogram() for _ in members]
+        timeouts = [0] * len(members)
+        tasks = []
+        sends = {'errors': 0, 'acked': 0, 'first_ack': None, 'last_ack': None}
+        max_lag = 0.0
+
+        try:
+            interval = 1.0 / rate
+            start = time.perf_counter()
+            for i in range(messages):
+                # Open-loop pacing: every send is its own task started on schedule,
+                # so a slow send does not hold back the ones after it
+                scheduled = start + i * interval
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                max_lag = max(max_lag, time.perf_counter() - scheduled)
+
+                tasks.append(asyncio.create_task(
+                    self._send_and_collect(i, room_id, watchers, histograms, timeouts, sends)
+                ))
+
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*(w.stop() for w in watchers))
+
+        ack_span = (sends['last_ack'] - sends['first_ack']) if sends['acked'] > 1 else 0.0
+
+        combined = LatencyHistogram()
+        for histogram in histograms:
+            combined.merge(histogram)
+
+        recipient_p99s = sorted(h.value_at_percentile(99) for h in histograms if h.total)
+        return {
+            'messages': messages,
+            'send_errors': sends['errors'],
+            # Below target means the server (or this client) could not keep up with the schedule
+            'target_rate': rate,
+            'achieved_rate': (sends['acked'] - 1) / ack_span if ack_span > 0 else 0.0,
+            'max_schedule_lag': max_lag,
+            'deliveries': combined.total,
+            'timeouts': sum(timeouts),
+            'latency': combined.to_dict(),
+            'recipient_p99_min': recipient_p99s[0] if recipient_p99s else 0.0,
+            'recipient_p99_max': recipient_p99s[-1] if recipient_p99s else 0.0,
+            # Throttled sends inflate latency through the rate limiter, not server capacity
+            'rate_limit': merge_summaries(*(c.rate_limiter.summary() for c in [self.sender] + members))
+        }
+
+
+async def run_benchmark(args) -> BenchmarkResult:
+    """Provision users and sweep room size x message rate"""
+    config = TestConfig()
+    room_sizes = sorted(int(n) for n in args.room_sizes.split(','))
+    rates = [float(r) for r in args.rates.split(',')]
+
+    result = BenchmarkResult(
+        benchmark='delivery',
+        parameters={
+            'room_sizes': room_sizes,
+            'rates': rates,
+            'messages_per_case': args.messages,
+            'delivery_timeout': args.delivery_timeout
+        },
+        environment=benchmark_environment(config.synapse_url)
+    )
+
+    # One long-poll per recipient plus headroom for sends and setup
+    pool = create_http_pool(PoolConfig(max_connections=max(room_sizes) + 32,
+                                       max_keepalive_connections=max(room_sizes) + 32))
+    async with pool:
+        usernames = [f"{args.user_prefix}sender"] + [
+            f"{args.user_prefix}{i:05d}" for i in range(max(room_sizes))
+        ]
+        print(f"Provisioning {len(usernames)} benchmark users...")
+        clients = await provision_clients(config, pool, usernames, args.password,
+                                          session_cache=SessionCache())
+        benchmark = DeliveryBenchmark(clients[0], clients[1:], args.delivery_timeout)
+
+        for room_size in room_sizes:
+            room_id = await benchmark.setup_room(room_size)
+            for rate in rates:
+                name = f"{room_size} recipients @ {rate:g} msg/s"
+                print(f"Running {name}...")
+                metrics = await benchmark.run_case(room_id, room_size, rate, args.messages)
+                result.add_case(name, {'room_size': room_size, 'rate': rate}, metrics)
+
+                latency = metrics['latency']
+                print(f"  p50={latency['p50'] * 1000:.1f}ms p95={latency['p95'] * 1000:.1f}ms "
+                      f"p99={latency['p99'] * 1000:.1f}ms max={latency['max'] * 1000:.1f}ms "
+                      f"timeouts={metrics['timeouts']} throttled={metrics['rate_limit']['throttled']} "
+                      f"achieved={metrics['achieved_rate']:.1f}/{rate:g} msg/s")
+
+    return result
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description='End-to-end message delivery latency benchmark')
+    parser.add_argument('--room-sizes', default='2,5,10,25', help='Comma separated recipient counts')
+    parser.add_argument('--rates', default='1,5,20', help='Comma separated send rates (messages/s)')
+    parser.add_argument('--messages', type=int, default=50, help='Messages per sweep point')
+    parser.add_argument('--delivery-timeout', type=float, default=30, help='Seconds before a delivery counts as lost')
+    parser.add_argument('--user-prefix', default='bench_delivery_', help='Benchmark account prefix')
+    parser.add_argument('--password', default=os.getenv('TEST_USER_PASSWORD', 'TestPassword123!'))
+    parser.add_argument('--output-dir', '-o', default=DEFAULT_BENCHMARK_DIR, help='Benchmark results directory')
+
+    args = parser.parse_args()
+
+    result = asyncio.run(run_benchmark(args))
+    write_benchmark_result(result, args.output_dir)
+
+    lost = sum(c.metrics['timeouts'] for c in result.cases)
+    return 0 if lost == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Room History Scroll-back Benchmark
+Measures how fast a client pages back through a long room timeline via /messages
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+from typing import Dict, Any
+
+from async_matrix_client import AsyncMatrixClient, create_http_pool
+from benchmark_results import BenchmarkResult, benchmark_environment, write_benchmark_result, DEFAULT_BENCHMARK_DIR
+from test_synapse_api import TestConfig
+
+
+SEED_BATCH = 500
+
+
+async def seed_room(client: AsyncMatrixClient, messages: int, in_flight: int = 16) -> str:
+    """Create a room holding the requested number of messages"""
+    room = await client.create_room(f"History Benchmark x{messages}")
+    room_id = room["room_id"]
+
+    for start in range(0, messages, SEED_BATCH):
+        batch = [f"history benchmark message {i}" for i in range(start, min(messages, start + SEED_BATCH))]
+        acks = await client.send_messages(room_id, batch, in_flight=in_flight, ordered=False)
+        failed = [a for a in acks if a.error]
+        if failed:
+            raise RuntimeError(f"{len(failed)} seed messages failed, e.g. {failed[0].error}")
+        print(f"  seeded {start + len(batch)}/{messages}")
+
+    return room_id
+
+
+async def run_case(client: AsyncMatrixClient, room_id: str, page_size: int, lazy_load_members: bool,
+                   prefetch: bool, max_events: int) -> Dict[str, Any]:
+    """Scroll back from the newest event and return throughput figures"""
+    history = client.history(room_id, page_size=page_size, lazy_load_members=lazy_load_members,
+                             prefetch=prefetch, max_events=max_events or None)
+    async for _ in history:
+        pass
+
+    metrics = history.stats.to_dict()
+    metrics['members_loaded'] = len(history.members)
+    return metrics
+
+
+async def run_benchmark(args) -> BenchmarkResult:
+    """Seed (or reuse) a room and sweep page size x lazy loading x prefetch"""
+    config = TestConfig()
+    page_sizes = [int(p) for p in args.page_sizes.split(',')]
+
+    result = BenchmarkResult(
+        benchmark='history',
+        parameters={
+            'messages': args.messages,
+            'room_id': args.room_id,
+            'page_sizes': page_sizes,
+            'max_events': args.max_events
+        },
+        environment=benchmark_environment(config.synapse_url)
+    )
+
+    async with create_http_pool() as pool:
+        client = AsyncMatrixClient(config, http=pool)
+        await client.ensure_user(args.username, args.password)
+
+        room_id = args.room_id
+        if room_id is None:
+            print(f"Seeding room with {args.messages} messages...")
+            room_id = await seed_room(client, args.messages)
+
+        for page_size in page_sizes:
+            for lazy_load_members in (False, True):
+                for prefetch in (False, True):
+                    name = (f"page={page_size} lazy_members={'on' if lazy_load_members else 'off'} "
+                            f"prefetch={'on' if prefetch else 'off'}")
+                    print(f"Running {name}...")
+                    metrics = await run_case(client, room_id, page_size, lazy_load_members,
+                                             prefetch, args.max_events)
+                    result.add_case(name, {
+                        'page_size': page_size,
+                        'lazy_load_members': lazy_load_members,
+                        'prefetch': prefetch
+                    }, metrics)
+
+                    print(f"  {metrics['events']} events in {metrics['elapsed']:.2f}s "
+                          f"({metrics['events_per_s']:.0f} events/s, "
+                          f"page p95={metrics['page_latency']['p95'] * 1000:.0f}ms)")
+
+    return result
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description='Room history scroll-back benchmark')
+    parser.add_argument('--messages', type=int, default=5000, help='Messages to seed into a new room')
+    parser.add_argument('--room-id', help='Scroll an existing room instead of seeding one')
+    parser.add_argument('--page-sizes', default='20,100,500', help='Comma separated /messages limits')
+    parser.add_argument('--max-events', type=int, default=0, help='Stop each case after this many events (0 = all)')
+    parser.add_argument('--username', default='bench_history', help='Benchmark account')
+    parser.add_argument('--password', default=os.getenv('TEST_USER_PASSWORD', 'TestPassword123!'))
+    parser.add_argument('--output-dir', '-o', default=DEFAULT_BENCHMARK_DIR, help='Benchmark results directory')
+
+    args = parser.parse_args()
+
+    result = asyncio.run(run_benchmark(args))
+    write_benchmark_result(result, args.output_dir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
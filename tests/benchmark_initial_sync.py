@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Initial Sync Scaling Benchmark
+Times cold /sync for accounts with 10-2,000 rooms across filters and presence settings
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, Any, List, Optional
+
+from async_matrix_client import AsyncMatrixClient, create_http_pool, PoolConfig
+from benchmark_results import BenchmarkResult, benchmark_environment, write_benchmark_result, DEFAULT_BENCHMARK_DIR
+from bulk_provisioning import provision_clients
+from latency_stats import LatencySummary
+from session_cache import SessionCache
+from test_synapse_api import TestConfig
+
+
+# Filters a phone might use for its first sync, from heaviest to lightest
+SYNC_FILTERS: Dict[str, Optional[Dict[str, Any]]] = {
+    'none': None,
+    'lazy_members': {
+        "room": {"state": {"lazy_load_members": True}}
+    },
+    'lazy_members_timeline_1': {
+        "room": {"state": {"lazy_load_members": True}, "timeline": {"limit": 1}},
+        "presence": {"types": []}
+    },
+}
+
+
+class InitialSyncBenchmark:
+    """Seeds accounts with many rooms and times their initial /sync"""
+
+    def __init__(self, members: List[AsyncMatrixClient], concurrency: int = 16, messages_per_room: int = 5):
+        self.members = members
+        self.concurrency = concurrency
+        self.messages_per_room = messages_per_room
+
+    async def seed(self, owner: AsyncMatrixClient, room_count: int, member_count: int) -> int:
+        """Bring owner up to room_count rooms, each joined by member_count members
+
+        Rooms already present from an earlier run are kept, so re-running a
+        sweep only pays for the rooms it is missing.
+        """
+        existing = len(await owner.joined_rooms())
+        missing = max(0, room_count - existing)
+        if not missing:
+            return 0
+
+        members = self.members[:member_count]
+        window = asyncio.Semaphore(self.concurrency)
+
+        async def create(index: int):
+            async with window:
+                room = await owner.create_room(f"Sync Benchmark {existing + index}",
+                                               invite=[m.user_id for m in members])
+                room_id = room["room_id"]
+                for member in members:
+                    await member.join_room(room_id)
+                for i in range(self.messages_per_room):
+                    sender = members[i % len(members)] if members else owner
+                    await sender.send_message(room_id, f"sync benchmark message {i}")
+
+        print(f"  creating {missing} rooms with {member_count} members each...")
+        await asyncio.gather(*(create(i) for i in range(missing)))
+        return missing
+
+    async def timed_sync(self, client: AsyncMatrixClient, sync_filter: Optional[Dict[str, Any]],
+                         set_presence: Optional[str]) -> Dict[str, Any]:
+        """One cold /sync: server time is until response headers, total includes the body"""
+        params: Dict[str, Any] = {"timeout": 0}
+        if sync_filter is not None:
+            params["filter"] = json.dumps(sync_filter)
+        if set_presence:
+            params["set_presence"] = set_presence
+
+        start = time.perf_counter()
+        async with client.http.stream("GET", client._api_url("/client/r0/sync"), params=params,
+                                      headers=client._auth_headers(), timeout=600) as resp:
+            server_time = time.perf_counter() - start
+            resp.raise_for_status()
+            body = await resp.aread()
+            total_time = time.perf_counter() - start
+            wire_bytes = resp.num_bytes_downloaded
+
+        data = json.loads(body)
+        return {
+            'server_time': server_time,
+            'total_time': total_time,
+            'wire_bytes': wire_bytes,
+            'json_bytes': len(body),
+            'rooms': len(data.get("rooms", {}).get("join", {}))
+        }
+
+    async def run_case(self, owner: AsyncMatrixClient, sync_filter: Optional[Dict[str, Any]],
+                       set_presence: Optional[str], repeats: int) -> Dict[str, Any]:
+        """Repeat the cold sync and summarise"""
+        samples = [await self.timed_sync(owner, sync_filter, set_presence) for _ in range(repeats)]
+        return {
+            'repeats': repeats,
+            'rooms_returned': samples[-1]['rooms'],
+            'server_time': LatencySummary.from_samples([s['server_time'] for s in samples]).to_dict(),
+            'total_time': LatencySummary.from_samples([s['total_time'] for s in samples]).to_dict(),
+            'wire_bytes': sum(s['wire_bytes'] for s in samples) // repeats,
+            'json_bytes': sum(s['json_bytes'] for s in samples) // repeats
+        }
+
+
+async def run_benchmark(args) -> BenchmarkResult:
+    """Seed one account per (rooms, members) tier and sweep filters and presence"""
+    config = TestConfig()
+    room_counts = sorted(int(n) for n in args.room_counts.split(','))
+    member_counts = sorted(int(n) for n in args.members.split(','))
+    filters = [f.strip() for f in args.filters.split(',')]
+    presence_modes = [None, 'offline']
+
+    result = BenchmarkResult(
+        benchmark='initial_sync',
+        parameters={
+            'room_counts': room_counts,
+            'member_counts': member_counts,
+            'filters': {name: SYNC_FILTERS[name] for name in filters},
+            'messages_per_room': args.messages_per_room,
+            'repeats': args.repeats
+        },
+        environment=benchmark_environment(config.synapse_url)
+    )
+
+    pool = create_http_pool(PoolConfig(max_connections=args.concurrency * 4, request_timeout=600))
+    async with pool:
+        owner_names = [f"{args.user_prefix}r{rooms}_m{members}"
+                       for rooms in room_counts for members in member_counts]
+        member_names = [f"{args.user_prefix}member_{i:05d}" for i in range(max(member_counts))]
+        print(f"Provisioning {len(owner_names)} owners and {len(member_names)} members...")
+        clients = await provision_clients(config, pool, owner_names + member_names, args.password,
+                                          session_cache=SessionCache())
+        owners = dict(zip(owner_names, clients[:len(owner_names)]))
+        benchmark = InitialSyncBenchmark(clients[len(owner_names):], args.concurrency, args.messages_per_room)
+
+        for rooms in room_counts:
+            for members in member_counts:
+                owner = owners[f"{args.user_prefix}r{rooms}_m{members}"]
+                print(f"Seeding {rooms} rooms x {members} members...")
+                await benchmark.seed(owner, rooms, members)
+
+                for filter_name in filters:
+                    for set_presence in presence_modes:
+                        name = (f"{rooms} rooms x {members} members, filter={filter_name}, "
+                                f"presence={set_presence or 'online'}")
+                        print(f"Running {name}...")
+                        metrics = await benchmark.run_case(owner, SYNC_FILTERS[filter_name],
+                                                           set_presence, args.repeats)
+                        result.add_case(name, {
+                            'rooms': rooms,
+                            'members': members,
+                            'filter': filter_name,
+                            'set_presence': set_presence or 'online'
+                        }, metrics)
+
+                        print(f"  server p50={metrics['server_time']['p50'] * 1000:.0f}ms "
+                              f"total p50={metrics['total_time']['p50'] * 1000:.0f}ms "
+                              f"{metrics['json_bytes'] / 1024:.0f}KB JSON "
+                              f"({metrics['wire_bytes'] / 1024:.0f}KB on the wire)")
+
+    return result
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description='Initial /sync scaling benchmark')
+    parser.add_argument('--room-counts', default='10,100,500,2000', help='Comma separated rooms per account')
+    parser.add_argument('--members', default='1,10', help='Comma separated members per room (besides the owner)')
+    parser.add_argument('--filters', default=','.join(SYNC_FILTERS),
+                        help=f"Comma separated filters from: {', '.join(SYNC_FILTERS)}")
+    parser.add_argument('--messages-per-room', type=int, default=5, help='Timeline messages seeded per room')
+    parser.add_argument('--repeats', type=int, default=3, help='Cold syncs per sweep point')
+    parser.add_argument('--concurrency', '-c', type=int, default=16, help='Rooms seeded in parallel')
+    parser.add_argument('--user-prefix', default='bench_sync_', help='Benchmark account prefix')
+    parser.add_argument('--password', default=os.getenv('TEST_USER_PASSWORD', 'TestPassword123!'))
+    parser.add_argument('--output-dir', '-o', default=DEFAULT_BENCHMARK_DIR, help='Benchmark results directory')
+
+    args = parser.parse_args()
+
+    unknown = [f for f in args.filters.split(',') if f.strip() not in SYNC_FILTERS]
+    if unknown:
+        parser.error(f"unknown filters: {', '.join(unknown)}")
+
+    result = asyncio.run(run_benchmark(args))
+    write_benchmark_result(result, args.output_dir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
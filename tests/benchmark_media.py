@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Media Repository Throughput Benchmark
+Sweeps file size, content type and concurrency against the Synapse media repository
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import time
+from collections import Counter
+from typing import Dict, Any, List, Iterator, Optional
+
+import httpx
+
+from async_matrix_client import AsyncMatrixClient, create_http_pool, PoolConfig
+from benchmark_results import BenchmarkResult, benchmark_environment, write_benchmark_result, DEFAULT_BENCHMARK_DIR
+from latency_stats import LatencySummary
+from matrix_common import MediaDigest
+from test_synapse_api import TestConfig
+
+
+SIZE_UNITS = {'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+
+DEFAULT_SIZES = "1KB,64KB,1MB,16MB,100MB,500MB"
+DEFAULT_CONTENT_TYPES = "application/octet-stream,image/jpeg,video/mp4"
+DEFAULT_CONCURRENCY = "1,4,16"
+
+PAYLOAD_BLOCK = os.urandom(1024 * 1024)
+
+
+def parse_size(text: str) -> int:
+    """Parse sizes like 64KB or 500MB into bytes"""
+    text = text.strip().upper()
+    for unit in sorted(SIZE_UNITS, key=len, reverse=True):
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * SIZE_UNITS[unit])
+    return int(text)
+
+
+def format_size(size: int) -> str:
+    """Format bytes with the largest whole unit"""
+    for unit in ('GB', 'MB', 'KB'):
+        if size >= SIZE_UNITS[unit] and size % SIZE_UNITS[unit] == 0:
+            return f"{size // SIZE_UNITS[unit]}{unit}"
+    return f"{size}B"
+
+
+def generate_payload(size: int) -> Iterator[bytes]:
+    """Yield size bytes from a reused random block so memory stays flat"""
+    remaining = size
+    while remaining > 0:
+        chunk = PAYLOAD_BLOCK[:min(remaining, len(PAYLOAD_BLOCK))]
+        remaining -= len(chunk)
+        yield chunk
+
+
+def failure_reason(error: httpx.HTTPError) -> str:
+    """Status and Matrix errcode of a failed request, e.g. '413 M_TOO_LARGE'"""
+    if isinstance(error, httpx.HTTPStatusError):
+        response = error.response
+        try:
+            errcode = response.json().get('errcode')
+        except (ValueError, AttributeError, httpx.StreamError):
+            # Bodies of streamed responses are not always read before the status is raised
+            errcode = None
+        return f"{response.status_code} {errcode or response.reason_phrase}"
+    return type(error).__name__
+
+
+def _phase_metrics(latencies: List[float], total_bytes: int, wall_time: float,
+                   failures: Counter) -> Dict[str, Any]:
+    return {
+        'requests': len(latencies),
+        'errors': sum(failures.values()),
+        'failures': dict(failures),
+        'bytes': total_bytes,
+        'wall_time': wall_time,
+        'mb_per_s': (total_bytes / SIZE_UNITS['MB']) / wall_time if wall_time > 0 else 0.0,
+        'requests_per_s': len(latencies) / wall_time if wall_time > 0 else 0.0,
+        'latency': LatencySummary.from_samples(latencies).to_dict()
+    }
+
+
+class MediaBenchmark:
+    """Upload/download sweep driver"""
+
+    def __init__(self, client: AsyncMatrixClient, requests_per_case: int = 8,
+                 byte_budget: int = 2 * SIZE_UNITS['GB']):
+        self.client = client
+        self.requests_per_case = requests_per_case
+        self.byte_budget = byte_budget
+
+    def plan_requests(self, size: int, concurrency: int) -> int:
+        """Number of uploads for a case, capped so big files stay within the byte budget"""
+        count = max(concurrency, self.requests_per_case)
+        return max(1, min(count, self.byte_budget // size))
+
+    async def _timed_upload(self, size: int, content_type: str, window: asyncio.Semaphore,
+                            latencies: List[float], failures: Counter) -> Optional[Dict[str, Any]]:
+        async with window:
+            start = time.perf_counter()
+            try:
+                result, digest = await self.client.upload_media_stream(
+                    generate_payload(size), content_type, f"bench-{format_size(size)}", size=size
+                )
+            except httpx.HTTPError as e:
+                failures[failure_reason(e)] += 1
+                return None
+            latencies.append(time.perf_counter() - start)
+            return {'content_uri': result['content_uri'], 'digest': digest}
+
+    async def _timed_download(self, upload: Dict[str, Any], window: asyncio.Semaphore,
+                              latencies: List[float], failures: Counter) -> Optional[MediaDigest]:
+        async with window:
+            start = time.perf_counter()
+            try:
+                digest = await self.client.download_media_to(upload['content_uri'])
+            except httpx.HTTPError as e:
+                failures[failure_reason(e)] += 1
+                return None
+            latencies.append(time.perf_counter() - start)
+            return digest
+
+    async def run_case(self, size: int, content_type: str, concurrency: int) -> Dict[str, Any]:
+        """Upload then download a batch of files at one sweep point"""
+        count = self.plan_requests(size, concurrency)
+        window = asyncio.Semaphore(concurrency)
+        self.client.rate_limiter.reset_stats()
+
+        upload_latencies: List[float] = []
+        upload_failures: Counter = Counter()
+        start = time.perf_counter()
+        uploads = await asyncio.gather(*(
+            self._timed_upload(size, content_type, window, upload_latencies, upload_failures)
+            for _ in range(count)
+        ))
+        upload_wall = time.perf_counter() - start
+        uploads = [u for u in uploads if u is not None]
+
+        download_latencies: List[float] = []
+        download_failures: Counter = Counter()
+        start = time.perf_counter()
+        downloads = await asyncio.gather(*(
+            self._timed_download(upload, window, download_latencies, download_failures) for upload in uploads
+        ))
+        download_wall = time.perf_counter() - start
+
+        integrity_failures = sum(
+            1 for upload, digest in zip(uploads, downloads)
+            if digest is not None and digest != upload['digest']
+        )
+
+        return {
+            'upload': _phase_metrics(upload_latencies, size * len(upload_latencies),
+                                     upload_wall, upload_failures),
+            'download': _phase_metrics(download_latencies, size * len(download_latencies),
+                                       download_wall, download_failures),
+            'integrity_failures': integrity_failures,
+            'rate_limit': self.client.rate_limiter.summary()
+        }
+
+    async def sweep(self, sizes: List[int], content_types: List[str],
+                    concurrency_levels: List[int], result: BenchmarkResult):
+        """Run every combination and add it to the result"""
+        for size in sizes:
+            for content_type in content_types:
+                for concurrency in concurrency_levels:
+                    name = f"{format_size(size)} {content_type} x{concurrency}"
+                    print(f"Running {name}...")
+                    metrics = await self.run_case(size, content_type, concurrency)
+                    result.add_case(name, {
+                        'size': size,
+                        'content_type': content_type,
+                        'concurrency': concurrency,
+                        'requests': self.plan_requests(size, concurrency)
+                    }, metrics)
+
+                    upload, download = metrics['upload'], metrics['download']
+                    print(f"  upload {upload['mb_per_s']:.1f} MB/s {upload['requests_per_s']:.1f} req/s "
+                          f"p99={upload['latency']['p99'] * 1000:.0f}ms | "
+                          f"download {download['mb_per_s']:.1f} MB/s {download['requests_per_s']:.1f} req/s "
+                          f"p99={download['latency']['p99'] * 1000:.0f}ms")
+                    for phase in ('upload', 'download'):
+                        for reason, failed in metrics[phase]['failures'].items():
+                            print(f"  ✗ {failed} {phase}(s) failed: {reason}")
+
+
+async def run_benchmark(args) -> BenchmarkResult:
+    """Login and run the configured sweep"""
+    config = TestConfig()
+    sizes = [parse_size(s) for s in args.sizes.split(',')]
+    content_types = [c.strip() for c in args.content_types.split(',')]
+    concurrency_levels = [int(c) for c in args.concurrency.split(',')]
+
+    result = BenchmarkResult(
+        benchmark='media',
+        parameters={
+            'sizes': sizes,
+            'content_types': content_types,
+            'concurrency': concurrency_levels,
+            'requests_per_case': args.requests,
+            'byte_budget': args.byte_budget
+        },
+        environment=benchmark_environment(config.synapse_url)
+    )
+
+    pool = create_http_pool(PoolConfig(max_connections=max(concurrency_levels) * 2,
+                                       request_timeout=args.request_timeout))
+    async with pool:
+        client = AsyncMatrixClient(config, http=pool)
+        await client.ensure_user(args.username, args.password)
+
+        # The default sweep goes past the stack's 50M max_upload_size; only probe sizes the server accepts
+        if args.sizes == DEFAULT_SIZES:
+            try:
+                max_upload = (await client.media_config()).get('m.upload.size')
+            except httpx.HTTPError as e:
+                print(f"⚠ Could not read media config ({failure_reason(e)}), keeping all default sizes")
+                max_upload = None
+            if max_upload:
+                skipped = [s for s in sizes if s > max_upload]
+                sizes = [s for s in sizes if s <= max_upload]
+                if skipped:
+                    print(f"⚠ Skipping sizes above m.upload.size ({format_size(max_upload)}): "
+                          f"{', '.join(format_size(s) for s in skipped)}")
+                result.parameters['sizes'] = sizes
+                result.parameters['max_upload_size'] = max_upload
+
+        benchmark = MediaBenchmark(client, args.requests, args.byte_budget)
+        await benchmark.sweep(sizes, content_types, concurrency_levels, result)
+
+    return result
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description='Synapse media repository throughput benchmark')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES,
+                        help='Comma separated file sizes (the default is capped at the server m.upload.size)')
+    parser.add_argument('--content-types', default=DEFAULT_CONTENT_TYPES, help='Comma separated MIME types')
+    parser.add_argument('--concurrency', default=DEFAULT_CONCURRENCY, help='Comma separated concurrency levels')
+    parser.add_argument('--requests', type=int, default=8, help='Uploads per sweep point')
+    parser.add_argument('--byte-budget', type=parse_size, default=2 * SIZE_UNITS['GB'],
+                        help='Maximum bytes uploaded per sweep point')
+    parser.add_argument('--request-timeout', type=float, default=600, help='Per request timeout in seconds')
+    parser.add_argument('--username', default='bench_media', help='Benchmark account')
+    parser.add_argument('--password', default=os.getenv('TEST_USER_PASSWORD', 'TestPassword123!'))
+    parser.add_argument('--output-dir', '-o', default=DEFAULT_BENCHMARK_DIR, help='Benchmark results directory')
+
+    args = parser.parse_args()
+
+    result = asyncio.run(run_benchmark(args))
+    write_benchmark_result(result, args.output_dir)
+
+    failures = sum(c.metrics['integrity_failures'] for c in result.cases)
+    return 0 if failures == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Presence Storm Benchmark
+Measures what presence updates cost Synapse: sync wake-ups, container CPU and latency of unrelated sends
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import random
+import time
+from typing import Dict, Any, List, Optional
+
+from async_matrix_client import AsyncMatrixClient, create_http_pool, PoolConfig
+from benchmark_results import BenchmarkResult, benchmark_environment, write_benchmark_result, DEFAULT_BENCHMARK_DIR
+from bulk_provisioning import provision_clients
+from container_stats import ContainerStatsSampler, SYNAPSE_CONTAINER
+from latency_stats import LatencySummary
+from session_cache import SessionCache
+from test_synapse_api import TestConfig
+
+
+PRESENCE_STATES = ("online", "unavailable")
+
+
+class PresenceStorm:
+    """Presence togglers and /sync long-pollers sharing one room, plus a sender in a room of its own
+
+    Syncers pass ``set_presence=offline`` so that only the togglers generate
+    presence; a phase at rate 0 is therefore the presence-off baseline. The
+    sender's room has no other members, so its send latency only moves when
+    the homeserver as a whole is busier.
+    """
+
+    def __init__(self, togglers: List[AsyncMatrixClient], syncers: List[AsyncMatrixClient],
+                 sender: AsyncMatrixClient, send_room_id: str, sync_timeout_ms: int = 30000,
+                 send_interval: float = 0.5):
+        self.togglers = togglers
+        self.syncers = syncers
+        self.sender = sender
+        self.send_room_id = send_room_id
+        self.sync_timeout_ms = sync_timeout_ms
+        self.send_interval = send_interval
+
+    async def toggle(self, client: AsyncMatrixClient, rate: float, latencies: List[float]):
+        """Flip between online and unavailable rate times a second until cancelled"""
+        index = random.randrange(len(PRESENCE_STATES))
+        # Spread the togglers out instead of firing them in lockstep
+        await asyncio.sleep(random.uniform(0, 1 / rate))
+        while True:
+            index = (index + 1) % len(PRESENCE_STATES)
+            start = time.perf_counter()
+            await client.set_presence(PRESENCE_STATES[index])
+            latencies.append(time.perf_counter() - start)
+            await asyncio.sleep(max(0.0, 1 / rate - (time.perf_counter() - start)))
+
+    async def long_poll(self, client: AsyncMatrixClient, counters: Dict[str, int]):
+        """Long-poll /sync until cancelled, counting wake-ups and what caused them"""
+        params: Dict[str, Any] = {"timeout": 0, "set_presence": "offline"}
+        resp = await client.request("GET", client._api_url("/client/r0/sync"), params=params)
+        resp.raise_for_status()
+        params.update(since=resp.json()["next_batch"], timeout=self.sync_timeout_ms)
+
+        while True:
+            resp = await client.request("GET", client._api_url("/client/r0/sync"), params=params,
+                                        timeout=self.sync_timeout_ms / 1000 + 30)
+            resp.raise_for_status()
+            data = resp.json()
+            params["since"] = data["next_batch"]
+
+            presence_events = len(data.get("presence", {}).get("events", []))
+            timeline_events = sum(len(room.get("timeline", {}).get("events", []))
+                                  for room in data.get("rooms", {}).get("join", {}).values())
+            counters['wakeups'] += 1
+            counters['presence_events'] += presence_events
+            if presence_events and not timeline_events:
+                counters['presence_only_wakeups'] += 1
+            if not presence_events and not timeline_events:
+                counters['empty_wakeups'] += 1
+
+    async def send(self, latencies: List[float]):
+        """Send a message every send_interval until cancelled"""
+        count = 0
+        while True:
+            start = time.perf_counter()
+            await self.sender.send_message(self.send_room_id, f"presence benchmark message {count}")
+            latencies.append(time.perf_counter() - start)
+            count += 1
+            await asyncio.sleep(max(0.0, self.send_interval - (time.perf_counter() - start)))
+
+    async def run_phase(self, rate: float, duration: float, container: str) -> Dict[str, Any]:
+        """Run togglers at rate updates/s each (0 = no presence traffic) for duration seconds"""
+        presence_latencies: List[float] = []
+        send_latencies: List[float] = []
+        counters = {'wakeups': 0, 'presence_events': 0, 'presence_only_wakeups': 0, 'empty_wakeups': 0}
+
+        tasks = [asyncio.create_task(self.long_poll(c, counters)) for c in self.syncers]
+        if rate > 0:
+            tasks += [asyncio.create_task(self.toggle(c, rate, presence_latencies)) for c in self.togglers]
+        tasks.append(asyncio.create_task(self.send(send_latencies)))
+
+        with ContainerStatsSampler(container) as sampler:
+            done, _ = await asyncio.wait(tasks, timeout=duration, return_when=asyncio.FIRST_EXCEPTION)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for task in done:
+            if not task.cancelled() and task.exception() is not None:
+                raise task.exception()
+
+        minutes = duration / 60
+        return {
+            'duration': duration,
+            'presence_updates': len(presence_latencies),
+            'presence_updates_per_s': len(presence_latencies) / duration,
+            'presence_latency': LatencySummary.from_samples(presence_latencies).to_dict(),
+            'sync': dict(counters, wakeups_per_syncer_per_min=(
+                counters['wakeups'] / len(self.syncers) / minutes if self.syncers else 0.0
+            )),
+            'send_latency': LatencySummary.from_samples(send_latencies).to_dict(),
+            'container': sampler.stats.to_dict()
+        }
+
+
+def presence_cost(baseline: Dict[str, Any], phase: Dict[str, Any]) -> Dict[str, Any]:
+    """What a presence phase costs relative to the presence-off baseline"""
+    def ratio(new: Optional[float], old: Optional[float]) -> Optional[float]:
+        return new / old if new is not None and old else None
+
+    base_cpu = baseline['container']['cpu_percent']['mean']
+    cpu = phase['container']['cpu_percent']['mean']
+    return {
+        'cpu_percent_delta': cpu - base_cpu if cpu is not None and base_cpu is not None else None,
+        'send_p50_inflation': ratio(phase['send_latency']['p50'], baseline['send_latency']['p50']),
+        'send_p95_inflation': ratio(phase['send_latency']['p95'], baseline['send_latency']['p95']),
+        'extra_wakeups_per_syncer_per_min': (phase['sync']['wakeups_per_syncer_per_min']
+                                             - baseline['sync']['wakeups_per_syncer_per_min'])
+    }
+
+
+def _format_cpu(value: Optional[float]) -> str:
+    return f"{value:.1f}%" if value is not None else "n/a"
+
+
+async def run_benchmark(args) -> BenchmarkResult:
+    """Run the presence-off baseline, then one phase per toggle rate"""
+    config = TestConfig()
+    rates = [float(r) for r in args.rates.split(',')]
+    if 0.0 not in rates:
+        rates.insert(0, 0.0)
+    rates.sort()
+
+    result = BenchmarkResult(
+        benchmark='presence',
+        parameters={
+            'togglers': args.togglers,
+            'syncers': args.syncers,
+            'rates': rates,
+            'duration': args.duration,
+            'sync_timeout_ms': args.sync_timeout_ms,
+            'send_interval': args.send_interval,
+            'container': args.container
+        },
+        environment=benchmark_environment(config.synapse_url)
+    )
+
+    pool = create_http_pool(PoolConfig(max_connections=(args.togglers + args.syncers) * 2 + 10))
+    async with pool:
+        toggler_names = [f"{args.user_prefix}toggler_{i:04d}" for i in range(args.togglers)]
+        syncer_names = [f"{args.user_prefix}syncer_{i:04d}" for i in range(args.syncers)]
+        print(f"Provisioning {args.togglers} togglers, {args.syncers} syncers and a sender...")
+        clients = await provision_clients(config, pool, toggler_names + syncer_names + [f"{args.user_prefix}sender"],
+                                          args.password, session_cache=SessionCache())
+        togglers, syncers, sender = clients[:args.togglers], clients[args.togglers:-1], clients[-1]
+
+        # Presence is only delivered between users who share a room
+        crowd = togglers + syncers
+        room = await crowd[0].create_room("Presence Benchmark", public=True)
+        await asyncio.gather(*(c.join_room(room["room_id"]) for c in crowd[1:]))
+        send_room = await sender.create_room("Presence Benchmark Sends")
+
+        storm = PresenceStorm(togglers, syncers, sender, send_room["room_id"],
+                              args.sync_timeout_ms, args.send_interval)
+
+        baseline = None
+        for rate in rates:
+            name = "presence off" if rate == 0 else f"{rate:g} updates/s per toggler"
+            print(f"Running {name} for {args.duration:.0f}s...")
+            metrics = await storm.run_phase(rate, args.duration, args.container)
+            if baseline is None:
+                baseline = metrics
+            else:
+                metrics['cost'] = presence_cost(baseline, metrics)
+            result.add_case(name, {'rate': rate, 'togglers': len(togglers), 'syncers': len(syncers)}, metrics)
+
+            print(f"  {metrics['presence_updates_per_s']:.1f} presence updates/s, "
+                  f"{metrics['sync']['wakeups_per_syncer_per_min']:.1f} wake-ups/syncer/min, "
+                  f"send p95={metrics['send_latency']['p95'] * 1000:.0f}ms, "
+                  f"CPU {_format_cpu(metrics['container']['cpu_percent']['mean'])}")
+            if 'cost' in metrics and metrics['cost']['send_p95_inflation'] is not None:
+                cpu_delta = metrics['cost']['cpu_percent_delta']
+                print(f"  vs presence off: send p95 x{metrics['cost']['send_p95_inflation']:.2f}"
+                      + (f", CPU {cpu_delta:+.1f}%" if cpu_delta is not None else ""))
+
+            await asyncio.sleep(args.settle)
+
+    return result
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description='Presence update storm benchmark')
+    parser.add_argument('--togglers', type=int, default=20, help='Clients toggling presence')
+    parser.add_argument('--syncers', type=int, default=20, help='Clients long-polling /sync')
+    parser.add_argument('--rates', default='0,0.1,0.5,2', help='Comma separated presence updates/s per toggler')
+    parser.add_argument('--duration', type=float, default=60, help='Seconds per phase')
+    parser.add_argument('--settle', type=float, default=5, help='Pause between phases')
+    parser.add_argument('--sync-timeout-ms', type=int, default=30000, help='/sync long-poll timeout')
+    parser.add_argument('--send-interval', type=float, default=0.5, help='Seconds between unrelated sends')
+    parser.add_argument('--container', default=SYNAPSE_CONTAINER, help='Container sampled with docker stats')
+    parser.add_argument('--user-prefix', default='bench_presence_', help='Benchmark account prefix')
+    parser.add_argument('--password', default=os.getenv('TEST_USER_PASSWORD', 'TestPassword123!'))
+    parser.add_argument('--output-dir', '-o', default=DEFAULT_BENCHMARK_DIR, help='Benchmark results directory')
+
+    args = parser.parse_args()
+
+    result = asyncio.run(run_benchmark(args))
+    write_benchmark_result(result, args.output_dir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
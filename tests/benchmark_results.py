@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark Result Files
+Common JSON format written by the benchmark tools and rendered by run_tests.py
+"""
+
+import sys
+import json
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+
+import requests
+
+
+DEFAULT_BENCHMARK_DIR = "test-reports/benchmarks"
+
+
+@dataclass
+class BenchmarkCase:
+    """One point in a benchmark sweep"""
+    name: str
+    parameters: Dict[str, Any]
+    metrics: Dict[str, Any]
+
+
+@dataclass
+class BenchmarkResult:
+    """Complete result of one benchmark run"""
+    benchmark: str
+    parameters: Dict[str, Any]
+    cases: List[BenchmarkCase] = field(default_factory=list)
+    environment: Dict[str, Any] = field(default_factory=dict)
+    timestamp: str = field(default_factory=lambda: datetime.now().isoformat())
+
+    def add_case(self, name: str, parameters: Dict[str, Any], metrics: Dict[str, Any]) -> BenchmarkCase:
+        """Record a sweep point"""
+        case = BenchmarkCase(name=name, parameters=parameters, metrics=metrics)
+        self.cases.append(case)
+        return case
+
+
+def fetch_server_version(synapse_url: str) -> Optional[str]:
+    """Synapse version from the admin server_version endpoint, if reachable"""
+    try:
+        resp = requests.get(f"{synapse_url}/_synapse/admin/v1/server_version", timeout=5)
+        if resp.status_code == 200:
+            return resp.json().get('server_version')
+    except (requests.RequestException, ValueError):
+        pass
+    return None
+
+
+def benchmark_environment(synapse_url: str) -> Dict[str, Any]:
+    """Environment details recorded with every result, so runs compare across Synapse versions"""
+    return {
+        'synapse_url': synapse_url,
+        'synapse_version': fetch_server_version(synapse_url),
+        'python_version': sys.version.split()[0],
+        'platform': sys.platform
+    }
+
+
+def write_benchmark_result(result: BenchmarkResult, output_dir: str = DEFAULT_BENCHMARK_DIR) -> Path:
+    """Write a result as <output_dir>/<benchmark>_<timestamp>.json"""
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+
+    stamp = datetime.fromisoformat(result.timestamp).strftime('%Y%m%d_%H%M%S')
+    result_file = output_path / f"{result.benchmark}_{stamp}.json"
+
+    with open(result_file, 'w') as f:
+        json.dump(asdict(result), f, indent=2)
+
+    print(f"Benchmark results written: {result_file.absolute()}")
+    return result_file
+
+
+def load_benchmark_results(output_dir: str = DEFAULT_BENCHMARK_DIR) -> List[Dict[str, Any]]:
+    """Load every benchmark result file in a directory, oldest first"""
+    output_path = Path(output_dir)
+    if not output_path.is_dir():
+        return []
+
+    results = []
+    for result_file in sorted(output_path.glob('*.json')):
+        try:
+            with open(result_file, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not read benchmark result {result_file}: {e}")
+            continue
+
+        if 'benchmark' in data and 'cases' in data:
+            data['source_file'] = str(result_file)
+            results.append(data)
+
+    return sorted(results, key=lambda r: r.get('timestamp', ''))
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Large-Room State Benchmark
+Grows a community room through member-count tiers and traces join latency, /state and /members cost
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import time
+from typing import Dict, Any, List
+
+from async_matrix_client import AsyncMatrixClient, create_http_pool, PoolConfig
+from benchmark_results import BenchmarkResult, benchmark_environment, write_benchmark_result, DEFAULT_BENCHMARK_DIR
+from bulk_provisioning import provision_clients
+from latency_stats import LatencySummary
+from session_cache import SessionCache
+from test_synapse_api import TestConfig
+
+
+# Keyed state type for the bulk of the generated state, so it accumulates rather than replaces
+BENCHMARK_STATE_TYPE = "org.voicestack.benchmark.state"
+
+
+class RoomStateScenario:
+    """Builds one public room with a growing membership and a fixed amount of extra state
+
+    State is a mix of what community rooms collect over time: power-level
+    updates naming more and more moderators, name and topic churn, and keyed
+    state events (think widgets or pinned items) that each add a new entry to
+    the current state.
+    """
+
+    def __init__(self, owner: AsyncMatrixClient, members: List[AsyncMatrixClient], concurrency: int = 16):
+        self.owner = owner
+        self.members = members
+        self.concurrency = concurrency
+        self.room_id: str = ""
+        self.joined = 0  # members[:joined] are in the room
+        self.moderators: Dict[str, int] = {}
+
+    async def create(self, state_events: int) -> str:
+        """Create the room and send state_events pieces of state"""
+        room = await self.owner.create_room(f"State Benchmark x{state_events}", "Large room benchmark", public=True)
+        self.room_id = room["room_id"]
+
+        for i in range(state_events):
+            kind = i % 4
+            if kind == 0:
+                # Power levels grow with the membership, like a room handing out moderator rights
+                moderator = self.members[len(self.moderators) % len(self.members)] if self.members else self.owner
+                self.moderators[moderator.user_id] = 50
+                content = {"users": {self.owner.user_id: 100, **self.moderators}, "users_default": 0}
+                await self.owner.send_state_event(self.room_id, "m.room.power_levels", content)
+            elif kind == 1:
+                await self.owner.send_state_event(self.room_id, "m.room.name", {"name": f"State Benchmark {i}"})
+            elif kind == 2:
+                await self.owner.send_state_event(self.room_id, "m.room.topic", {"topic": f"Revision {i}"})
+            else:
+                await self.owner.send_state_event(self.room_id, BENCHMARK_STATE_TYPE,
+                                                  {"index": i, "body": "x" * 64}, state_key=f"item_{i}")
+        return self.room_id
+
+    async def grow_to(self, member_count: int):
+        """Join members until member_count of them are in the room"""
+        window = asyncio.Semaphore(self.concurrency)
+
+        async def join(member: AsyncMatrixClient):
+            async with window:
+                await member.join_room(self.room_id)
+
+        target = min(member_count, len(self.members))
+        await asyncio.gather(*(join(m) for m in self.members[self.joined:target]))
+        self.joined = max(self.joined, target)
+
+    async def timed_joins(self, count: int) -> List[float]:
+        """Join the next count members one at a time, returning each join's latency"""
+        latencies = []
+        for member in self.members[self.joined:self.joined + count]:
+            start = time.perf_counter()
+            await member.join_room(self.room_id)
+            latencies.append(time.perf_counter() - start)
+            self.joined += 1
+        return latencies
+
+    async def timed_get(self, path: str, repeats: int) -> Dict[str, Any]:
+        """Time an authenticated GET of a room endpoint and record its response size"""
+        samples, size, items = [], 0, 0
+        for _ in range(repeats):
+            start = time.perf_counter()
+            resp = await self.owner.request("GET", self.owner._api_url(f"/client/r0/rooms/{self.room_id}{path}"))
+            resp.raise_for_status()
+            samples.append(time.perf_counter() - start)
+            size = len(resp.content)
+            data = resp.json()
+            items = len(data["chunk"] if isinstance(data, dict) else data)
+        return {
+            'latency': LatencySummary.from_samples(samples).to_dict(),
+            'bytes': size,
+            'events': items
+        }
+
+
+async def run_benchmark(args) -> BenchmarkResult:
+    """Grow one room per state-event count through the member tiers"""
+    config = TestConfig()
+    member_tiers = sorted(int(n) for n in args.members.split(','))
+    state_counts = sorted(int(n) for n in args.state_events.split(','))
+
+    result = BenchmarkResult(
+        benchmark='room_state',
+        parameters={
+            'member_tiers': member_tiers,
+            'state_events': state_counts,
+            'joins_per_tier': args.joins_per_tier,
+            'repeats': args.repeats
+        },
+        environment=benchmark_environment(config.synapse_url)
+    )
+
+    pool = create_http_pool(PoolConfig(max_connections=args.concurrency * 4, request_timeout=300))
+    async with pool:
+        # The last joins_per_tier members of each tier are the timed joiners
+        member_names = [f"{args.user_prefix}member_{i:05d}" for i in range(max(member_tiers))]
+        owner_name = f"{args.user_prefix}owner"
+        print(f"Provisioning {len(member_names)} members...")
+        clients = await provision_clients(config, pool, [owner_name] + member_names, args.password,
+                                          session_cache=SessionCache())
+        owner, members = clients[0], clients[1:]
+
+        for state_events in state_counts:
+            scenario = RoomStateScenario(owner, members, args.concurrency)
+            print(f"Creating room with {state_events} state events...")
+            await scenario.create(state_events)
+
+            for tier in member_tiers:
+                joins = min(args.joins_per_tier, tier - scenario.joined)
+                await scenario.grow_to(tier - joins)
+                join_latencies = await scenario.timed_joins(joins)
+
+                state = await scenario.timed_get("/state", args.repeats)
+                member_list = await scenario.timed_get("/members", args.repeats)
+
+                join = LatencySummary.from_samples(join_latencies)
+                name = f"{tier} members, {state_events} state events"
+                result.add_case(name, {'members': tier, 'state_events': state_events}, {
+                    'join_latency': join.to_dict(),
+                    'state': state,
+                    'members': member_list
+                })
+
+                print(f"  N={tier:>6}  join p50={join.p50 * 1000:6.0f}ms  "
+                      f"/state {state['latency']['p50'] * 1000:6.0f}ms {state['bytes'] / 1024:8.0f}KB  "
+                      f"/members {member_list['latency']['p50'] * 1000:6.0f}ms {member_list['bytes'] / 1024:8.0f}KB")
+
+    return result
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description='Large-room join and state benchmark')
+    parser.add_argument('--members', default='10,50,100,250,500,1000', help='Comma separated member-count tiers (N)')
+    parser.add_argument('--state-events', default='0,200', help='Comma separated extra state events per room (M)')
+    parser.add_argument('--joins-per-tier', type=int, default=5, help='Timed joins that complete each tier')
+    parser.add_argument('--repeats', type=int, default=5, help='/state and /members fetches per tier')
+    parser.add_argument('--concurrency', '-c', type=int, default=16, help='Untimed joins in parallel')
+    parser.add_argument('--user-prefix', default='bench_state_', help='Benchmark account prefix')
+    parser.add_argument('--password', default=os.getenv('TEST_USER_PASSWORD', 'TestPassword123!'))
+    parser.add_argument('--output-dir', '-o', default=DEFAULT_BENCHMARK_DIR, help='Benchmark results directory')
+
+    args = parser.parse_args()
+
+    result = asyncio.run(run_benchmark(args))
+    write_benchmark_result(result, args.output_dir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
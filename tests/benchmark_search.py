@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Message Search Benchmark
+Loads a family-chat corpus and times /search keyword, multi-term and room-filtered queries
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import random
+import subprocess
+import time
+from urllib.parse import quote
+from typing import Dict, Any, List, Iterator, Optional
+
+import httpx
+
+from async_matrix_client import AsyncMatrixClient, create_http_pool, PoolConfig
+from benchmark_results import BenchmarkResult, benchmark_environment, write_benchmark_result, DEFAULT_BENCHMARK_DIR
+from bulk_provisioning import provision_clients
+from latency_stats import LatencySummary
+from session_cache import SessionCache
+from test_synapse_api import TestConfig
+
+
+POSTGRES_CONTAINER = os.getenv('POSTGRES_CONTAINER', 'voice-stack-postgres')
+POSTGRES_USER = os.getenv('POSTGRES_USER', 'synapse')
+POSTGRES_DB = os.getenv('POSTGRES_DB', 'synapse')
+
+SEED_BATCH = 500
+
+# Vocabulary roughly in order of how often a household uses it; drawn Zipf-style below
+_COMMON = (
+    "the you to and it is for that on at can we in this be are have with dinner home "
+    "tonight tomorrow pick up school love ok thanks just now get need kids time today "
+    "call back later going weekend mum dad store car late soon work practice game milk "
+    "bread groceries doctor appointment birthday party grandma grandpa photo photos trip "
+    "holiday beach park dog walk homework bus train movie pizza lunch breakfast morning"
+).split()
+_RARE = (
+    "passport insurance mortgage plumber dentist vaccination recital graduation anniversary "
+    "reunion wedding funeral christening allotment caravan lasagne rhubarb marmalade "
+    "orthodontist physiotherapy landlord boiler"
+).split()
+_NAMES = ("Alice", "Ben", "Chloe", "Dan", "Ella", "Finn", "Grace", "Harry", "Isla", "Jack")
+
+# (kind, search term, restrict to one room)
+DEFAULT_QUERIES = [
+    ('keyword_common', 'dinner', False),
+    ('keyword_rare', 'passport', False),
+    ('keyword_name', 'grandma', False),
+    ('multi_term_common', 'pick up kids school', False),
+    ('multi_term_mixed', 'dentist appointment tomorrow', False),
+    ('multi_term_rare', 'boiler plumber landlord', False),
+    ('room_filtered_common', 'dinner', True),
+    ('room_filtered_multi', 'birthday party photos', True),
+]
+
+
+class CorpusGenerator:
+    """Deterministic, chat-like message bodies
+
+    Word frequencies follow a Zipf-like curve over a household vocabulary,
+    with rare words (documents, appointments, events) sprinkled in, so common
+    and rare search terms have realistic selectivity. Seeded, so two runs
+    against fresh servers index the same text.
+    """
+
+    def __init__(self, seed: int = 42, rare_rate: float = 0.03):
+        self.random = random.Random(seed)
+        self.rare_rate = rare_rate
+        self._weights = [1 / (rank + 1) for rank in range(len(_COMMON))]
+
+    def message(self) -> str:
+        """One message body"""
+        length = max(2, int(self.random.lognormvariate(2.0, 0.6)))
+        words = self.random.choices(_COMMON, weights=self._weights, k=length)
+        for i in range(length):
+            if self.random.random() < self.rare_rate:
+                words[i] = self.random.choice(_RARE)
+        if self.random.random() < 0.2:
+            words.insert(0, f"{self.random.choice(_NAMES)},")
+        text = " ".join(words)
+        return text[0].upper() + text[1:] + self.random.choice((".", "!", "?", "", " :)"))
+
+    def messages(self, count: int) -> Iterator[str]:
+        """count message bodies"""
+        for _ in range(count):
+            yield self.message()
+
+
+async def lift_rate_limit(config: TestConfig, http: httpx.AsyncClient, user_id: str) -> bool:
+    """Exempt the corpus sender from message rate limiting via the admin API, if a token is configured"""
+    if not config.admin_token:
+        return False
+    resp = await http.post(
+        f"{config.synapse_url}/_synapse/admin/v1/users/{quote(user_id)}/override_ratelimit",
+        json={"messages_per_second": 0, "burst_count": 0},
+        headers={"Authorization": f"Bearer {config.admin_token}"}
+    )
+    return resp.status_code == 200
+
+
+async def seed_corpus(senders: List[AsyncMatrixClient], room_ids: List[str], messages: int,
+                      generator: CorpusGenerator, in_flight: int = 16):
+    """Spread messages across the rooms in pipelined batches, rotating senders per batch"""
+    sent = 0
+    batch_number = 0
+    while sent < messages:
+        batch_size = min(SEED_BATCH, messages - sent)
+        per_room = {room_id: [] for room_id in room_ids}
+        for i, body in enumerate(generator.messages(batch_size)):
+            per_room[room_ids[i % len(room_ids)]].append(body)
+
+        sender = senders[batch_number % len(senders)]
+        results = await sender.send_message_batches({r: b for r, b in per_room.items() if b},
+                                                    in_flight=in_flight, ordered=False)
+        failed = [a for acks in results.values() for a in acks if a.error]
+        if failed:
+            raise RuntimeError(f"{len(failed)} seed messages failed, e.g. {failed[0].error}")
+
+        sent += batch_size
+        batch_number += 1
+        if batch_number % 20 == 0 or sent == messages:
+            print(f"  seeded {sent}/{messages}")
+
+
+async def run_query(client: AsyncMatrixClient, term: str, rooms: Optional[List[str]],
+                    repeats: int, limit: int) -> Dict[str, Any]:
+    """Run one search repeatedly and summarise its latency"""
+    samples = []
+    count = 0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        response = await client.search(term, rooms=rooms, limit=limit)
+        samples.append(time.perf_counter() - start)
+        count = response.get("count", len(response.get("results", [])))
+    return {
+        'latency': LatencySummary.from_samples(samples).to_dict(),
+        'result_count': count
+    }
+
+
+def explain_sql(term: str, rooms: List[str]) -> str:
+    """EXPLAIN ANALYZE of the query Synapse issues on PostgreSQL for a room_events search"""
+    def literal(value: str) -> str:
+        return "'" + value.replace("'", "''") + "'"
+
+    room_list = ", ".join(literal(r) for r in rooms)
+    return (
+        "EXPLAIN (ANALYZE, BUFFERS) "
+        "SELECT ts_rank_cd(vector, websearch_to_tsquery('english', {q})) AS rank, room_id, event_id "
+        "FROM event_search "
+        "WHERE vector @@ websearch_to_tsquery('english', {q}) AND room_id IN ({rooms}) "
+        "ORDER BY rank DESC LIMIT 500"
+    ).format(q=literal(term), rooms=room_list)
+
+
+def explain_analyze(sql: str, container: str = POSTGRES_CONTAINER) -> Dict[str, Any]:
+    """Run an EXPLAIN through psql in the postgres container"""
+    cmd = ['docker', 'exec', '-i', container, 'psql', '-U', POSTGRES_USER, '-d', POSTGRES_DB,
+           '-X', '-q', '-A', '-t', '-c', sql]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
+    except (subprocess.TimeoutExpired, FileNotFoundError) as e:
+        return {'plan': None, 'error': str(e)}
+    if result.returncode != 0:
+        return {'plan': None, 'error': result.stderr.strip()}
+    return {'plan': result.stdout.rstrip(), 'error': None}
+
+
+async def run_benchmark(args) -> BenchmarkResult:
+    """Seed (or reuse) the corpus rooms, run every query kind and explain the slowest"""
+    config = TestConfig()
+
+    result = BenchmarkResult(
+        benchmark='search',
+        parameters={
+            'messages': args.messages,
+            'rooms': args.rooms,
+            'senders': args.senders,
+            'repeats': args.repeats,
+            'limit': args.limit,
+            'explain_slowest': args.explain_slowest
+        },
+        environment=benchmark_environment(config.synapse_url)
+    )
+
+    pool = create_http_pool(PoolConfig(request_timeout=300))
+    async with pool:
+        names = [f"{args.user_prefix}{i}" for i in range(args.senders)]
+        senders = await provision_clients(config, pool, names, args.password, session_cache=SessionCache())
+        searcher = senders[0]
+
+        room_ids = (await searcher.joined_rooms())[:args.rooms]
+        if len(room_ids) < args.rooms or args.reseed:
+            for sender in senders:
+                if await lift_rate_limit(config, pool, sender.user_id):
+                    print(f"  rate limit lifted for {sender.user_id}")
+
+            room_ids = []
+            for i in range(args.rooms):
+                room = await searcher.create_room(f"Search Corpus {i}", invite=[s.user_id for s in senders[1:]])
+                await asyncio.gather(*(s.join_room(room["room_id"]) for s in senders[1:]))
+                room_ids.append(room["room_id"])
+
+            print(f"Seeding {args.messages} messages into {args.rooms} rooms...")
+            started = time.perf_counter()
+            await seed_corpus(senders, room_ids, args.messages, CorpusGenerator(args.seed), args.in_flight)
+            elapsed = time.perf_counter() - started
+            print(f"  {args.messages / elapsed:.0f} messages/s")
+        else:
+            print(f"Reusing {len(room_ids)} corpus rooms (pass --reseed to load a fresh corpus)")
+
+        cases = []
+        for kind, term, room_filtered in DEFAULT_QUERIES + [('custom', t, False) for t in args.query]:
+            rooms = room_ids[:1] if room_filtered else None
+            print(f"Running {kind}: {term!r}{' in one room' if room_filtered else ''}...")
+            metrics = await run_query(searcher, term, rooms, args.repeats, args.limit)
+            cases.append((kind, term, rooms, metrics))
+            print(f"  {metrics['result_count']} results, "
+                  f"{LatencySummary(**metrics['latency']).format_ms()}")
+
+    slowest = sorted(cases, key=lambda c: c[3]['latency']['p95'], reverse=True)[:args.explain_slowest]
+    for kind, term, rooms, metrics in slowest:
+        print(f"EXPLAIN ANALYZE for {kind}: {term!r}...")
+        metrics['explain'] = explain_analyze(explain_sql(term, rooms or room_ids), args.postgres_container)
+        if metrics['explain']['error']:
+            print(f"  ⚠ {metrics['explain']['error']}")
+
+    for kind, term, rooms, metrics in cases:
+        result.add_case(f"{kind}: {term}", {
+            'kind': kind,
+            'search_term': term,
+            'room_filtered': rooms is not None
+        }, metrics)
+
+    return result
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description='Full-text /search benchmark')
+    parser.add_argument('--messages', type=int, default=1_000_000, help='Corpus size when seeding')
+    parser.add_argument('--rooms', type=int, default=20, help='Rooms the corpus is spread across')
+    parser.add_argument('--senders', type=int, default=4, help='Family members sending the corpus')
+    parser.add_argument('--seed', type=int, default=42, help='Corpus generator seed')
+    parser.add_argument('--reseed', action='store_true', help='Load a new corpus even if rooms exist')
+    parser.add_argument('--in-flight', type=int, default=16, help='Pipelined sends per room while seeding')
+    parser.add_argument('--query', action='append', default=[], help='Extra search term (repeatable)')
+    parser.add_argument('--repeats', type=int, default=10, help='Runs per query')
+    parser.add_argument('--limit', type=int, default=10, help='Results per search request')
+    parser.add_argument('--explain-slowest', type=int, default=3, help='Queries to EXPLAIN ANALYZE')
+    parser.add_argument('--postgres-container', default=POSTGRES_CONTAINER, help='Container for docker exec psql')
+    parser.add_argument('--user-prefix', default='bench_search_', help='Benchmark account prefix')
+    parser.add_argument('--password', default=os.getenv('TEST_USER_PASSWORD', 'TestPassword123!'))
+    parser.add_argument('--output-dir', '-o', default=DEFAULT_BENCHMARK_DIR, help='Benchmark results directory')
+
+    args = parser.parse_args()
+
+    result = asyncio.run(run_benchmark(args))
+    write_benchmark_result(result, args.output_dir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Bulk User Provisioning
+Concurrent shared-secret registration for onboarding households and seeding load tests
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Iterable
+from dataclasses import dataclass, field, asdict
+
+import httpx
+
+from async_matrix_client import AsyncMatrixClient, create_http_pool, PoolConfig
+from latency_stats import LatencySummary
+from session_cache import SessionCache
+from test_synapse_api import TestConfig
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from create_matrix_admin import calculate_hmac  # noqa: E402
+
+
+REGISTER_ENDPOINT = "/_synapse/admin/v1/register"
+
+
+@dataclass
+class UserSpec:
+    """User to provision"""
+    username: str
+    password: str
+    admin: bool = False
+
+
+@dataclass
+class ProvisioningResult:
+    """Outcome for a single user"""
+    username: str
+    status: str  # created, existing, failed
+    latency: float
+    user_id: Optional[str] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class ProvisioningReport:
+    """Summary of a bulk provisioning run"""
+    total: int
+    created: int
+    existing: int
+    failed: int
+    duration: float
+    throughput: float  # users per second
+    latency: Dict[str, Any]
+    results: List[ProvisioningResult] = field(default_factory=list)
+
+
+@dataclass
+class _SignedRequest:
+    """Registration body with its HMAC already computed"""
+    spec: UserSpec
+    nonce: str
+    mac: str
+
+
+class BulkProvisioner:
+    """Pipelined nonce -> HMAC -> register engine
+
+    Nonces are fetched ahead of time into a bounded queue (Synapse expires them
+    after 60s, so the queue is kept small), HMACs are computed a batch at a time
+    and registrations run with at most ``concurrency`` requests in flight.
+    Users that already exist are reported as ``existing`` rather than failing,
+    so a run can be repeated safely.
+    """
+
+    def __init__(self, config: TestConfig, http: Optional[httpx.AsyncClient] = None,
+                 concurrency: int = 32, hmac_batch_size: int = 64,
+                 nonce_prefetch: Optional[int] = None):
+        self.config = config
+        self.http = http
+        self.concurrency = max(1, concurrency)
+        self.hmac_batch_size = max(1, hmac_batch_size)
+        self.nonce_prefetch = nonce_prefetch or self.concurrency * 2
+
+    def _register_url(self) -> str:
+        return f"{self.config.synapse_url}{REGISTER_ENDPOINT}"
+
+    async def _fetch_nonce(self, http: httpx.AsyncClient) -> str:
+        resp = await http.get(self._register_url())
+        resp.raise_for_status()
+        return resp.json()["nonce"]
+
+    def _sign(self, spec: UserSpec, nonce: str) -> _SignedRequest:
+        mac = calculate_hmac(
+            self.config.registration_secret, nonce, spec.username, spec.password, is_admin=spec.admin
+        )
+        return _SignedRequest(spec=spec, nonce=nonce, mac=mac)
+
+    async def _nonce_fetcher(self, http: httpx.AsyncClient, nonces: asyncio.Queue, remaining: List[int]):
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            try:
+                await nonces.put(await self._fetch_nonce(http))
+            except (httpx.HTTPError, KeyError, ValueError) as e:
+                await nonces.put(e)
+
+    async def _signer(self, users: List[UserSpec], nonces: asyncio.Queue, signed: asyncio.Queue,
+                      results: List[ProvisioningResult]):
+        for start in range(0, len(users), self.hmac_batch_size):
+            batch = users[start:start + self.hmac_batch_size]
+            pairs = [(spec, await nonces.get()) for spec in batch]
+
+            # HMACs for the whole batch are computed back to back before any is queued
+            ready = []
+            for spec, nonce in pairs:
+                if isinstance(nonce, Exception):
+                    results.append(ProvisioningResult(
+                        username=spec.username, status="failed", latency=0.0,
+                        error=f"nonce fetch failed: {nonce}"
+                    ))
+                else:
+                    ready.append(self._sign(spec, nonce))
+
+            for request in ready:
+                await signed.put(request)
+
+        for _ in range(self.concurrency):
+            await signed.put(None)
+
+    async def _register(self, http: httpx.AsyncClient, request: _SignedRequest) -> ProvisioningResult:
+        spec = request.spec
+        data = {
+            "nonce": request.nonce,
+            "username": spec.username,
+            "password": spec.password,
+            "admin": spec.admin,
+            "mac": request.mac
+        }
+
+        start = time.perf_counter()
+        try:
+            resp = await http.post(self._register_url(), json=data)
+            latency = time.perf_counter() - start
+
+            if resp.status_code == 200:
+                return ProvisioningResult(
+                    username=spec.username, status="created", latency=latency,
+                    user_id=resp.json().get("user_id")
+                )
+
+            errcode = None
+            try:
+                errcode = resp.json().get("errcode")
+            except ValueError:
+                pass
+
+            if errcode == "M_USER_IN_USE":
+                return ProvisioningResult(
+                    username=spec.username, status="existing", latency=latency,
+                    user_id=f"@{spec.username}:{self.config.server_name}"
+                )
+
+            return ProvisioningResult(
+                username=spec.username, status="failed", latency=latency,
+                error=f"HTTP {resp.status_code}: {resp.text[:200]}"
+            )
+        except httpx.HTTPError as e:
+            return ProvisioningResult(
+                username=spec.username, status="failed", latency=time.perf_counter() - start,
+                error=str(e)
+            )
+
+    async def _registrar(self, http: httpx.AsyncClient, signed: asyncio.Queue,
+                         results: List[ProvisioningResult]):
+        while True:
+            request = await signed.get()
+            if request is None:
+                return
+            results.append(await self._register(http, request))
+
+    async def provision(self, users: Iterable[UserSpec]) -> ProvisioningReport:
+        """Register all users and return throughput and latency figures"""
+        users = list(users)
+        results: List[ProvisioningResult] = []
+
+        http = self.http or create_http_pool(PoolConfig(max_connections=self.concurrency * 2))
+        nonces: asyncio.Queue = asyncio.Queue(maxsize=self.nonce_prefetch)
+        signed: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency)
+        remaining = [len(users)]
+
+        start = time.perf_counter()
+        try:
+            fetchers = [
+                asyncio.create_task(self._nonce_fetcher(http, nonces, remaining))
+                for _ in range(min(self.concurrency, max(1, len(users))))
+            ]
+            registrars = [
+                asyncio.create_task(self._registrar(http, signed, results))
+                for _ in range(self.concurrency)
+            ]
+            await self._signer(users, nonces, signed, results)
+            await asyncio.gather(*fetchers, *registrars)
+        finally:
+            if self.http is None:
+                await http.aclose()
+        duration = time.perf_counter() - start
+
+        registered = [r for r in results if r.status in ("created", "existing")]
+        return ProvisioningReport(
+            total=len(users),
+            created=sum(1 for r in results if r.status == "created"),
+            existing=sum(1 for r in results if r.status == "existing"),
+            failed=sum(1 for r in results if r.status == "failed"),
+            duration=duration,
+            throughput=len(registered) / duration if duration > 0 else 0.0,
+            latency=LatencySummary.from_samples([r.latency for r in registered]).to_dict(),
+            results=results
+        )
+
+
+def generate_users(prefix: str, count: int, password: str, start: int = 0) -> List[UserSpec]:
+    """Build a numbered population of users, e.g. loadtest_00001"""
+    width = max(5, len(str(start + count)))
+    return [UserSpec(username=f"{prefix}{i:0{width}d}", password=password)
+            for i in range(start, start + count)]
+
+
+async def provision_clients(config: TestConfig, http: httpx.AsyncClient, usernames: List[str],
+                            password: str, concurrency: int = 32,
+                            session_cache: Optional[SessionCache] = None) -> List[AsyncMatrixClient]:
+    """Provision users if needed and return logged-in clients sharing one pool
+
+    With a session_cache, cached tokens are reused instead of logging every
+    user in again.
+    """
+    provisioner = BulkProvisioner(config, http=http, concurrency=concurrency)
+    report = await provisioner.provision(UserSpec(username=name, password=password) for name in usernames)
+    if report.failed:
+        failures = [r for r in report.results if r.status == "failed"]
+        raise RuntimeError(f"{report.failed} users failed to provision, e.g. "
+                           f"{failures[0].username}: {failures[0].error}")
+
+    clients = [AsyncMatrixClient(config, http=http) for _ in usernames]
+    window = asyncio.Semaphore(concurrency)
+
+    async def login(client: AsyncMatrixClient, username: str):
+        async with window:
+            if session_cache is None:
+                await client.login(username, password)
+            else:
+                client.restore_session(await asyncio.to_thread(
+                    session_cache.ensure_session, config.synapse_url, username, password))
+
+    await asyncio.gather(*(login(client, name) for client, name in zip(clients, usernames)))
+    return clients
+
+
+def print_report(report: ProvisioningReport):
+    """Print provisioning summary to console"""
+    latency = LatencySummary(**report.latency)
+    print(f"Provisioned {report.total} users in {report.duration:.1f}s "
+          f"({report.throughput:.1f} users/s)")
+    print(f"  Created: {report.created}")
+    print(f"  Existing (skipped): {report.existing}")
+    print(f"  Failed: {report.failed}")
+    print(f"  Registration latency: {latency.format_ms()}")
+
+    for result in report.results:
+        if result.status == "failed":
+            print(f"  ✗ {result.username}: {result.error}")
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description='Bulk shared-secret user provisioning')
+    parser.add_argument('--count', '-n', type=int, default=100, help='Number of users to provision')
+    parser.add_argument('--prefix', default='loadtest_', help='Username prefix')
+    parser.add_argument('--start', type=int, default=0, help='First user number')
+    parser.add_argument('--concurrency', '-c', type=int, default=32, help='Registrations in flight')
+    parser.add_argument('--hmac-batch-size', type=int, default=64, help='HMACs computed per batch')
+    parser.add_argument('--password', default=os.getenv('TEST_USER_PASSWORD', 'TestPassword123!'),
+                        help='Password for every provisioned user')
+    parser.add_argument('--output', '-o', help='Write the JSON report to this file')
+
+    args = parser.parse_args()
+
+    config = TestConfig()
+    provisioner = BulkProvisioner(config, concurrency=args.concurrency,
+                                  hmac_batch_size=args.hmac_batch_size)
+    users = generate_users(args.prefix, args.count, args.password, args.start)
+
+    report = asyncio.run(provisioner.provision(users))
+    print_report(report)
+
+    if args.output:
+        output_path = Path(args.output)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_path, 'w') as f:
+            json.dump(asdict(report), f, indent=2)
+        print(f"JSON report written: {output_path.absolute()}")
+
+    return 0 if report.failed == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
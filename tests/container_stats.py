@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Container Resource Sampler
+Polls `docker stats` for a voice-stack container in the background while a benchmark runs
+"""
+
+import os
+import re
+import time
+import shutil
+import threading
+import subprocess
+from typing import Dict, Any, List, Optional
+from dataclasses import dataclass, field
+
+from latency_stats import percentile
+
+
+SYNAPSE_CONTAINER = os.getenv('SYNAPSE_CONTAINER', 'voice-stack-synapse')
+
+_UNITS = {'b': 1, 'kb': 1000, 'kib': 1024, 'mb': 1000 ** 2, 'mib': 1024 ** 2,
+          'gb': 1000 ** 3, 'gib': 1024 ** 3, 'tb': 1000 ** 4, 'tib': 1024 ** 4}
+
+
+def parse_size(value: str) -> Optional[float]:
+    """Bytes from a docker size string such as '123.4MiB' or '1.2GB'"""
+    match = re.match(r'\s*([\d.]+)\s*([a-zA-Z]*)', value)
+    if not match:
+        return None
+    unit = (match.group(2) or 'b').lower()
+    return float(match.group(1)) * _UNITS.get(unit, 1)
+
+
+@dataclass
+class ContainerSample:
+    """One `docker stats` reading"""
+    timestamp: float
+    cpu_percent: float  # of one core, so 200% is two cores busy
+    memory_bytes: Optional[float]
+
+
+@dataclass
+class ContainerStats:
+    """Summary of the samples taken during one phase"""
+    container: str
+    available: bool
+    samples: List[ContainerSample] = field(default_factory=list)
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to a JSON-serialisable dict"""
+        cpu = [s.cpu_percent for s in self.samples]
+        memory = [s.memory_bytes for s in self.samples if s.memory_bytes is not None]
+        return {
+            'container': self.container,
+            'available': self.available,
+            'error': self.error,
+            'samples': len(self.samples),
+            'cpu_percent': {
+                'mean': sum(cpu) / len(cpu) if cpu else None,
+                'p95': percentile(cpu, 95) if cpu else None,
+                'max': max(cpu) if cpu else None
+            },
+            'memory_bytes_max': max(memory) if memory else None
+        }
+
+
+class ContainerStatsSampler:
+    """Background `docker stats --no-stream` poller
+
+    Use as a context manager around the measured section. Without a docker
+    CLI, or with the container not running, the result is marked unavailable
+    instead of failing the benchmark, so the same scripts run against a local
+    stand-in.
+    """
+
+    def __init__(self, container: str = SYNAPSE_CONTAINER, interval: float = 1.0):
+        self.container = container
+        self.interval = interval
+        self.stats = ContainerStats(container=container, available=shutil.which('docker') is not None)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> 'ContainerStatsSampler':
+        if self.stats.available:
+            self._thread = threading.Thread(target=self._run, name=f"stats-{self.container}", daemon=True)
+            self._thread.start()
+        else:
+            self.stats.error = 'docker CLI not found'
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 15)
+
+    def sample(self) -> Optional[ContainerSample]:
+        """Take one reading, or None (with stats.error set) if docker could not provide it"""
+        try:
+            result = subprocess.run(
+                ['docker', 'stats', '--no-stream', '--format', '{{.CPUPerc}}|{{.MemUsage}}', self.container],
+                capture_output=True, text=True, timeout=15
+            )
+        except (subprocess.TimeoutExpired, FileNotFoundError) as e:
+            self.stats.error = str(e)
+            return None
+
+        if result.returncode != 0:
+            self.stats.error = result.stderr.strip() or f"docker stats exited with {result.returncode}"
+            return None
+
+        cpu, _, memory = result.stdout.strip().partition('|')
+        try:
+            cpu_percent = float(cpu.strip().rstrip('%'))
+        except ValueError:
+            self.stats.error = f"unexpected docker stats output: {result.stdout.strip()!r}"
+            return None
+        return ContainerSample(time.time(), cpu_percent, parse_size(memory.split('/')[0]))
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            reading = self.sample()
+            if reading is not None:
+                self.stats.samples.append(reading)
+            elif not self.stats.samples:
+                # Never got a reading: the container is not there, stop polling
+                self.stats.available = False
+                return
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - started)))
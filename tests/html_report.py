@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+HTML Report Renderer
+Streams the test run report through a Jinja2 template straight to disk
+"""
+
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+from jinja2 import Environment, FileSystemLoader
+from markupsafe import Markup
+
+
+TEMPLATE_DIR = Path(__file__).parent / 'templates'
+REPORT_TEMPLATE = 'test_report.html.j2'
+
+SPARKLINE_WIDTH = 80
+SPARKLINE_HEIGHT = 16
+
+
+def flatten_metrics(metrics: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    """Flatten nested benchmark metrics into dotted column names"""
+    flat = {}
+    for key, value in metrics.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten_metrics(value, f"{name}."))
+        else:
+            flat[name] = value
+    return flat
+
+
+def format_metric(value: Any) -> str:
+    """Format a benchmark metric for a table cell"""
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    return str(value)
+
+
+def benchmark_tables(benchmarks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """One table per benchmark result file, with the union of metric columns across its cases"""
+    tables = []
+    for benchmark in benchmarks:
+        rows = [(case['name'], flatten_metrics(case['metrics'])) for case in benchmark['cases']]
+        columns = []
+        for _, metrics in rows:
+            columns.extend(key for key in metrics if key not in columns)
+        tables.append({
+            'name': benchmark['benchmark'],
+            'timestamp': benchmark.get('timestamp', ''),
+            'columns': columns,
+            'rows': [(name, [format_metric(metrics.get(c)) for c in columns]) for name, metrics in rows]
+        })
+    return tables
+
+
+@lru_cache(maxsize=None)
+def _x_positions(points: int, width: int) -> Tuple[str, ...]:
+    return tuple(f"{round(i * width / (points - 1))}," for i in range(points))
+
+
+def sparkline(values: Optional[Sequence[float]], width: int = SPARKLINE_WIDTH,
+              height: int = SPARKLINE_HEIGHT) -> Markup:
+    """Inline SVG polyline of durations, oldest on the left; empty for fewer than two points"""
+    if not values or len(values) < 2:
+        return Markup("")
+    low, high = min(values), max(values)
+    scale = (height - 2) / ((high - low) or 1.0)
+    top = height - 1
+    # Called once per test, so whole-pixel coordinates and cached x positions keep 10k rows cheap
+    points = " ".join([x + str(round(top - (v - low) * scale))
+                       for x, v in zip(_x_positions(len(values), width), values)])
+    title = f"{len(values)} runs, {low:.2f}s - {high:.2f}s"
+    return Markup(f'<svg width="{width}" height="{height}"><title>{title}</title>'
+                  f'<polyline class="spark" points="{points}"/></svg>')
+
+
+def write_html_report(report, output_file: Path,
+                      test_history: Optional[Dict[str, List[float]]] = None,
+                      suite_history: Optional[Dict[str, List[float]]] = None):
+    """Render a TestRunReport to output_file incrementally
+
+    The template is streamed in buffered chunks rather than built as one
+    string, and every value is autoescaped, so test output containing HTML
+    cannot break the page.
+    """
+    env = Environment(loader=FileSystemLoader(str(TEMPLATE_DIR)), autoescape=True,
+                      trim_blocks=True, lstrip_blocks=True)
+    env.globals['sparkline'] = sparkline
+    template = env.get_template(REPORT_TEMPLATE)
+
+    stream = template.stream(
+        report=report,
+        summary=report.summary,
+        startup=report.environment.get('startup_timeline'),
+        benchmarks=benchmark_tables(report.benchmarks),
+        test_history=test_history or {},
+        suite_history=suite_history or {}
+    )
+    stream.enable_buffering(64)
+
+    output_path = Path(output_file)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        stream.dump(f)
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Latency Statistics Helpers
+Percentile summaries and histograms shared by the provisioning and benchmark tooling
+"""
+
+import math
+from dataclasses import dataclass, asdict
+from typing import Dict, Any, Sequence, Tuple, Optional
+
+
+def percentile(samples: Sequence[float], pct: float) -> float:
+    """Return the pct-th percentile (0-100) using linear interpolation"""
+    if not samples:
+        return 0.0
+
+    ordered = sorted(samples)
+    if len(ordered) == 1:
+        return ordered[0]
+
+    rank = (pct / 100.0) * (len(ordered) - 1)
+    lower = math.floor(rank)
+    upper = math.ceil(rank)
+    if lower == upper:
+        return ordered[lower]
+
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+@dataclass
+class LatencySummary:
+    """Latency distribution summary in seconds"""
+    count: int
+    mean: float
+    p50: float
+    p95: float
+    p99: float
+    max: float
+
+    @classmethod
+    def from_samples(cls, samples: Sequence[float]) -> 'LatencySummary':
+        """Summarise a list of latency samples"""
+        if not samples:
+            return cls(count=0, mean=0.0, p50=0.0, p95=0.0, p99=0.0, max=0.0)
+
+        return cls(
+            count=len(samples),
+            mean=sum(samples) / len(samples),
+            p50=percentile(samples, 50),
+            p95=percentile(samples, 95),
+            p99=percentile(samples, 99),
+            max=max(samples)
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to a JSON-serialisable dict"""
+        return asdict(self)
+
+    def format_ms(self) -> str:
+        """Format the summary in milliseconds for console output"""
+        return (f"p50={self.p50 * 1000:.1f}ms p95={self.p95 * 1000:.1f}ms "
+                f"p99={self.p99 * 1000:.1f}ms max={self.max * 1000:.1f}ms (n={self.count})")
+
+
+class LatencyHistogram:
+    """HDR-style log-linear latency histogram
+
+    Samples are recorded in microseconds into buckets whose width doubles with
+    each power of two, with enough sub-buckets per power to keep
+    ``significant_digits`` of precision. Memory is bounded by the value range
+    rather than the sample count, and histograms from many recipients can be
+    merged before reading percentiles.
+    """
+
+    REPORT_PERCENTILES = (50, 75, 90, 95, 99, 99.9, 99.99, 100)
+
+    def __init__(self, significant_digits: int = 3):
+        self.significant_digits = significant_digits
+        self.sub_bucket_bits = math.ceil(math.log2(2 * 10 ** significant_digits))
+        self.counts: Dict[Tuple[int, int], int] = {}
+        self.total = 0
+        self.sum_us = 0
+        self.min_us: Optional[int] = None
+        self.max_us = 0
+
+    def _bucket(self, value_us: int) -> Tuple[int, int]:
+        shift = max(0, value_us.bit_length() - self.sub_bucket_bits)
+        return shift, value_us >> shift
+
+    def record(self, seconds: float, count: int = 1):
+        """Record a latency sample in seconds"""
+        value_us = max(0, int(round(seconds * 1_000_000)))
+        bucket = self._bucket(value_us)
+        self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.total += count
+        self.sum_us += value_us * count
+        self.min_us = value_us if self.min_us is None else min(self.min_us, value_us)
+        self.max_us = max(self.max_us, value_us)
+
+    def merge(self, other: 'LatencyHistogram'):
+        """Add another histogram's samples into this one"""
+        if other.sub_bucket_bits != self.sub_bucket_bits:
+            raise ValueError("Cannot merge histograms with different precision")
+        for bucket, count in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.total += other.total
+        self.sum_us += other.sum_us
+        if other.min_us is not None:
+            self.min_us = other.min_us if self.min_us is None else min(self.min_us, other.min_us)
+        self.max_us = max(self.max_us, other.max_us)
+
+    def value_at_percentile(self, pct: float) -> float:
+        """Highest value (seconds) in the bucket holding the pct-th percentile"""
+        if self.total == 0:
+            return 0.0
+
+        target = max(1, math.ceil(pct / 100.0 * self.total))
+        seen = 0
+        for shift, mantissa in sorted(self.counts):
+            seen += self.counts[(shift, mantissa)]
+            if seen >= target:
+                upper_us = ((mantissa + 1) << shift) - 1
+                return min(upper_us, self.max_us) / 1_000_000
+
+        return self.max_us / 1_000_000
+
+    def summary(self) -> LatencySummary:
+        """Summarise as a LatencySummary"""
+        if self.total == 0:
+            return LatencySummary.from_samples([])
+
+        return LatencySummary(
+            count=self.total,
+            mean=self.sum_us / self.total / 1_000_000,
+            p50=self.value_at_percentile(50),
+            p95=self.value_at_percentile(95),
+            p99=self.value_at_percentile(99),
+            max=self.max_us / 1_000_000
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Summary plus a percentile ladder for plotting and cross-run comparison"""
+        data = self.summary().to_dict()
+        data['min'] = (self.min_us or 0) / 1_000_000
+        data['percentiles'] = {
+            str(pct): self.value_at_percentile(pct) for pct in self.REPORT_PERCENTILES
+        }
+        return data
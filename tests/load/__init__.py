@@ -0,0 +1,4 @@
+"""
+Household Load Test Workload
+Locust users wrapping MatrixClient to model family usage of the voice stack
+"""
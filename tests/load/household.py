@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Household Load Profile
+Workload weights, the Locust-aware MatrixClient and conversion of Locust stats into benchmark results
+"""
+
+import os
+import sys
+import random
+from pathlib import Path
+from urllib.parse import quote
+from typing import Dict, Any, List, Optional
+from dataclasses import dataclass, asdict
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from benchmark_results import BenchmarkResult, benchmark_environment  # noqa: E402
+from rate_limit import endpoint_key  # noqa: E402
+from test_synapse_api import TestConfig, MatrixClient  # noqa: E402
+
+
+@dataclass
+class LoadProfile:
+    """Household workload mix from environment variables
+
+    Weights are relative task frequencies for an active household member;
+    idle phones are modelled by a separate user class doing nothing but
+    /sync long-polls.
+    """
+    user_prefix: str = os.getenv('LOAD_USER_PREFIX', 'household_')
+    user_pool: int = int(os.getenv('LOAD_USER_POOL', '50'))
+    password: str = os.getenv('TEST_USER_PASSWORD', 'TestPassword123!')
+    rooms: int = int(os.getenv('LOAD_ROOMS', '4'))
+    idle_weight: int = int(os.getenv('LOAD_IDLE_USERS_WEIGHT', '3'))
+    active_weight: int = int(os.getenv('LOAD_ACTIVE_USERS_WEIGHT', '1'))
+    sync_weight: int = int(os.getenv('LOAD_WEIGHT_SYNC', '10'))
+    message_burst_weight: int = int(os.getenv('LOAD_WEIGHT_MESSAGE_BURST', '5'))
+    photo_weight: int = int(os.getenv('LOAD_WEIGHT_PHOTO', '1'))
+    presence_weight: int = int(os.getenv('LOAD_WEIGHT_PRESENCE', '2'))
+    join_weight: int = int(os.getenv('LOAD_WEIGHT_JOIN', '1'))
+    burst_size: int = int(os.getenv('LOAD_BURST_SIZE', '5'))
+    photo_size: int = int(os.getenv('LOAD_PHOTO_SIZE', str(2 * 1024 * 1024)))
+    sync_timeout_ms: int = int(os.getenv('LOAD_SYNC_TIMEOUT_MS', '30000'))
+    think_time_min: float = float(os.getenv('LOAD_THINK_TIME_MIN', '1'))
+    think_time_max: float = float(os.getenv('LOAD_THINK_TIME_MAX', '5'))
+    results_dir: str = os.getenv('LOAD_RESULTS_DIR', 'test-reports/benchmarks')
+
+    def room_alias_name(self, index: int) -> str:
+        return f"{self.user_prefix}room_{index}"
+
+    def username(self, index: int) -> str:
+        return f"{self.user_prefix}{index:05d}"
+
+
+# Shared sync filter: timeline only, so idle phones measure notification cost rather than payload size
+IDLE_SYNC_FILTER = {
+    "room": {"timeline": {"limit": 10}, "state": {"lazy_load_members": True}},
+    "presence": {"types": ["m.presence"]},
+}
+
+
+class HouseholdClient(MatrixClient):
+    """MatrixClient with the idempotent setup steps a load run needs"""
+
+    def ensure_login(self, username: str, password: str):
+        """Log in, registering the user first if it does not exist yet"""
+        try:
+            self.login(username, password)
+        except requests.HTTPError as e:
+            if e.response is None or e.response.status_code != 403:
+                raise
+            try:
+                self.register_user(username, password)
+            except requests.HTTPError as register_error:
+                if register_error.response is None or register_error.response.status_code != 400:
+                    raise
+            self.login(username, password)
+
+    def resolve_alias(self, alias: str) -> Optional[str]:
+        """Room ID for an alias, or None if it does not exist"""
+        resp = self._request("GET", self._api_url(f"/client/r0/directory/room/{quote(alias, safe=':')}"))
+        if resp.status_code == 404:
+            return None
+        resp.raise_for_status()
+        return resp.json()["room_id"]
+
+    def ensure_household_room(self, alias_name: str) -> str:
+        """Create a public household room under an alias, or find the existing one"""
+        alias = f"#{alias_name}:{self.config.server_name}"
+        room_id = self.resolve_alias(alias)
+        if room_id:
+            return room_id
+
+        data = {
+            "name": alias_name.replace('_', ' ').title(),
+            "preset": "public_chat",
+            "visibility": "private",
+            "room_alias_name": alias_name
+        }
+        resp = self._request("POST", self._api_url("/client/r0/createRoom"), json=data)
+        if resp.status_code == 400:
+            # Another worker created it first
+            room_id = self.resolve_alias(alias)
+            if not room_id:
+                raise RuntimeError(f"Could not create {alias} and it does not resolve: {resp.text}")
+            return room_id
+        resp.raise_for_status()
+        return resp.json()["room_id"]
+
+    def send_image(self, room_id: str, mxc_url: str, size: int, filename: str = "photo.jpg") -> Dict[str, Any]:
+        """Post an uploaded photo to a room"""
+        data = {
+            "msgtype": "m.image",
+            "body": filename,
+            "url": mxc_url,
+            "info": {"mimetype": "image/jpeg", "size": size}
+        }
+        resp = self._request(
+            "PUT",
+            self._api_url(f"/client/r0/rooms/{room_id}/send/m.room.message/{self.txn_ids.next_id()}"),
+            json=data
+        )
+        resp.raise_for_status()
+        return resp.json()
+
+
+class LocustMatrixClient(HouseholdClient):
+    """MatrixClient whose requests are reported to Locust under endpoint names
+
+    The session is Locust's HttpSession, so every request shows up in the
+    stats grouped like '/_matrix/client/r0/rooms/{roomId}/send/...' instead
+    of one row per room or transaction ID.
+    """
+
+    def __init__(self, config: TestConfig, http_session):
+        super().__init__(config)
+        self.session = http_session
+
+    def _request(self, method: str, url: str, retry: bool = True, **kwargs) -> requests.Response:
+        endpoint = endpoint_key(method, url)
+        name = endpoint.split(' ', 1)[1]
+        return self.rate_limiter.call(
+            endpoint,
+            lambda: self.session.request(method, url, name=name, **kwargs),
+            retry=retry
+        )
+
+
+def photo_payload(size: int) -> bytes:
+    """JPEG-looking bytes; the media repository only cares about size and content type"""
+    return b"\xff\xd8\xff\xe0" + random.randbytes(max(0, size - 4))
+
+
+def _entry_metrics(entry) -> Dict[str, Any]:
+    return {
+        'requests': entry.num_requests,
+        'failures': entry.num_failures,
+        'requests_per_s': entry.total_rps,
+        'latency': {
+            'mean': entry.avg_response_time / 1000,
+            'p50': entry.get_response_time_percentile(0.50) / 1000,
+            'p95': entry.get_response_time_percentile(0.95) / 1000,
+            'p99': entry.get_response_time_percentile(0.99) / 1000,
+            'max': entry.max_response_time / 1000
+        }
+    }
+
+
+def benchmark_from_stats(stats, profile: LoadProfile, user_count: int, config: TestConfig) -> BenchmarkResult:
+    """Convert Locust request stats into the benchmark result format run_tests.py renders"""
+    result = BenchmarkResult(
+        benchmark='household_load',
+        parameters=dict(asdict(profile), users=user_count, password=None),
+        environment=benchmark_environment(config.synapse_url)
+    )
+
+    entries: List = sorted(stats.entries.values(), key=lambda e: (e.name, e.method))
+    for entry in entries:
+        result.add_case(f"{entry.method} {entry.name}", {'method': entry.method}, _entry_metrics(entry))
+    result.add_case('Aggregated', {}, _entry_metrics(stats.total))
+    return result
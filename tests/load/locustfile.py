@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Household Locust Workload
+Idle phones long-polling /sync plus active members chatting, sharing photos and moving between rooms
+
+Run headless against the local stack:
+    locust -f tests/load/locustfile.py --headless -u 50 -r 5 -t 5m \\
+        --host http://localhost:8008 --csv test-reports/load/household
+"""
+
+import sys
+import io
+import time
+import random
+import itertools
+from dataclasses import replace
+from pathlib import Path
+from typing import List
+
+from locust import HttpUser, task, between, constant, events
+from locust.exception import StopUser
+from locust.runners import WorkerRunner
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from household import (  # noqa: E402
+    LoadProfile, HouseholdClient, LocustMatrixClient, IDLE_SYNC_FILTER, benchmark_from_stats, photo_payload
+)
+from benchmark_results import write_benchmark_result  # noqa: E402
+from test_synapse_api import TestConfig  # noqa: E402
+
+
+PROFILE = LoadProfile()
+BASE_CONFIG = TestConfig()
+
+ROOM_IDS: List[str] = []
+_user_numbers = itertools.count()
+
+
+def _config_for(host: str) -> TestConfig:
+    return replace(BASE_CONFIG, synapse_url=(host or BASE_CONFIG.synapse_url).rstrip('/'))
+
+
+@events.test_start.add_listener
+def create_household_rooms(environment, **kwargs):
+    """Create (or find) the shared household rooms before users spawn"""
+    organiser = HouseholdClient(_config_for(environment.host))
+    try:
+        organiser.ensure_login(PROFILE.username(0), PROFILE.password)
+        ROOM_IDS[:] = [organiser.ensure_household_room(PROFILE.room_alias_name(i)) for i in range(PROFILE.rooms)]
+    except Exception as e:
+        ROOM_IDS[:] = []
+        print(f"✗ Could not set up household rooms: {e}")
+
+    if not ROOM_IDS:
+        # Users cannot do anything without rooms, so stop rather than report a run of errors
+        environment.process_exit_code = 1
+        if environment.runner:
+            environment.runner.quit()
+        raise RuntimeError("No household rooms are ready; aborting the load test")
+    print(f"Household rooms ready: {len(ROOM_IDS)}")
+
+
+@events.quitting.add_listener
+def write_results(environment, **kwargs):
+    """Write the run's stats as a benchmark result for run_tests.py"""
+    if isinstance(environment.runner, WorkerRunner):
+        return
+
+    users = getattr(environment.parsed_options, 'num_users', None) if environment.parsed_options else None
+    result = benchmark_from_stats(environment.stats, PROFILE, users, _config_for(environment.host))
+    write_benchmark_result(result, PROFILE.results_dir)
+
+
+class HouseholdMember(HttpUser):
+    """Base user: logs in as the next account from the household pool"""
+    abstract = True
+
+    def on_start(self):
+        username = PROFILE.username(1 + next(_user_numbers) % PROFILE.user_pool)
+        self.matrix = LocustMatrixClient(_config_for(self.host), self.client)
+        self.matrix.ensure_login(username, PROFILE.password)
+
+        if not ROOM_IDS:
+            raise StopUser()
+        self.rooms = random.sample(ROOM_IDS, k=max(1, len(ROOM_IDS) // 2))
+        for room_id in self.rooms:
+            self.matrix.join_room(room_id)
+
+        self.since = self.matrix.sync(sync_filter=IDLE_SYNC_FILTER)["next_batch"]
+
+
+class IdlePhone(HouseholdMember):
+    """Phone in a pocket: nothing but /sync long-polls waiting for notifications"""
+    weight = PROFILE.idle_weight
+    wait_time = constant(0)
+
+    @task
+    def long_poll(self):
+        response = self.matrix.sync(self.since, PROFILE.sync_timeout_ms, IDLE_SYNC_FILTER)
+        self.since = response["next_batch"]
+
+
+class ActiveMember(HouseholdMember):
+    """Someone using the app: catching up, chatting in bursts, sharing photos"""
+    weight = PROFILE.active_weight
+    wait_time = between(PROFILE.think_time_min, PROFILE.think_time_max)
+
+    @task(PROFILE.sync_weight)
+    def open_app(self):
+        response = self.matrix.sync(self.since, 0, IDLE_SYNC_FILTER)
+        self.since = response["next_batch"]
+
+    @task(PROFILE.message_burst_weight)
+    def message_burst(self):
+        room_id = random.choice(self.rooms)
+        for i in range(PROFILE.burst_size):
+            self.matrix.send_message(room_id, f"household chatter {i + 1}/{PROFILE.burst_size}")
+            time.sleep(random.uniform(0.2, 1.5))  # typing time between messages
+
+    @task(PROFILE.photo_weight)
+    def share_photo(self):
+        payload = photo_payload(PROFILE.photo_size)
+        upload, _ = self.matrix.upload_media_stream(io.BytesIO(payload), "image/jpeg", "photo.jpg")
+        self.matrix.send_image(random.choice(self.rooms), upload["content_uri"], len(payload))
+
+    @task(PROFILE.presence_weight)
+    def update_presence(self):
+        self.matrix.set_presence(random.choice(["online", "unavailable"]))
+
+    @task(PROFILE.join_weight)
+    def switch_room(self):
+        room_id = random.choice(ROOM_IDS)
+        self.matrix.join_room(room_id)
+        if room_id not in self.rooms:
+            self.rooms.append(room_id)
@@ -0,0 +1,1009 @@
+#!/usr/bin/env python3
+"""
+Local Synapse Stand-in
+In-process asyncio HTTP server implementing the client-server API subset used by MatrixClient
+"""
+
+import sys
+import re
+import json
+import time
+import hmac
+import hashlib
+import random
+import secrets
+import argparse
+import asyncio
+import threading
+from bisect import bisect_right
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs, unquote
+from typing import Dict, Any, List, Optional, Set, Tuple, Callable
+from dataclasses import dataclass, field
+
+
+@dataclass
+class StandInConfig:
+    """Behaviour of the stand-in server"""
+    server_name: str = 'localhost'
+    registration_secret: str = 'test_secret'
+    latency: float = 0.0  # seconds added to every response except /sync long-poll waits
+    latency_jitter: float = 0.0  # extra uniform random latency, seconds
+    server_version: str = 'local-standin'
+    message_rate: float = 0.0  # sends per second per user, like Synapse rc_message; 0 disables
+    message_burst: int = 10
+
+
+@dataclass
+class Request:
+    """Parsed HTTP request"""
+    method: str
+    path: str
+    query: Dict[str, str]
+    headers: Dict[str, str]
+    body: bytes
+
+    def json(self) -> Dict[str, Any]:
+        return json.loads(self.body or b'{}')
+
+
+@dataclass
+class Response:
+    """HTTP response to write back"""
+    status: int
+    body: bytes
+    content_type: str = 'application/json'
+
+    @classmethod
+    def json(cls, data: Any, status: int = 200) -> 'Response':
+        return cls(status=status, body=json.dumps(data).encode())
+
+    @classmethod
+    def error(cls, status: int, errcode: str, error: str, **extra) -> 'Response':
+        return cls.json(dict(errcode=errcode, error=error, **extra), status=status)
+
+
+class MatrixError(Exception):
+    """Raised by handlers to return a Matrix error response"""
+
+    def __init__(self, status: int, errcode: str, error: str, **extra):
+        super().__init__(error)
+        self.response = Response.error(status, errcode, error, **extra)
+
+
+@dataclass
+class _User:
+    user_id: str
+    password: str
+    admin: bool
+    presence: Dict[str, Any] = field(default_factory=lambda: {"presence": "offline"})
+    presence_stream: int = 0
+    last_active: float = field(default_factory=time.time)
+    created: float = field(default_factory=time.time)
+    deactivated: bool = False
+
+
+@dataclass
+class _Media:
+    content: bytes
+    content_type: str
+    uploader: str
+    upload_name: Optional[str] = None
+    created_ts: int = field(default_factory=lambda: int(time.time() * 1000))
+
+
+@dataclass
+class _Room:
+    room_id: str
+    join_rule: str
+    state: Dict[Tuple[str, str], Dict[str, Any]] = field(default_factory=dict)
+    events: List[Dict[str, Any]] = field(default_factory=list)
+    streams: List[int] = field(default_factory=list)  # stream ordering of events, for bisect
+
+    def membership(self, user_id: str) -> Optional[str]:
+        event = self.state.get(("m.room.member", user_id))
+        return event["content"]["membership"] if event else None
+
+
+CLIENT = r'/_matrix/client/(?:r0|v3)'
+MEDIA = r'/_matrix/media/(?:r0|v3)'
+ADMIN = r'/_synapse/admin'
+
+
+class LocalSynapse:
+    """In-memory Matrix homeserver stand-in
+
+    Implements shared-secret registration with nonces, password login,
+    createRoom, invite/join, send, state, messages, members, search, /sync
+    long-poll with filters, presence, media upload/download and the admin
+    list and purge APIs. Everything is kept in memory; configurable latency
+    is injected before each response so client throughput work can be
+    benchmarked without Docker.
+    """
+
+    def __init__(self, config: Optional[StandInConfig] = None):
+        self.config = config or StandInConfig()
+        self.users: Dict[str, _User] = {}
+        self.tokens: Dict[str, Tuple[str, str]] = {}  # access_token -> (user_id, device_id)
+        self.rooms: Dict[str, _Room] = {}
+        self.media: Dict[str, _Media] = {}
+        self.filters: Dict[str, Dict[str, Any]] = {}
+        self.aliases: Dict[str, str] = {}  # #alias:server -> room_id
+        self.nonces: Dict[str, float] = {}
+        self.txns: Dict[Tuple[str, str, str], str] = {}  # (token, room, txn_id) -> event_id
+        self.buckets: Dict[str, Tuple[float, float]] = {}  # user_id -> (tokens, updated_at)
+        self.purges: Dict[str, Dict[str, Any]] = {}  # purge_id -> status
+        self.request_count = 0
+
+        self._stream = 0
+        self._notifier: Optional[asyncio.Condition] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: Set[asyncio.Task] = set()
+        self.url: Optional[str] = None
+
+        self._routes: List[Tuple[str, 're.Pattern', Callable]] = []
+        self._add_routes()
+
+    # ------------------------------------------------------------------ routing
+
+    def _route(self, method: str, pattern: str, handler: Callable):
+        self._routes.append((method, re.compile(f"^{pattern}$"), handler))
+
+    def _add_routes(self):
+        r = self._route
+        r('GET', '/health', self.handle_health)
+        r('GET', '/_matrix/client/versions', self.handle_versions)
+        r('GET', '/_synapse/admin/v1/server_version', self.handle_server_version)
+        for register in ('/_synapse/admin/v1/register', f'{CLIENT}/admin/register'):
+            r('GET', register, self.handle_register_nonce)
+            r('POST', register, self.handle_shared_secret_register)
+        r('POST', f'{CLIENT}/register', self.handle_open_register)
+        r('POST', f'{CLIENT}/login', self.handle_login)
+        r('GET', f'{CLIENT}/account/whoami', self.handle_whoami)
+        r('POST', f'{CLIENT}/user/([^/]+)/filter', self.handle_create_filter)
+        r('POST', f'{CLIENT}/createRoom', self.handle_create_room)
+        r('POST', f'{CLIENT}/rooms/([^/]+)/invite', self.handle_invite)
+        r('POST', f'{CLIENT}/rooms/([^/]+)/join', self.handle_join)
+        r('POST', f'{CLIENT}/join/([^/]+)', self.handle_join)
+        r('GET', f'{CLIENT}/directory/room/([^/]+)', self.handle_resolve_alias)
+        r('GET', f'{CLIENT}/joined_rooms', self.handle_joined_rooms)
+        r('PUT', f'{CLIENT}/rooms/([^/]+)/send/([^/]+)/([^/]+)', self.handle_send)
+        r('PUT', f'{CLIENT}/rooms/([^/]+)/state/([^/]+)(?:/([^/]*))?', self.handle_put_state)
+        r('GET', f'{CLIENT}/rooms/([^/]+)/state', self.handle_get_state)
+        r('GET', f'{CLIENT}/rooms/([^/]+)/members', self.handle_members)
+        r('GET', f'{CLIENT}/rooms/([^/]+)/messages', self.handle_messages)
+        r('POST', f'{CLIENT}/search', self.handle_search)
+        r('GET', f'{CLIENT}/sync', self.handle_sync)
+        r('PUT', f'{CLIENT}/presence/([^/]+)/status', self.handle_put_presence)
+        r('GET', f'{CLIENT}/presence/([^/]+)/status', self.handle_get_presence)
+        r('POST', f'{MEDIA}/upload', self.handle_upload)
+        r('GET', f'{MEDIA}/download/([^/]+)/([^/]+)(?:/[^/]*)?', self.handle_download)
+        r('GET', f'{ADMIN}/v2/users', self.handle_admin_list_users)
+        r('GET', f'{ADMIN}/v2/users/([^/]+)', self.handle_admin_user)
+        r('GET', f'{ADMIN}/v1/users/([^/]+)/media', self.handle_admin_user_media)
+        r('GET', f'{ADMIN}/v1/rooms', self.handle_admin_list_rooms)
+        r('GET', f'{ADMIN}/v1/rooms/([^/]+)', self.handle_admin_room)
+        r('POST', f'{ADMIN}/v1/purge_history/([^/]+)', self.handle_admin_purge_history)
+        r('GET', f'{ADMIN}/v1/purge_history_status/([^/]+)', self.handle_admin_purge_status)
+        r('DELETE', f'{ADMIN}/v1/media/([^/]+)/([^/]+)', self.handle_admin_delete_media)
+        r('POST', f'{ADMIN}/v1/purge_media_cache', self.handle_admin_purge_media_cache)
+
+    async def dispatch(self, request: Request) -> Response:
+        """Route a request to its handler"""
+        self.request_count += 1
+        path_matched = False
+        for method, pattern, handler in self._routes:
+            match = pattern.match(request.path)
+            if not match:
+                continue
+            path_matched = True
+            if method != request.method:
+                continue
+
+            args = [unquote(g) if g is not None else None for g in match.groups()]
+            try:
+                response = await handler(request, *args)
+            except MatrixError as e:
+                response = e.response
+            except (ValueError, KeyError) as e:
+                response = Response.error(400, 'M_BAD_JSON', str(e))
+
+            if request.path.endswith('/sync'):
+                return response
+            await self._inject_latency()
+            return response
+
+        await self._inject_latency()
+        if path_matched:
+            return Response.error(405, 'M_UNRECOGNIZED', 'Method not allowed')
+        return Response.error(404, 'M_UNRECOGNIZED', 'Unrecognized request')
+
+    async def _inject_latency(self):
+        delay = self.config.latency + random.uniform(0, self.config.latency_jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    # ------------------------------------------------------------------ helpers
+
+    def _auth(self, request: Request) -> Tuple[str, str]:
+        header = request.headers.get('authorization', '')
+        token = header[7:] if header.startswith('Bearer ') else request.query.get('access_token')
+        if not token:
+            raise MatrixError(401, 'M_MISSING_TOKEN', 'Missing access token')
+        if token not in self.tokens:
+            raise MatrixError(401, 'M_UNKNOWN_TOKEN', 'Invalid access token')
+        return self.tokens[token]
+
+    def _room(self, room_id: str) -> _Room:
+        room = self.rooms.get(room_id)
+        if room is None:
+            raise MatrixError(404, 'M_NOT_FOUND', 'Unknown room')
+        return room
+
+    def _require_member(self, room: _Room, user_id: str):
+        if room.membership(user_id) != 'join':
+            raise MatrixError(403, 'M_FORBIDDEN', f"User {user_id} not in room {room.room_id}")
+
+    def _user_id(self, localpart_or_id: str) -> str:
+        if localpart_or_id.startswith('@'):
+            return localpart_or_id
+        return f"@{localpart_or_id}:{self.config.server_name}"
+
+    def _check_rate_limit(self, user_id: str):
+        """Token bucket per user, answering 429 M_LIMIT_EXCEEDED when empty"""
+        rate = self.config.message_rate
+        if rate <= 0:
+            return
+        now = time.monotonic()
+        tokens, updated_at = self.buckets.get(user_id, (self.config.message_burst, now))
+        tokens = min(self.config.message_burst, tokens + (now - updated_at) * rate)
+        if tokens < 1:
+            self.buckets[user_id] = (tokens, now)
+            raise MatrixError(429, 'M_LIMIT_EXCEEDED', 'Too Many Requests',
+                              retry_after_ms=int((1 - tokens) / rate * 1000) + 1)
+        self.buckets[user_id] = (tokens - 1, now)
+
+    def _next_stream(self) -> int:
+        self._stream += 1
+        return self._stream
+
+    async def _notify(self):
+        async with self._notifier:
+            self._notifier.notify_all()
+
+    async def _append_event(self, room: _Room, sender: str, event_type: str, content: Dict[str, Any],
+                            state_key: Optional[str] = None, txn_id: Optional[str] = None) -> Dict[str, Any]:
+        stream = self._next_stream()
+        event = {
+            "event_id": f"${stream}_{secrets.token_hex(4)}",
+            "room_id": room.room_id,
+            "sender": sender,
+            "type": event_type,
+            "content": content,
+            "origin_server_ts": int(time.time() * 1000),
+            "unsigned": {},
+        }
+        if state_key is not None:
+            event["state_key"] = state_key
+            room.state[(event_type, state_key)] = event
+        if txn_id is not None:
+            event["unsigned"]["transaction_id"] = txn_id
+
+        event["_stream"] = stream
+        room.events.append(event)
+        room.streams.append(stream)
+        await self._notify()
+        return event
+
+    @staticmethod
+    def _client_event(event: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: v for k, v in event.items() if not k.startswith('_')}
+
+    def _new_token(self, user_id: str, device_id: Optional[str] = None) -> Tuple[str, str]:
+        token = f"syt_{secrets.token_urlsafe(24)}"
+        device_id = device_id or secrets.token_hex(5).upper()
+        self.tokens[token] = (user_id, device_id)
+        return token, device_id
+
+    def _load_filter(self, user_id: str, raw: Optional[str]) -> Dict[str, Any]:
+        if not raw:
+            return {}
+        if raw.startswith('{'):
+            return json.loads(raw)
+        return self.filters.get(raw, {})
+
+    # ------------------------------------------------------------------ server info
+
+    async def handle_health(self, request: Request) -> Response:
+        return Response(status=200, body=b"OK", content_type='text/plain')
+
+    async def handle_versions(self, request: Request) -> Response:
+        return Response.json({"versions": ["r0.6.1", "v1.1", "v1.2", "v1.3"]})
+
+    async def handle_server_version(self, request: Request) -> Response:
+        return Response.json({"server_version": self.config.server_version})
+
+    # ------------------------------------------------------------------ registration and login
+
+    async def handle_register_nonce(self, request: Request) -> Response:
+        nonce = secrets.token_hex(16)
+        self.nonces[nonce] = time.time()
+        return Response.json({"nonce": nonce})
+
+    async def handle_shared_secret_register(self, request: Request) -> Response:
+        body = request.json()
+        nonce = body["nonce"]
+        if self.nonces.pop(nonce, None) is None:
+            raise MatrixError(400, 'M_UNKNOWN', 'unrecognised nonce')
+
+        admin = bool(body.get("admin", False))
+        mac = hmac.new(
+            self.config.registration_secret.encode(),
+            f"{nonce}\x00{body['username']}\x00{body['password']}\x00"
+            f"{'admin' if admin else 'notadmin'}".encode(),
+            hashlib.sha1
+        ).hexdigest()
+        if not hmac.compare_digest(mac, body.get("mac", "")):
+            raise MatrixError(403, 'M_FORBIDDEN', 'HMAC incorrect')
+
+        user_id = self._user_id(body["username"])
+        if user_id in self.users:
+            raise MatrixError(400, 'M_USER_IN_USE', 'User ID already taken.')
+
+        self.users[user_id] = _User(user_id=user_id, password=body["password"], admin=admin)
+        token, device_id = self._new_token(user_id)
+        return Response.json({
+            "user_id": user_id,
+            "access_token": token,
+            "device_id": device_id,
+            "home_server": self.config.server_name
+        })
+
+    async def handle_open_register(self, request: Request) -> Response:
+        raise MatrixError(403, 'M_FORBIDDEN', 'Registration has been disabled')
+
+    async def handle_login(self, request: Request) -> Response:
+        body = request.json()
+        identifier = body.get("identifier", {}).get("user") or body.get("user", "")
+        user = self.users.get(self._user_id(identifier))
+        if user is None or not hmac.compare_digest(user.password, body.get("password", "")):
+            raise MatrixError(403, 'M_FORBIDDEN', 'Invalid username or password')
+
+        token, device_id = self._new_token(user.user_id, body.get("device_id"))
+        return Response.json({
+            "user_id": user.user_id,
+            "access_token": token,
+            "device_id": device_id,
+            "home_server": self.config.server_name
+        })
+
+    async def handle_whoami(self, request: Request) -> Response:
+        user_id, device_id = self._auth(request)
+        return Response.json({"user_id": user_id, "device_id": device_id})
+
+    async def handle_create_filter(self, request: Request, user_id: str) -> Response:
+        self._auth(request)
+        filter_id = str(len(self.filters) + 1)
+        self.filters[filter_id] = request.json()
+        return Response.json({"filter_id": filter_id})
+
+    # ------------------------------------------------------------------ rooms
+
+    async def handle_create_room(self, request: Request) -> Response:
+        user_id, _ = self._auth(request)
+        body = request.json()
+
+        alias = None
+        if body.get("room_alias_name"):
+            alias = f"#{body['room_alias_name']}:{self.config.server_name}"
+            if alias in self.aliases:
+                raise MatrixError(400, 'M_ROOM_IN_USE', 'Room alias already taken')
+
+        public = body.get("preset") == "public_chat" or body.get("visibility") == "public"
+        room = _Room(room_id=f"!{secrets.token_urlsafe(12)}:{self.config.server_name}",
+                     join_rule="public" if public else "invite")
+        self.rooms[room.room_id] = room
+        if alias:
+            self.aliases[alias] = room.room_id
+
+        await self._append_event(room, user_id, "m.room.create", {"creator": user_id}, state_key="")
+        await self._append_event(room, user_id, "m.room.member", {"membership": "join"}, state_key=user_id)
+        await self._append_event(room, user_id, "m.room.power_levels",
+                                 {"users": {user_id: 100}, "users_default": 0}, state_key="")
+        await self._append_event(room, user_id, "m.room.join_rules", {"join_rule": room.join_rule}, state_key="")
+        if body.get("name"):
+            await self._append_event(room, user_id, "m.room.name", {"name": body["name"]}, state_key="")
+        if body.get("topic"):
+            await self._append_event(room, user_id, "m.room.topic", {"topic": body["topic"]}, state_key="")
+        for invitee in body.get("invite", []):
+            await self._append_event(room, user_id, "m.room.member", {"membership": "invite"}, state_key=invitee)
+
+        return Response.json({"room_id": room.room_id})
+
+    async def handle_invite(self, request: Request, room_id: str) -> Response:
+        user_id, _ = self._auth(request)
+        room = self._room(room_id)
+        self._require_member(room, user_id)
+
+        invitee = request.json()["user_id"]
+        if room.membership(invitee) != 'join':
+            await self._append_event(room, user_id, "m.room.member", {"membership": "invite"}, state_key=invitee)
+        return Response.json({})
+
+    async def handle_resolve_alias(self, request: Request, alias: str) -> Response:
+        if alias not in self.aliases:
+            raise MatrixError(404, 'M_NOT_FOUND', f'Room alias {alias} not found')
+        return Response.json({"room_id": self.aliases[alias], "servers": [self.config.server_name]})
+
+    async def handle_join(self, request: Request, room_id: str) -> Response:
+        user_id, _ = self._auth(request)
+        room = self._room(self.aliases.get(room_id, room_id))
+
+        membership = room.membership(user_id)
+        if membership != 'join':
+            if room.join_rule != 'public' and membership != 'invite':
+                raise MatrixError(403, 'M_FORBIDDEN', 'You are not invited to this room.')
+            await self._append_event(room, user_id, "m.room.member", {"membership": "join"}, state_key=user_id)
+        return Response.json({"room_id": room.room_id})
+
+    async def handle_joined_rooms(self, request: Request) -> Response:
+        user_id, _ = self._auth(request)
+        return Response.json({"joined_rooms": [
+            room.room_id for room in self.rooms.values() if room.membership(user_id) == 'join'
+        ]})
+
+    async def handle_send(self, request: Request, room_id: str, event_type: str, txn_id: str) -> Response:
+        user_id, _ = self._auth(request)
+        room = self._room(room_id)
+        self._require_member(room, user_id)
+
+        # Transactions are idempotent per access token, as in Synapse
+        token = request.headers.get('authorization', '')
+        txn_key = (token, room_id, txn_id)
+        if txn_key not in self.txns:
+            self._check_rate_limit(user_id)
+            event = await self._append_event(room, user_id, event_type, request.json(), txn_id=txn_id)
+            self.txns[txn_key] = event["event_id"]
+        return Response.json({"event_id": self.txns[txn_key]})
+
+    async def handle_put_state(self, request: Request, room_id: str, event_type: str,
+                               state_key: Optional[str]) -> Response:
+        user_id, _ = self._auth(request)
+        room = self._room(room_id)
+        self._require_member(room, user_id)
+
+        event = await self._append_event(room, user_id, event_type, request.json(), state_key=state_key or "")
+        return Response.json({"event_id": event["event_id"]})
+
+    async def handle_get_state(self, request: Request, room_id: str) -> Response:
+        user_id, _ = self._auth(request)
+        room = self._room(room_id)
+        self._require_member(room, user_id)
+        return Response.json([self._client_event(e) for e in room.state.values()])
+
+    async def handle_members(self, request: Request, room_id: str) -> Response:
+        user_id, _ = self._auth(request)
+        room = self._room(room_id)
+        self._require_member(room, user_id)
+
+        membership = request.query.get("membership")
+        chunk = [
+            self._client_event(e) for (event_type, _), e in room.state.items()
+            if event_type == "m.room.member" and (membership is None or e["content"]["membership"] == membership)
+        ]
+        return Response.json({"chunk": chunk})
+
+    async def handle_messages(self, request: Request, room_id: str) -> Response:
+        user_id, _ = self._auth(request)
+        room = self._room(room_id)
+        self._require_member(room, user_id)
+
+        direction = request.query.get("dir", "b")
+        limit = int(request.query.get("limit", 10))
+        room_filter = self._load_filter(user_id, request.query.get("filter"))
+
+        # Tokens are stream positions: t<n> sits just before the event with stream ordering n
+        default_from = f"t{self._stream + 1}" if direction == "b" else "t0"
+        from_token = request.query.get("from") or default_from
+        position = int(from_token.lstrip("ts"))
+
+        if direction == "b":
+            end_index = bisect_right(room.streams, position - 1)
+            chunk = list(reversed(room.events[max(0, end_index - limit):end_index]))
+            end = f"t{chunk[-1]['_stream']}" if chunk else None
+        else:
+            start_index = bisect_right(room.streams, position - 1)
+            chunk = room.events[start_index:start_index + limit]
+            end = f"t{chunk[-1]['_stream'] + 1}" if chunk else None
+
+        response: Dict[str, Any] = {"start": from_token, "chunk": [self._client_event(e) for e in chunk]}
+        if end is not None:
+            response["end"] = end
+        if room_filter.get("lazy_load_members"):
+            senders = {e["sender"] for e in chunk}
+            response["state"] = [self._client_event(room.state[("m.room.member", s)])
+                                 for s in senders if ("m.room.member", s) in room.state]
+        return Response.json(response)
+
+    async def handle_search(self, request: Request) -> Response:
+        user_id, _ = self._auth(request)
+        criteria = request.json()["search_categories"]["room_events"]
+        terms = set(re.findall(r'\w+', criteria["search_term"].lower()))
+        room_filter = criteria.get("filter", {})
+        limit = room_filter.get("limit", 10)
+
+        # A linear scan with all-terms matching; enough to exercise clients, not to compare with Postgres
+        results = []
+        for room in self.rooms.values():
+            if room.membership(user_id) != 'join':
+                continue
+            if room_filter.get("rooms") is not None and room.room_id not in room_filter["rooms"]:
+                continue
+            for event in room.events:
+                if event["type"] != "m.room.message":
+                    continue
+                words = re.findall(r'\w+', str(event["content"].get("body", "")).lower())
+                if terms and terms.issubset(words):
+                    results.append((sum(words.count(t) for t in terms), event))
+
+        results.sort(key=lambda r: (-r[0], -r[1]["_stream"]))
+        return Response.json({"search_categories": {"room_events": {
+            "count": len(results),
+            "highlights": sorted(terms),
+            "results": [{"rank": float(rank), "result": self._client_event(e)} for rank, e in results[:limit]]
+        }}})
+
+    # ------------------------------------------------------------------ presence
+
+    async def _set_presence(self, user: _User, presence: str, status_msg: Optional[str] = None):
+        content = {"presence": presence}
+        if status_msg is not None:
+            content["status_msg"] = status_msg
+        if content != user.presence:
+            user.presence = content
+            user.presence_stream = self._next_stream()
+            await self._notify()
+        user.last_active = time.time()
+
+    async def handle_put_presence(self, request: Request, target: str) -> Response:
+        user_id, _ = self._auth(request)
+        if user_id != target:
+            raise MatrixError(403, 'M_FORBIDDEN', 'Can only set your own presence state')
+        body = request.json()
+        await self._set_presence(self.users[user_id], body["presence"], body.get("status_msg"))
+        return Response.json({})
+
+    async def handle_get_presence(self, request: Request, target: str) -> Response:
+        self._auth(request)
+        user = self.users.get(target)
+        if user is None:
+            raise MatrixError(404, 'M_NOT_FOUND', 'Unknown user')
+        content = dict(user.presence)
+        content["last_active_ago"] = int((time.time() - user.last_active) * 1000)
+        return Response.json(content)
+
+    # ------------------------------------------------------------------ sync
+
+    def _sync_response(self, user_id: str, since: int, sync_filter: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
+        room_filter = sync_filter.get("room", {})
+        only_rooms = room_filter.get("rooms")
+        not_rooms = set(room_filter.get("not_rooms", []))
+        timeline_limit = room_filter.get("timeline", {}).get("limit", 10)
+        lazy_members = room_filter.get("state", {}).get("lazy_load_members", False)
+        presence_types = sync_filter.get("presence", {}).get("types")
+
+        joined: Dict[str, Any] = {}
+        invited: Dict[str, Any] = {}
+        shared_users = {user_id}
+        has_updates = False
+
+        for room in self.rooms.values():
+            if (only_rooms is not None and room.room_id not in only_rooms) or room.room_id in not_rooms:
+                continue
+
+            membership = room.membership(user_id)
+            if membership == 'invite':
+                invite_event = room.state[("m.room.member", user_id)]
+                if invite_event["_stream"] > since:
+                    invited[room.room_id] = {"invite_state": {"events": [
+                        {k: e[k] for k in ("type", "state_key", "content", "sender")}
+                        for (event_type, _), e in room.state.items()
+                        if event_type in ("m.room.name", "m.room.join_rules", "m.room.create")
+                    ] + [self._client_event(invite_event)]}}
+                    has_updates = True
+                continue
+            if membership != 'join':
+                continue
+
+            shared_users.update(k for (t, k), e in room.state.items()
+                                if t == "m.room.member" and e["content"]["membership"] == "join")
+
+            new_index = bisect_right(room.streams, since)
+            new_events = room.events[new_index:]
+            if not new_events and since:
+                continue
+
+            timeline = new_events[-timeline_limit:] if timeline_limit else []
+            room_data: Dict[str, Any] = {
+                "timeline": {
+                    "events": [self._client_event(e) for e in timeline],
+                    "limited": len(new_events) > len(timeline),
+                    "prev_batch": f"t{timeline[0]['_stream']}" if timeline else f"t{self._stream + 1}"
+                },
+                "state": {"events": []}
+            }
+
+            if not since:
+                senders = {e["sender"] for e in timeline}
+                room_data["state"]["events"] = [
+                    self._client_event(e) for (event_type, state_key), e in room.state.items()
+                    if not (lazy_members and event_type == "m.room.member" and state_key not in senders)
+                ]
+            joined[room.room_id] = room_data
+            has_updates = has_updates or bool(new_events)
+
+        presence_events = []
+        if presence_types is None or "m.presence" in presence_types:
+            for other_id in shared_users:
+                other = self.users.get(other_id)
+                if other is not None and other.presence_stream > since:
+                    content = dict(other.presence)
+                    content["last_active_ago"] = int((time.time() - other.last_active) * 1000)
+                    presence_events.append({"type": "m.presence", "sender": other_id, "content": content})
+        has_updates = has_updates or bool(presence_events)
+
+        response = {
+            "next_batch": f"s{self._stream}",
+            "rooms": {"join": joined, "invite": invited, "leave": {}},
+            "presence": {"events": presence_events},
+            "account_data": {"events": []}
+        }
+        return response, has_updates
+
+    async def handle_sync(self, request: Request) -> Response:
+        user_id, _ = self._auth(request)
+        since_token = request.query.get("since")
+        since = int(since_token.lstrip("s")) if since_token else 0
+        timeout = int(request.query.get("timeout", 0)) / 1000
+        sync_filter = self._load_filter(user_id, request.query.get("filter"))
+
+        await self._inject_latency()
+        if request.query.get("set_presence", "online") != "offline":
+            await self._set_presence(self.users[user_id], "online",
+                                     self.users[user_id].presence.get("status_msg"))
+
+        response, has_updates = self._sync_response(user_id, since, sync_filter)
+        if has_updates or not since_token or timeout <= 0:
+            return Response.json(response)
+
+        deadline = time.monotonic() + timeout
+        async with self._notifier:
+            while not has_updates:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(self._notifier.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                response, has_updates = self._sync_response(user_id, since, sync_filter)
+
+        response["next_batch"] = f"s{max(since, self._stream)}"
+        return Response.json(response)
+
+    # ------------------------------------------------------------------ media
+
+    async def handle_upload(self, request: Request) -> Response:
+        user_id, _ = self._auth(request)
+        media_id = secrets.token_urlsafe(16)
+        content_type = request.headers.get('content-type', 'application/octet-stream')
+        self.media[media_id] = _Media(request.body, content_type, uploader=user_id,
+                                      upload_name=request.query.get("filename"))
+        return Response.json({"content_uri": f"mxc://{self.config.server_name}/{media_id}"})
+
+    async def handle_download(self, request: Request, server_name: str, media_id: str) -> Response:
+        if server_name != self.config.server_name or media_id not in self.media:
+            raise MatrixError(404, 'M_NOT_FOUND', 'Not found')
+        media = self.media[media_id]
+        return Response(status=200, body=media.content, content_type=media.content_type)
+
+    # ------------------------------------------------------------------ admin API
+
+    def _require_admin(self, request: Request) -> str:
+        user_id, _ = self._auth(request)
+        if not self.users[user_id].admin:
+            raise MatrixError(403, 'M_FORBIDDEN', 'You are not a server admin')
+        return user_id
+
+    @staticmethod
+    def _page(request: Request, items: List[Any]) -> Tuple[List[Any], Optional[int]]:
+        """Offset pagination as the admin list endpoints do it: (page, next offset or None)"""
+        start = int(request.query.get("from", 0))
+        limit = int(request.query.get("limit", 100))
+        if start < 0 or limit < 0:
+            raise MatrixError(400, 'M_INVALID_PARAM', 'Query parameter from and limit must be non-negative')
+        page = items[start:start + limit]
+        return page, start + len(page) if start + len(page) < len(items) else None
+
+    def _admin_user(self, user: _User) -> Dict[str, Any]:
+        return {
+            "name": user.user_id,
+            "admin": user.admin,
+            "deactivated": user.deactivated,
+            "is_guest": False,
+            "user_type": None,
+            "shadow_banned": False,
+            "displayname": user.user_id[1:].split(':')[0],
+            "avatar_url": None,
+            "creation_ts": int(user.created)
+        }
+
+    def _admin_room(self, room: _Room) -> Dict[str, Any]:
+        def state_content(event_type: str, key: str) -> Optional[Any]:
+            event = room.state.get((event_type, ""))
+            return event["content"].get(key) if event else None
+
+        joined = sum(1 for (event_type, _), e in room.state.items()
+                     if event_type == "m.room.member" and e["content"]["membership"] == "join")
+        return {
+            "room_id": room.room_id,
+            "name": state_content("m.room.name", "name"),
+            "topic": state_content("m.room.topic", "topic"),
+            "canonical_alias": next((a for a, r in self.aliases.items() if r == room.room_id), None),
+            "creator": state_content("m.room.create", "creator"),
+            "joined_members": joined,
+            "joined_local_members": joined,
+            "version": "10",
+            "public": room.join_rule == "public",
+            "join_rules": room.join_rule,
+            "state_events": len(room.state)
+        }
+
+    async def handle_admin_list_users(self, request: Request) -> Response:
+        self._require_admin(request)
+        show_deactivated = request.query.get("deactivated", "false") == "true"
+        users = [u for u in sorted(self.users.values(), key=lambda u: u.user_id)
+                 if show_deactivated or not u.deactivated]
+        page, next_offset = self._page(request, users)
+        response: Dict[str, Any] = {"users": [self._admin_user(u) for u in page], "total": len(users)}
+        if next_offset is not None:
+            response["next_token"] = str(next_offset)
+        return Response.json(response)
+
+    async def handle_admin_user(self, request: Request, user_id: str) -> Response:
+        self._require_admin(request)
+        if user_id not in self.users:
+            raise MatrixError(404, 'M_NOT_FOUND', 'User not found')
+        details = self._admin_user(self.users[user_id])
+        details["threepids"] = []
+        details["external_ids"] = []
+        return Response.json(details)
+
+    async def handle_admin_user_media(self, request: Request, user_id: str) -> Response:
+        self._require_admin(request)
+        if user_id not in self.users:
+            raise MatrixError(404, 'M_NOT_FOUND', 'Unknown user')
+        uploads = sorted(((media_id, m) for media_id, m in self.media.items() if m.uploader == user_id),
+                         key=lambda item: item[1].created_ts)
+        page, next_offset = self._page(request, uploads)
+        response: Dict[str, Any] = {
+            "media": [{
+                "media_id": media_id,
+                "media_type": m.content_type,
+                "media_length": len(m.content),
+                "upload_name": m.upload_name,
+                "created_ts": m.created_ts,
+                "last_access_ts": m.created_ts,
+                "quarantined_by": None,
+                "safe_from_quarantine": False
+            } for media_id, m in page],
+            "total": len(uploads)
+        }
+        if next_offset is not None:
+            response["next_token"] = next_offset
+        return Response.json(response)
+
+    async def handle_admin_list_rooms(self, request: Request) -> Response:
+        self._require_admin(request)
+        rooms = sorted(self.rooms.values(), key=lambda r: r.room_id)
+        page, next_offset = self._page(request, rooms)
+        response: Dict[str, Any] = {
+            "rooms": [self._admin_room(r) for r in page],
+            "offset": int(request.query.get("from", 0)),
+            "total_rooms": len(rooms)
+        }
+        if next_offset is not None:
+            response["next_batch"] = next_offset
+        return Response.json(response)
+
+    async def handle_admin_room(self, request: Request, room_id: str) -> Response:
+        self._require_admin(request)
+        return Response.json(self._admin_room(self._room(room_id)))
+
+    async def handle_admin_purge_history(self, request: Request, room_id: str) -> Response:
+        self._require_admin(request)
+        room = self._room(room_id)
+        body = request.json()
+        before_ts = body["purge_up_to_ts"]
+
+        # All events here are local, so without delete_local_events nothing goes; state and the
+        # room's latest event are always kept, as in Synapse
+        if body.get("delete_local_events", False) and room.events:
+            latest = room.events[-1]
+            kept = [e for e in room.events
+                    if "state_key" in e or e is latest or e["origin_server_ts"] >= before_ts]
+            room.events = kept
+            room.streams = [e["_stream"] for e in kept]
+
+        purge_id = secrets.token_urlsafe(8)
+        self.purges[purge_id] = {"status": "complete"}
+        return Response.json({"purge_id": purge_id})
+
+    async def handle_admin_purge_status(self, request: Request, purge_id: str) -> Response:
+        self._require_admin(request)
+        if purge_id not in self.purges:
+            raise MatrixError(404, 'M_NOT_FOUND', 'purge id not found')
+        return Response.json(self.purges[purge_id])
+
+    async def handle_admin_delete_media(self, request: Request, server_name: str, media_id: str) -> Response:
+        self._require_admin(request)
+        if server_name != self.config.server_name:
+            raise MatrixError(400, 'M_UNKNOWN', 'Can only delete local media')
+        if media_id not in self.media:
+            raise MatrixError(404, 'M_NOT_FOUND', 'Unknown media')
+        del self.media[media_id]
+        return Response.json({"deleted_media": [media_id], "total": 1})
+
+    async def handle_admin_purge_media_cache(self, request: Request) -> Response:
+        self._require_admin(request)
+        if "before_ts" not in request.query:
+            raise MatrixError(400, 'M_MISSING_PARAM', 'Missing integer query parameter "before_ts"')
+        # Nothing is federated in, so there is never remote media to drop
+        return Response.json({"deleted": 0})
+
+    # ------------------------------------------------------------------ HTTP server
+
+    async def _read_chunked(self, reader: asyncio.StreamReader) -> bytes:
+        parts = []
+        while True:
+            size_line = await reader.readline()
+            size = int(size_line.split(b';')[0].strip(), 16)
+            if size == 0:
+                await reader.readline()
+                return b"".join(parts)
+            parts.append(await reader.readexactly(size))
+            await reader.readline()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+
+                headers: Dict[str, str] = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, value = line.decode('latin-1').split(':', 1)
+                    headers[name.strip().lower()] = value.strip()
+
+                if headers.get('transfer-encoding', '').lower() == 'chunked':
+                    body = await self._read_chunked(reader)
+                else:
+                    body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                url = urlsplit(target)
+                query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                response = await self.dispatch(Request(method, url.path, query, headers, body))
+
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                head = (
+                    f"HTTP/1.1 {response.status} {HTTPStatus(response.status).phrase}\r\n"
+                    f"Content-Type: {response.content_type}\r\n"
+                    f"Content-Length: {len(response.body)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                )
+                writer.write(head.encode('latin-1'))
+                if method != 'HEAD':
+                    writer.write(response.body)
+                await writer.drain()
+
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError, asyncio.CancelledError):
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """Start listening and return the base URL"""
+        self._notifier = asyncio.Condition()
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        bound_port = self._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{bound_port}"
+        return self.url
+
+    async def stop(self):
+        """Stop listening"""
+        if self._server is not None:
+            self._server.close()
+            # Idle keep-alive and long-poll connections would otherwise keep wait_closed() waiting
+            for task in list(self._connections):
+                task.cancel()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+
+class LocalSynapseThread:
+    """Runs a LocalSynapse on its own event loop thread, for synchronous clients"""
+
+    def __init__(self, config: Optional[StandInConfig] = None, host: str = '127.0.0.1', port: int = 0):
+        self.server = LocalSynapse(config)
+        self.host = host
+        self.port = port
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="local-synapse", daemon=True)
+
+    @property
+    def url(self) -> str:
+        return self.server.url
+
+    def __enter__(self) -> 'LocalSynapseThread':
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def start(self) -> 'LocalSynapseThread':
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self.server.start(self.host, self.port), self.loop).result(10)
+        return self
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.server.stop(), self.loop).result(10)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(10)
+        self.loop.close()
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description='In-process Synapse stand-in for offline benchmarking')
+    parser.add_argument('--host', default='127.0.0.1', help='Listen address')
+    parser.add_argument('--port', '-p', type=int, default=8008, help='Listen port')
+    parser.add_argument('--server-name', default='localhost', help='Matrix server name')
+    parser.add_argument('--registration-secret', default='test_secret', help='Shared registration secret')
+    parser.add_argument('--latency', type=float, default=0.0, help='Injected latency per response (seconds)')
+    parser.add_argument('--latency-jitter', type=float, default=0.0, help='Extra random latency (seconds)')
+
+    args = parser.parse_args()
+
+    config = StandInConfig(
+        server_name=args.server_name,
+        registration_secret=args.registration_secret,
+        latency=args.latency,
+        latency_jitter=args.latency_jitter
+    )
+
+    async def serve():
+        server = LocalSynapse(config)
+        url = await server.start(args.host, args.port)
+        print(f"Local Synapse stand-in listening on {url} (server_name={config.server_name})")
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
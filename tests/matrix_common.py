@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Matrix Client Helpers
+Client-side building blocks shared by the sync and async Matrix clients, benchmarks and load tests
+"""
+
+import hashlib
+import itertools
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Optional, Tuple, Union, Iterable, BinaryIO
+
+
+class TransactionIdAllocator:
+    """Collision-free transaction IDs for one client
+
+    IDs combine a random per-allocator prefix with a locked counter, so sends
+    from several threads or asyncio tasks in the same millisecond never share
+    an ID and get deduplicated by Synapse.
+    """
+
+    def __init__(self):
+        self._prefix = f"{int(time.time() * 1000)}.{uuid.uuid4().hex[:8]}"
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def next_id(self) -> str:
+        """Allocate the next transaction ID"""
+        with self._lock:
+            sequence = next(self._counter)
+        return f"{self._prefix}.{sequence:08d}"
+
+
+MEDIA_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class MediaDigest:
+    """Size and SHA-256 of media computed while streaming"""
+    sha256: str
+    size: int
+
+    @classmethod
+    def of_file(cls, file_path: str, chunk_size: int = MEDIA_CHUNK_SIZE) -> 'MediaDigest':
+        """Hash a local file without loading it into memory"""
+        sha256 = hashlib.sha256()
+        size = 0
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                sha256.update(chunk)
+                size += len(chunk)
+        return cls(sha256=sha256.hexdigest(), size=size)
+
+
+class HashingReader:
+    """File-like wrapper that hashes bytes as the HTTP client reads them
+
+    Wraps a binary file object or an iterable of byte chunks. The length is
+    exposed through __len__ so requests sends a Content-Length, which Synapse
+    requires for uploads.
+    """
+
+    def __init__(self, source: Union[BinaryIO, Iterable[bytes]], size: Optional[int] = None,
+                 chunk_size: int = MEDIA_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self._sha256 = hashlib.sha256()
+        self._bytes_read = 0
+        self._buffer = b""
+
+        if hasattr(source, 'read'):
+            self._file = source
+            self._chunks = None
+            if size is None:
+                position = source.tell()
+                try:
+                    size = os.fstat(source.fileno()).st_size - position
+                except (AttributeError, OSError):
+                    size = source.seek(0, os.SEEK_END) - position
+                    source.seek(position)
+        else:
+            self._file = None
+            self._chunks = iter(source)
+            if size is None:
+                raise ValueError("size is required for iterable sources (Synapse needs a Content-Length)")
+
+        self.size = size
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _next_chunk(self, n: int) -> bytes:
+        if self._file is not None:
+            return self._file.read(n)
+        return next(self._chunks, b"")
+
+    def read(self, n: int = -1) -> bytes:
+        """Read up to n bytes, hashing them on the way through"""
+        if n is None or n < 0:
+            n = self.chunk_size
+
+        data = self._buffer
+        while len(data) < n:
+            chunk = self._next_chunk(n - len(data))
+            if not chunk:
+                break
+            data += chunk
+
+        data, self._buffer = data[:n], data[n:]
+        self._sha256.update(data)
+        self._bytes_read += len(data)
+        return data
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(self.chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    @property
+    def digest(self) -> MediaDigest:
+        """Digest of everything read so far"""
+        return MediaDigest(sha256=self._sha256.hexdigest(), size=self._bytes_read)
+
+
+def parse_mxc_url(mxc_url: str) -> Tuple[str, str]:
+    """Split mxc://server/media_id into (server_name, media_id)"""
+    if not mxc_url.startswith("mxc://"):
+        raise ValueError("Invalid MXC URL")
+
+    parts = mxc_url[6:].split("/", 1)
+    if len(parts) != 2:
+        raise ValueError("Invalid MXC URL format")
+
+    return parts[0], parts[1]
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Warm Pytest Daemon
+Keeps pytest, its plugins and the heavy test dependencies imported, and forks a fresh session per suite request
+"""
+
+import importlib
+import json
+import os
+import selectors
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+from suite_fingerprint import RELEVANT_ENV
+
+
+DEFAULT_DAEMON_ADDRESS = os.getenv('PYTEST_DAEMON_ADDR', '127.0.0.1:8765')
+
+# Third-party packages and non-test helpers only: test modules imported before pytest's
+# assertion rewriting hook is installed would lose assertion introspection
+WARM_IMPORTS = (
+    'pytest', 'pytest_asyncio', 'xdist', 'pytest_playwright', 'playwright.async_api',
+    'httpx', 'requests', 'yaml', 'dns.resolver', 'jinja2',
+    'matrix_common', 'rate_limit', 'room_history', 'session_cache', 'sync_watcher'
+)
+
+OUTPUT_TAIL = 64 * 1024
+
+
+def parse_address(address: str) -> Tuple[str, int]:
+    """host:port into a socket address"""
+    host, _, port = address.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+def _read_tail(output) -> str:
+    output.seek(0, os.SEEK_END)
+    output.seek(max(0, output.tell() - OUTPUT_TAIL))
+    return output.read().decode('utf-8', errors='replace')
+
+
+class PytestDaemon:
+    """Long-lived server that runs pytest suites in forked, pre-warmed children
+
+    Each request is one line of JSON on a localhost socket:
+    {"action": "run", "args": [...], "env": {...}} answers {"pid": ...} once
+    the suite starts and {"exitcode": ..., "output": ...} when it ends;
+    {"action": "kill", "pid": ...} stops a running suite; {"action": "ping"}
+    reports what is warm. Results themselves still reach the runner through
+    the pytest_stream plugin. Where os.fork is unavailable (Windows) suites
+    run as plain subprocesses, so the protocol works but nothing is warm.
+
+    The daemon is a single-threaded select loop, because forking a process
+    that has other threads can leave the child holding locks nobody will
+    release. Each child leads its own process group, so a kill also takes
+    down any xdist workers it started.
+    """
+
+    def __init__(self, test_dir: Path, address: str = DEFAULT_DAEMON_ADDRESS):
+        self.test_dir = Path(test_dir).resolve()
+        self.address = parse_address(address)
+        self.children: Dict[int, Optional[subprocess.Popen]] = {}
+        self.warm: List[str] = []
+        self.loaded_at = time.time()
+        self.server: Optional[socket.socket] = None
+        self.selector = selectors.DefaultSelector()
+        self._requests: Dict[socket.socket, bytes] = {}
+        self._waiting: Dict[int, Tuple[socket.socket, Any]] = {}  # pid -> (connection, output file)
+
+    def warm_up(self):
+        """Import everything in WARM_IMPORTS that is installed"""
+        if str(self.test_dir) not in sys.path:
+            sys.path.insert(0, str(self.test_dir))
+        for name in WARM_IMPORTS:
+            try:
+                importlib.import_module(name)
+                self.warm.append(name)
+            except Exception:
+                pass
+        self.loaded_at = time.time()
+
+    def serve_forever(self):
+        """Warm up, then accept requests until interrupted"""
+        os.chdir(self.test_dir)
+        self.warm_up()
+        self.server = socket.create_server(self.address)
+        self.server.setblocking(False)
+        self.selector.register(self.server, selectors.EVENT_READ)
+        mode = "fork" if hasattr(os, 'fork') else "subprocess"
+        print(f"Pytest daemon listening on {self.address[0]}:{self.address[1]} ({mode}), "
+              f"warm: {', '.join(self.warm) or 'nothing'}")
+        try:
+            while True:
+                for key, _ in self.selector.select(timeout=0.2):
+                    if key.fileobj is self.server:
+                        self._accept()
+                    else:
+                        self._read(key.fileobj)
+                self._reap()
+        finally:
+            for pid in list(self.children):
+                self._kill(pid)
+            self.selector.close()
+            self.server.close()
+
+    def _accept(self):
+        try:
+            conn, _ = self.server.accept()
+        except OSError:
+            return
+        conn.setblocking(False)
+        self._requests[conn] = b''
+        self.selector.register(conn, selectors.EVENT_READ)
+
+    def _read(self, conn: socket.socket):
+        try:
+            data = conn.recv(65536)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+        buffer = self._requests[conn] + data
+        if data and b'\n' not in buffer:
+            self._requests[conn] = buffer
+            return
+
+        # One request per connection; replies are small enough to send blocking
+        self.selector.unregister(conn)
+        del self._requests[conn]
+        conn.settimeout(5)
+        try:
+            request = json.loads(buffer.partition(b'\n')[0] or b'{}')
+        except ValueError:
+            request = None
+        if not self._handle(conn, request):
+            conn.close()
+
+    @staticmethod
+    def _reply(conn: socket.socket, message: Dict[str, Any]):
+        try:
+            conn.sendall((json.dumps(message) + '\n').encode('utf-8'))
+        except OSError:
+            pass  # runner gave up on this suite
+
+    def _handle(self, conn: socket.socket, request: Optional[Dict[str, Any]]) -> bool:
+        """Answer one request; True if the connection stays open until a suite finishes"""
+        if not isinstance(request, dict):
+            self._reply(conn, {'error': 'bad request'})
+            return False
+
+        action = request.get('action')
+        if action == 'ping':
+            self._reply(conn, {'pid': os.getpid(), 'warm': self.warm, 'running': list(self.children)})
+        elif action == 'kill':
+            self._reply(conn, {'killed': self._kill(int(request['pid']))})
+        elif action == 'run':
+            output = tempfile.TemporaryFile()
+            pid = self._start(request.get('args', []), request.get('env', {}), output)
+            self._waiting[pid] = (conn, output)
+            self._reply(conn, {'pid': pid})
+            return True
+        else:
+            self._reply(conn, {'error': f'unknown action {action!r}'})
+        return False
+
+    def _start(self, args: List[str], env: Dict[str, str], output) -> int:
+        if not hasattr(os, 'fork'):
+            process = subprocess.Popen([sys.executable, '-m', 'pytest'] + args, stdout=output,
+                                       stderr=subprocess.STDOUT, cwd=self.test_dir,
+                                       env=dict(os.environ, **env))
+            self.children[process.pid] = process
+            return process.pid
+
+        pid = os.fork()
+        if pid == 0:
+            self._run_child(args, env, output)
+        try:
+            # Also set from the parent, so a kill straight after the fork cannot miss the group
+            os.setpgid(pid, pid)
+        except OSError:
+            pass
+        self.children[pid] = None
+        return pid
+
+    def _run_child(self, args: List[str], env: Dict[str, str], output):
+        """Forked child: point stdio at the output file and run one pytest session"""
+        exitcode = 1
+        try:
+            os.setpgid(0, 0)
+            self.selector.close()
+            if self.server:
+                self.server.close()
+            for conn in list(self._requests) + [c for c, _ in self._waiting.values()]:
+                conn.close()
+            os.dup2(output.fileno(), 1)
+            os.dup2(output.fileno(), 2)
+            # The suite runs under exactly the environment the runner sent, not the daemon's leftovers
+            for name in RELEVANT_ENV:
+                os.environ.pop(name, None)
+            os.environ.update(env)
+            self._evict_stale_modules()
+            import pytest
+            exitcode = int(pytest.main(args))
+        except BaseException:
+            import traceback
+            traceback.print_exc()
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(exitcode)
+
+    def _evict_stale_modules(self):
+        """Drop warm helpers from this child if any of them were edited since warm-up"""
+        local = {name: module for name, module in list(sys.modules.items())
+                 if getattr(module, '__file__', None) and Path(module.__file__).resolve().parent == self.test_dir}
+        if any(os.path.getmtime(m.__file__) > self.loaded_at for m in local.values()):
+            for name in local:
+                sys.modules.pop(name, None)
+
+    def _poll(self, pid: int) -> Optional[int]:
+        """Exit code of a finished child, or None while it runs"""
+        process = self.children.get(pid)
+        if process is not None:
+            return process.poll()
+        try:
+            finished, status = os.waitpid(pid, os.WNOHANG)
+        except ChildProcessError:
+            return -signal.SIGKILL
+        return os.waitstatus_to_exitcode(status) if finished else None
+
+    def _reap(self):
+        """Send results for children that have exited"""
+        for pid in list(self.children):
+            exitcode = self._poll(pid)
+            if exitcode is None:
+                continue
+            del self.children[pid]
+            if hasattr(os, 'killpg'):
+                try:
+                    # Workers the suite left behind die with it
+                    os.killpg(pid, signal.SIGKILL)
+                except OSError:
+                    pass
+            conn, output = self._waiting.pop(pid, (None, None))
+            if conn is not None:
+                with conn, output:
+                    self._reply(conn, {'exitcode': exitcode, 'output': _read_tail(output)})
+
+    def _kill(self, pid: int) -> bool:
+        if pid not in self.children:
+            return False
+        process = self.children[pid]
+        try:
+            if process is not None:
+                process.kill()
+            else:
+                os.killpg(pid, signal.SIGKILL)
+        except OSError:
+            return False
+        return True
+
+
+def _request(address: str, message: Dict[str, Any], timeout: Optional[float] = 10) -> socket.socket:
+    conn = socket.create_connection(parse_address(address), timeout=timeout)
+    conn.sendall((json.dumps(message) + '\n').encode('utf-8'))
+    return conn
+
+
+def ping_daemon(address: str) -> Optional[Dict[str, Any]]:
+    """Daemon status, or None if nothing is listening"""
+    try:
+        with _request(address, {'action': 'ping'}, timeout=2) as conn, conn.makefile('r') as lines:
+            return json.loads(lines.readline())
+    except (OSError, ValueError):
+        return None
+
+
+def run_on_daemon(address: str, args: List[str], env: Dict[str, str],
+                  timeout: float) -> Tuple[int, str, bool]:
+    """Run one pytest session on the daemon; returns (exit code, output tail, timed out)"""
+    deadline = time.monotonic() + timeout
+    with _request(address, {'action': 'run', 'args': args, 'env': env}) as conn, \
+            conn.makefile('r', encoding='utf-8') as lines:
+        pid = json.loads(lines.readline())['pid']
+        conn.settimeout(max(0.001, deadline - time.monotonic()))
+        try:
+            result = json.loads(lines.readline())
+        except socket.timeout:
+            # A timed-out socket file cannot be read again, so kill the child and drop its output
+            _request(address, {'action': 'kill', 'pid': pid}).close()
+            return -9, '', True
+        return result['exitcode'], result.get('output', ''), False
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Streaming Pytest Results
+Pytest plugin that sends each test result to the runner as NDJSON over a local socket, and the runner's listener
+"""
+
+import json
+import os
+import socket
+import threading
+from typing import Dict, Any, Callable, Optional, Tuple
+
+import pytest
+
+
+STREAM_ENV = 'PYTEST_STREAM_ADDR'
+
+
+# -- plugin side (loaded into pytest with `-p pytest_stream`) --
+
+class _Emitter:
+    """Line-per-event writer to the runner's socket"""
+
+    def __init__(self, address: str):
+        host, _, port = address.rpartition(':')
+        self.sock = socket.create_connection((host, int(port)), timeout=10)
+        self.sock.settimeout(None)
+        self.file = self.sock.makefile('w', encoding='utf-8')
+        self.lock = threading.Lock()
+
+    def emit(self, event: Dict[str, Any]):
+        with self.lock:
+            try:
+                self.file.write(json.dumps(event) + '\n')
+                self.file.flush()
+            except OSError:
+                pass  # runner went away; keep the test session going
+
+    def close(self):
+        try:
+            self.file.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+_emitter: Optional[_Emitter] = None
+_pending: Dict[str, Dict[str, Any]] = {}
+_collected_count: Optional[int] = None
+
+
+def pytest_configure(config):
+    global _emitter, _collected_count
+    _pending.clear()
+    _collected_count = None
+    address = os.getenv(STREAM_ENV)
+    # Under xdist the controller relays every worker report, so only it connects
+    if not address or hasattr(config, 'workerinput'):
+        return
+    try:
+        _emitter = _Emitter(address)
+    except OSError:
+        _emitter = None
+
+
+def pytest_collection_finish(session):
+    # Under xdist the controller collects nothing itself; the workers' count arrives below
+    if _emitter and not session.config.pluginmanager.has_plugin('dsession'):
+        _emitter.emit({'event': 'collected', 'count': len(session.items)})
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_xdist_node_collection_finished(node, ids):
+    """Every xdist worker collects the full suite, so the first one to finish gives the count"""
+    global _collected_count
+    if _emitter and _collected_count is None:
+        _collected_count = len(ids)
+        _emitter.emit({'event': 'collected', 'count': _collected_count})
+
+
+def pytest_collectreport(report):
+    """Collection errors (import failures, missing dependencies) as error results"""
+    if _emitter and report.failed:
+        _emitter.emit({
+            'event': 'test',
+            'nodeid': report.nodeid,
+            'when': 'collect',
+            'outcome': 'error',
+            'duration': 0.0,
+            'longrepr': report.longreprtext
+        })
+
+
+def pytest_runtest_logreport(report):
+    """Fold the setup, call and teardown reports of a test into one pending result"""
+    if not _emitter:
+        return
+    result = _pending.setdefault(report.nodeid, {
+        'event': 'test', 'nodeid': report.nodeid, 'when': 'setup',
+        'outcome': 'passed', 'duration': 0.0, 'longrepr': None
+    })
+    result['duration'] += report.duration
+    if report.when == 'call' or (report.when == 'setup' and not report.passed):
+        result['when'] = report.when
+        result['outcome'] = 'error' if report.when == 'setup' and report.failed else report.outcome
+    elif report.when == 'teardown' and report.failed and result['outcome'] != 'failed':
+        # A broken teardown turns a pass into an error; a failed call stays a failure
+        result['when'] = report.when
+        result['outcome'] = 'error'
+    if not report.passed and report.longreprtext:
+        result['longrepr'] = '\n\n'.join(filter(None, [result['longrepr'], report.longreprtext]))
+
+
+def pytest_runtest_logfinish(nodeid, location):
+    """One event per test, once all of its phases have reported"""
+    result = _pending.pop(nodeid, None)
+    if _emitter and result:
+        _emitter.emit(result)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    global _emitter
+    if _emitter:
+        _emitter.emit({'event': 'finished', 'exitstatus': int(exitstatus)})
+        _emitter.close()
+        _emitter = None
+
+
+# -- runner side --
+
+class ResultListener:
+    """Accepts the plugin's connection and hands each decoded event to a callback
+
+    Events arrive as the suite runs, so whatever was received before a
+    timeout kill is kept. Run as a context manager around the subprocess;
+    `env` is what the child needs to find the socket.
+    """
+
+    def __init__(self, on_event: Callable[[Dict[str, Any]], None], host: str = '127.0.0.1'):
+        self.on_event = on_event
+        self.server = socket.create_server((host, 0))
+        self.server.settimeout(0.2)
+        self.address: Tuple[str, int] = self.server.getsockname()[:2]
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+
+    @property
+    def env(self) -> Dict[str, str]:
+        return {STREAM_ENV: f"{self.address[0]}:{self.address[1]}"}
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except socket.timeout:
+                # One last accept after close() so a suite that finished quickly is not missed
+                if self._stopping.is_set():
+                    return
+                continue
+            except OSError:
+                return
+            with conn, conn.makefile('r', encoding='utf-8') as lines:
+                for line in lines:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.on_event(event)
+            return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self, timeout: float = 5.0):
+        """Stop accepting and wait for the connection to drain"""
+        self._stopping.set()
+        self._thread.join(timeout)
+        self.server.close()
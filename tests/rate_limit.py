@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Rate-Limit Aware Request Controller
+Honours Synapse 429 retry_after_ms and adapts per-endpoint concurrency AIMD-style
+"""
+
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import threading
+from typing import Dict, Any, Optional, Callable, Awaitable, TypeVar
+from collections import Counter
+from urllib.parse import urlsplit
+from dataclasses import dataclass, field
+
+
+T = TypeVar('T')
+
+
+@dataclass
+class RateLimitConfig:
+    """Controller tuning from environment variables"""
+    initial_concurrency: float = float(os.getenv('MATRIX_RATE_LIMIT_INITIAL', '16'))
+    min_concurrency: float = float(os.getenv('MATRIX_RATE_LIMIT_MIN', '1'))
+    max_concurrency: float = float(os.getenv('MATRIX_RATE_LIMIT_MAX', '256'))
+    decrease_factor: float = float(os.getenv('MATRIX_RATE_LIMIT_DECREASE', '0.5'))
+    max_retries: int = int(os.getenv('MATRIX_RATE_LIMIT_RETRIES', '5'))
+    fallback_retry_after: float = float(os.getenv('MATRIX_RATE_LIMIT_FALLBACK_S', '1'))
+    max_retry_after: float = float(os.getenv('MATRIX_RATE_LIMIT_MAX_WAIT_S', '60'))
+
+
+# Path segments that identify a resource rather than an endpoint
+_ENDPOINT_PATTERNS = [
+    (re.compile(r'/rooms/[^/]+'), '/rooms/{roomId}'),
+    (re.compile(r'/join/[^/]+'), '/join/{roomIdOrAlias}'),
+    (re.compile(r'/(send|state)/([^/]+)/[^/]+$'), r'/\1/\2/{key}'),
+    (re.compile(r'/(presence|profile|user)/[^/]+'), r'/\1/{userId}'),
+    (re.compile(r'/(download|thumbnail)/[^/]+/[^/]+.*$'), r'/\1/{serverName}/{mediaId}'),
+]
+
+
+def endpoint_key(method: str, url: str) -> str:
+    """Group requests by endpoint, e.g. 'PUT /_matrix/client/r0/rooms/{roomId}/send/m.room.message/{key}'"""
+    path = urlsplit(url).path
+    for pattern, replacement in _ENDPOINT_PATTERNS:
+        path = pattern.sub(replacement, path)
+    return f"{method.upper()} {path}"
+
+
+def retry_after_seconds(status_code: int, body: bytes, headers: Dict[str, str]) -> Optional[float]:
+    """Server-requested wait for a 429, from retry_after_ms or a Retry-After header"""
+    if status_code != 429:
+        return None
+    try:
+        retry_after_ms = json.loads(body or b'{}').get('retry_after_ms')
+        if retry_after_ms is not None:
+            return float(retry_after_ms) / 1000
+    except (ValueError, AttributeError):
+        pass
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class EndpointStats:
+    """Counters for one endpoint"""
+    requests: int = 0
+    throttled: int = 0
+    errors: int = 0  # transport failures and 5xx responses
+    retries: int = 0
+    gave_up: int = 0
+    retry_wait: float = 0.0  # seconds spent sleeping for retry_after_ms
+    limit: float = 0.0  # current concurrency limit
+    min_limit_seen: float = 0.0
+
+
+@dataclass
+class _EndpointState:
+    limit: float
+    in_flight: int = 0
+    blocked_until: float = 0.0  # time.monotonic() before which no request is sent
+    # Throttled requests waiting to retry, by attempt; the most-throttled go first
+    retrying: Counter = field(default_factory=Counter)
+    stats: EndpointStats = field(default_factory=EndpointStats)
+
+
+class RateLimitController:
+    """Per-endpoint AIMD concurrency limiter with 429 retry handling
+
+    Each endpoint starts at ``initial_concurrency`` requests in flight. Every
+    successful response raises the limit by 1/limit (about one extra slot per
+    window of successes); a 429, a 5xx or a transport error multiplies it by
+    ``decrease_factor``, since an overloaded server shows all three. A 429
+    also pauses the whole endpoint for the server's retry_after_ms, since
+    Synapse's buckets are per user rather than per request. Throttled requests
+    are retried ahead of new ones, up to ``max_retries`` times, after which the
+    429 response is returned to the caller unchanged.
+
+    The counters let benchmark results tell server capacity apart from the
+    homeserver's rate-limiter configuration. One controller can be shared by
+    threads (``call``) and by asyncio tasks on one loop (``acall``), but not both.
+    """
+
+    def __init__(self, config: Optional[RateLimitConfig] = None):
+        self.config = config or RateLimitConfig()
+        self._endpoints: Dict[str, _EndpointState] = {}
+        self._lock = threading.Condition()
+        self._async_cond: Optional[asyncio.Condition] = None
+
+    def _state(self, endpoint: str) -> _EndpointState:
+        state = self._endpoints.get(endpoint)
+        if state is None:
+            state = _EndpointState(limit=self.config.initial_concurrency)
+            state.stats.limit = state.stats.min_limit_seen = state.limit
+            self._endpoints[endpoint] = state
+        return state
+
+    def _has_slot(self, state: _EndpointState, attempt: int) -> bool:
+        if state.retrying and max(state.retrying) > attempt:
+            return False
+        return state.in_flight < max(1, int(state.limit))
+
+    def _on_response(self, state: _EndpointState, throttle_delay: Optional[float], succeeded: bool):
+        """AIMD update; caller holds the lock"""
+        state.in_flight -= 1
+        if throttle_delay is not None:
+            state.stats.throttled += 1
+            state.limit = max(self.config.min_concurrency, state.limit * self.config.decrease_factor)
+            # The limiter counts per user, so every request to the endpoint waits, not just this one
+            state.blocked_until = max(state.blocked_until, time.monotonic() + throttle_delay)
+        elif succeeded:
+            state.limit = min(self.config.max_concurrency, state.limit + 1 / state.limit)
+        else:
+            state.stats.errors += 1
+            state.limit = max(self.config.min_concurrency, state.limit * self.config.decrease_factor)
+        state.stats.limit = state.limit
+        state.stats.min_limit_seen = min(state.stats.min_limit_seen, state.limit)
+
+    def _backoff(self, retry_after: Optional[float], attempt: int) -> float:
+        if retry_after is None:
+            retry_after = self.config.fallback_retry_after * (2 ** attempt)
+        # Small jitter so throttled workers do not retry in lockstep
+        return min(self.config.max_retry_after, retry_after) * random.uniform(1.0, 1.1)
+
+    def _finish(self, state: _EndpointState, delay: Optional[float], retry: bool, attempt: int) -> bool:
+        """Record the outcome of a throttled attempt; caller holds the lock. True to retry"""
+        if not retry or attempt >= self.config.max_retries:
+            state.stats.gave_up += 1
+            return False
+        state.stats.retries += 1
+        state.stats.retry_wait += delay
+        state.retrying[attempt + 1] += 1
+        return True
+
+    def call(self, endpoint: str, send: Callable[[], Any], retry: bool = True) -> Any:
+        """Run send() (returning a requests.Response) under the endpoint's limit, retrying 429s"""
+        attempt = 0
+        while True:
+            with self._lock:
+                state = self._state(endpoint)
+                try:
+                    while True:
+                        blocked = state.blocked_until - time.monotonic()
+                        if blocked > 0:
+                            self._lock.wait(blocked)
+                        elif self._has_slot(state, attempt):
+                            break
+                        else:
+                            self._lock.wait()
+                finally:
+                    if attempt:
+                        state.retrying[attempt] -= 1
+                        if not state.retrying[attempt]:
+                            del state.retrying[attempt]
+                state.in_flight += 1
+                state.stats.requests += 1
+
+            delay = None
+            succeeded = False  # stays False if send() raises
+            try:
+                resp = send()
+                if resp.status_code == 429:
+                    delay = self._backoff(retry_after_seconds(429, resp.content, resp.headers), attempt)
+                succeeded = resp.status_code < 500
+            finally:
+                with self._lock:
+                    self._on_response(state, delay, succeeded)
+                    self._lock.notify_all()
+
+            if delay is None:
+                return resp
+            with self._lock:
+                if not self._finish(state, delay, retry, attempt):
+                    return resp
+            resp.close()
+            attempt += 1
+
+    async def acall(self, endpoint: str, send: Callable[[], Awaitable[T]], retry: bool = True) -> T:
+        """Async twin of call() for httpx responses"""
+        if self._async_cond is None:
+            self._async_cond = asyncio.Condition()
+        cond = self._async_cond
+
+        attempt = 0
+        while True:
+            async with cond:
+                state = self._state(endpoint)
+                try:
+                    while True:
+                        blocked = state.blocked_until - time.monotonic()
+                        if blocked > 0:
+                            try:
+                                await asyncio.wait_for(cond.wait(), blocked)
+                            except asyncio.TimeoutError:
+                                pass
+                        elif self._has_slot(state, attempt):
+                            break
+                        else:
+                            await cond.wait()
+                finally:
+                    # Also on cancellation, so new requests are not held back forever
+                    if attempt:
+                        state.retrying[attempt] -= 1
+                        if not state.retrying[attempt]:
+                            del state.retrying[attempt]
+                state.in_flight += 1
+                state.stats.requests += 1
+
+            delay = None
+            succeeded = False  # stays False if send() raises
+            try:
+                resp = await send()
+                if resp.status_code == 429:
+                    await resp.aread()
+                    delay = self._backoff(retry_after_seconds(429, resp.content, resp.headers), attempt)
+                succeeded = resp.status_code < 500
+            finally:
+                async with cond:
+                    self._on_response(state, delay, succeeded)
+                    cond.notify_all()
+
+            if delay is None:
+                return resp
+            if not self._finish(state, delay, retry, attempt):
+                return resp
+            attempt += 1
+
+    def reset_stats(self):
+        """Zero the counters (learned limits are kept), e.g. between benchmark cases"""
+        with self._lock:
+            for state in self._endpoints.values():
+                state.stats = EndpointStats(limit=state.limit, min_limit_seen=state.limit)
+
+    def endpoint_stats(self) -> Dict[str, EndpointStats]:
+        """Snapshot of per-endpoint counters"""
+        with self._lock:
+            return {k: EndpointStats(**vars(s.stats)) for k, s in self._endpoints.items()}
+
+    def summary(self) -> Dict[str, Any]:
+        """Totals plus the endpoints that were throttled, for benchmark metrics"""
+        stats = self.endpoint_stats()
+        return {
+            'requests': sum(s.requests for s in stats.values()),
+            'throttled': sum(s.throttled for s in stats.values()),
+            'retries': sum(s.retries for s in stats.values()),
+            'gave_up': sum(s.gave_up for s in stats.values()),
+            'retry_wait': sum(s.retry_wait for s in stats.values()),
+            'throttled_endpoints': {
+                k: {'throttled': s.throttled, 'min_limit': round(s.min_limit_seen, 2)}
+                for k, s in stats.items() if s.throttled
+            }
+        }
+
+
+def merge_summaries(*summaries: Dict[str, Any]) -> Dict[str, Any]:
+    """Combine summary() dicts from several clients"""
+    merged: Dict[str, Any] = {'requests': 0, 'throttled': 0, 'retries': 0, 'gave_up': 0,
+                              'retry_wait': 0.0, 'throttled_endpoints': {}}
+    for summary in summaries:
+        for key in ('requests', 'throttled', 'retries', 'gave_up', 'retry_wait'):
+            merged[key] += summary[key]
+        for endpoint, counts in summary['throttled_endpoints'].items():
+            existing = merged['throttled_endpoints'].get(endpoint)
+            if existing is None:
+                merged['throttled_endpoints'][endpoint] = dict(counts)
+            else:
+                existing['throttled'] += counts['throttled']
+                existing['min_limit'] = min(existing['min_limit'], counts['min_limit'])
+    return merged
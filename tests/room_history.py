@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Room History Iterators
+Follow /messages pagination tokens through a room's timeline with next-page prefetch
+"""
+
+import time
+import asyncio
+import concurrent.futures
+from typing import Dict, Any, List, Optional, Iterator, AsyncIterator, Sequence
+from dataclasses import dataclass, field
+
+from latency_stats import LatencySummary
+
+
+def history_filter(lazy_load_members: bool = False,
+                   event_types: Optional[Sequence[str]] = None) -> Optional[Dict[str, Any]]:
+    """RoomEventFilter for /messages, or None when nothing needs filtering"""
+    room_filter: Dict[str, Any] = {}
+    if lazy_load_members:
+        room_filter["lazy_load_members"] = True
+    if event_types:
+        room_filter["types"] = list(event_types)
+    return room_filter or None
+
+
+@dataclass
+class HistoryPage:
+    """One /messages response"""
+    events: List[Dict[str, Any]]
+    state: List[Dict[str, Any]]  # lazy-loaded member events for this page's senders
+    start: Optional[str]
+    end: Optional[str]
+    latency: float
+
+
+@dataclass
+class HistoryStats:
+    """Scroll-back throughput for one iteration"""
+    pages: int = 0
+    events: int = 0
+    elapsed: float = 0.0
+    wait_time: float = 0.0  # time the consumer spent blocked on a page; prefetch shrinks this
+    page_latencies: List[float] = field(default_factory=list)
+
+    @property
+    def events_per_s(self) -> float:
+        return self.events / self.elapsed if self.elapsed > 0 else 0.0
+
+    def record(self, page: HistoryPage):
+        self.pages += 1
+        self.events += len(page.events)
+        self.page_latencies.append(page.latency)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to a JSON-serialisable dict"""
+        return {
+            'pages': self.pages,
+            'events': self.events,
+            'elapsed': self.elapsed,
+            'wait_time': self.wait_time,
+            'events_per_s': self.events_per_s,
+            'page_latency': LatencySummary.from_samples(self.page_latencies).to_dict()
+        }
+
+
+def _parse_page(response: Dict[str, Any], latency: float) -> HistoryPage:
+    return HistoryPage(
+        events=response.get("chunk", []),
+        state=response.get("state", []),
+        start=response.get("start"),
+        end=response.get("end"),
+        latency=latency
+    )
+
+
+def _next_token(page: HistoryPage, token: Optional[str]) -> Optional[str]:
+    """Token for the following page, or None once the timeline is exhausted"""
+    if not page.events or not page.end or page.end == token:
+        return None
+    return page.end
+
+
+class _HistoryBase:
+    def __init__(self, client, room_id: str, direction: str = "b", page_size: int = 100,
+                 from_token: Optional[str] = None, lazy_load_members: bool = False,
+                 event_types: Optional[Sequence[str]] = None, prefetch: bool = True,
+                 max_events: Optional[int] = None):
+        if direction not in ("b", "f"):
+            raise ValueError(f"direction must be 'b' or 'f', got {direction!r}")
+
+        self.client = client
+        self.room_id = room_id
+        self.direction = direction
+        self.page_size = page_size
+        self.from_token = from_token
+        self.message_filter = history_filter(lazy_load_members, event_types)
+        self.prefetch = prefetch
+        self.max_events = max_events
+
+        self.stats = HistoryStats()
+        self.members: Dict[str, Dict[str, Any]] = {}  # user_id -> latest lazy-loaded m.room.member
+        self.next_token: Optional[str] = None  # resume point after the iteration stops
+
+    def _ingest(self, page: HistoryPage):
+        self.stats.record(page)
+        for event in page.state:
+            if event.get("type") == "m.room.member":
+                self.members[event["state_key"]] = event
+
+    def _remaining(self) -> Optional[int]:
+        if self.max_events is None:
+            return None
+        return self.max_events - self.stats.events
+
+
+class RoomHistory(_HistoryBase):
+    """Iterate a room's timeline for the synchronous MatrixClient
+
+    Yields events newest-first (``direction="b"``) or oldest-first ("f"). While
+    the caller works through one page the next is already being fetched on a
+    worker thread, so at most two pages are held in memory at any time no
+    matter how long the history is. ``stats`` reports events/s and page
+    latency. ``next_token`` resumes after the last page fetched, e.g. once
+    ``max_events`` stopped the iteration.
+    """
+
+    def fetch_page(self, token: Optional[str]) -> HistoryPage:
+        """Fetch one page starting at token"""
+        start = time.perf_counter()
+        response = self.client.get_messages(self.room_id, limit=self.page_size, from_token=token,
+                                            direction=self.direction, message_filter=self.message_filter)
+        return _parse_page(response, time.perf_counter() - start)
+
+    def pages(self) -> Iterator[HistoryPage]:
+        """Yield raw pages, prefetching the next one while each is consumed"""
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1) if self.prefetch else None
+        started = time.perf_counter()
+        token = self.from_token
+        pending = executor.submit(self.fetch_page, token) if executor else None
+
+        try:
+            while True:
+                wait_start = time.perf_counter()
+                page = pending.result() if pending else self.fetch_page(token)
+                self.stats.wait_time += time.perf_counter() - wait_start
+                self._ingest(page)
+
+                self.next_token = _next_token(page, token)
+                pending = None
+                if executor and self.next_token and (self._remaining() is None or self._remaining() > 0):
+                    pending = executor.submit(self.fetch_page, self.next_token)
+
+                self.stats.elapsed = time.perf_counter() - started
+                yield page
+
+                if self.next_token is None:
+                    return
+                token = self.next_token
+        finally:
+            self.stats.elapsed = time.perf_counter() - started
+            if executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        yielded = 0
+        pages = self.pages()
+        try:
+            for page in pages:
+                for event in page.events:
+                    if self.max_events is not None and yielded >= self.max_events:
+                        return
+                    yielded += 1
+                    yield event
+        finally:
+            pages.close()
+
+
+class AsyncRoomHistory(_HistoryBase):
+    """asyncio twin of RoomHistory for AsyncMatrixClient (use ``async for``)"""
+
+    async def fetch_page(self, token: Optional[str]) -> HistoryPage:
+        """Fetch one page starting at token"""
+        start = time.perf_counter()
+        response = await self.client.get_messages(self.room_id, limit=self.page_size, from_token=token,
+                                                  direction=self.direction, message_filter=self.message_filter)
+        return _parse_page(response, time.perf_counter() - start)
+
+    async def pages(self) -> AsyncIterator[HistoryPage]:
+        """Yield raw pages, prefetching the next one while each is consumed"""
+        started = time.perf_counter()
+        token = self.from_token
+        pending = asyncio.create_task(self.fetch_page(token)) if self.prefetch else None
+
+        try:
+            while True:
+                wait_start = time.perf_counter()
+                page = await pending if pending else await self.fetch_page(token)
+                self.stats.wait_time += time.perf_counter() - wait_start
+                self._ingest(page)
+
+                self.next_token = _next_token(page, token)
+                pending = None
+                if self.prefetch and self.next_token and (self._remaining() is None or self._remaining() > 0):
+                    pending = asyncio.create_task(self.fetch_page(self.next_token))
+
+                self.stats.elapsed = time.perf_counter() - started
+                yield page
+
+                if self.next_token is None:
+                    return
+                token = self.next_token
+        finally:
+            self.stats.elapsed = time.perf_counter() - started
+            if pending and not pending.done():
+                pending.cancel()
+
+    async def __aiter__(self) -> AsyncIterator[Dict[str, Any]]:
+        yielded = 0
+        pages = self.pages()
+        try:
+            async for page in pages:
+                for event in page.events:
+                    if self.max_events is not None and yielded >= self.max_events:
+                        return
+                    yielded += 1
+                    yield event
+        finally:
+            await pages.aclose()
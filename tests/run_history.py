@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Test Run History
+SQLite store of per-test durations and outcomes, with slowdown detection across runs
+"""
+
+import json
+import math
+import shutil
+import sqlite3
+import statistics
+import subprocess
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+
+DEFAULT_HISTORY_FILE = 'run_history.sqlite'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    git_commit TEXT,
+    images TEXT NOT NULL DEFAULT '{}',
+    total_duration REAL
+);
+CREATE TABLE IF NOT EXISTS suite_results (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    suite TEXT NOT NULL,
+    passed INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    fingerprint TEXT
+);
+CREATE TABLE IF NOT EXISTS test_results (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    nodeid TEXT NOT NULL,
+    suite TEXT NOT NULL,
+    status TEXT NOT NULL,
+    duration REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_test_results_nodeid ON test_results(nodeid, run_id);
+CREATE INDEX IF NOT EXISTS idx_suite_results_suite ON suite_results(suite, run_id);
+CREATE INDEX IF NOT EXISTS idx_test_results_run ON test_results(run_id);
+"""
+
+
+def git_commit(repo_dir: Path) -> Optional[str]:
+    """HEAD of the repository under test, or None outside a git checkout"""
+    try:
+        result = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                timeout=10, cwd=repo_dir)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return (result.stdout.strip() or None) if result.returncode == 0 else None
+
+
+def stack_images(name_filter: str = 'voice-stack') -> Dict[str, str]:
+    """Image ID each running stack container was started from, keyed by container name
+
+    The ID from docker inspect changes whenever a tag is rebuilt or re-pulled,
+    unlike the image name docker ps reports.
+    """
+    if not shutil.which('docker'):
+        return {}
+    try:
+        names = subprocess.run(['docker', 'ps', '--filter', f'name={name_filter}', '--format', '{{.Names}}'],
+                               capture_output=True, text=True, timeout=10).stdout.split()
+        if not names:
+            return {}
+        result = subprocess.run(['docker', 'inspect', '--format', '{{.Name}} {{.Image}}'] + names,
+                                capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        return {}
+    images = {}
+    for line in result.stdout.splitlines():
+        name, _, image = line.partition(' ')
+        if image:
+            images[name.lstrip('/')] = image
+    return images
+
+
+def mann_whitney_u(baseline: Sequence[float], recent: Sequence[float]) -> Tuple[float, float]:
+    """One-sided Mann-Whitney U test that recent values are larger than baseline
+
+    Returns (U for recent, p-value) using the normal approximation with tie
+    and continuity correction, which is adequate for the handful-to-dozens
+    of runs this is applied to.
+    """
+    n1, n2 = len(recent), len(baseline)
+    combined = sorted([(v, 0) for v in recent] + [(v, 1) for v in baseline])
+
+    # Average ranks over ties
+    ranks = [0.0] * len(combined)
+    tie_term = 0.0
+    i = 0
+    while i < len(combined):
+        j = i
+        while j + 1 < len(combined) and combined[j + 1][0] == combined[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2 + 1
+        tied = j - i + 1
+        tie_term += tied ** 3 - tied
+        i = j + 1
+
+    rank_sum = sum(rank for rank, (_, group) in zip(ranks, combined) if group == 0)
+    u = rank_sum - n1 * (n1 + 1) / 2
+
+    n = n1 + n2
+    mean = n1 * n2 / 2
+    variance = n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1))) if n > 1 else 0.0
+    if variance <= 0:
+        return u, 1.0
+    z = (u - mean - 0.5) / math.sqrt(variance)
+    return u, 0.5 * math.erfc(z / math.sqrt(2))
+
+
+@dataclass
+class Regression:
+    """A test or suite that got significantly slower"""
+    key: str
+    kind: str  # test or suite
+    baseline_median: float
+    recent_median: float
+    slowdown: float  # recent / baseline median
+    p_value: float
+    baseline_runs: int
+    recent_runs: int
+
+    def describe(self) -> str:
+        return (f"{self.key}: {self.baseline_median:.2f}s -> {self.recent_median:.2f}s "
+                f"({self.slowdown:.2f}x, p={self.p_value:.4f})")
+
+
+class RunHistory:
+    """Append-only history of test runs in a local SQLite file"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.path))
+        self.db.execute("PRAGMA foreign_keys = ON")
+        self.db.executescript(_SCHEMA)
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(suite_results)")]
+        if 'fingerprint' not in columns:
+            self.db.execute("ALTER TABLE suite_results ADD COLUMN fingerprint TEXT")
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def record_run(self, report, commit: Optional[str] = None,
+                   images: Optional[Dict[str, str]] = None) -> int:
+        """Store a TestRunReport and return its run id"""
+        with self.db:
+            cursor = self.db.execute(
+                "INSERT INTO runs (timestamp, git_commit, images, total_duration) VALUES (?, ?, ?, ?)",
+                (report.timestamp, commit, json.dumps(images or {}, sort_keys=True), report.total_duration)
+            )
+            run_id = cursor.lastrowid
+            # Cached suites did not run, so they add nothing to the duration history
+            suites = [s for s in report.suites if s.cached_from is None]
+            self.db.executemany(
+                "INSERT INTO suite_results (run_id, suite, passed, duration, fingerprint) VALUES (?, ?, ?, ?, ?)",
+                [(run_id, s.name, int(s.failed == 0 and s.errors == 0), s.duration, s.fingerprint)
+                 for s in suites]
+            )
+            self.db.executemany(
+                "INSERT INTO test_results (run_id, nodeid, suite, status, duration) VALUES (?, ?, ?, ?, ?)",
+                [(run_id, t.nodeid or f"{s.name}::{t.name}", s.name, t.status, t.duration)
+                 for s in suites for t in s.tests]
+            )
+        return run_id
+
+    def cached_pass(self, suite: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """Latest passing run of a suite with this exact input fingerprint, with its test results"""
+        row = self.db.execute(
+            "SELECT r.id, r.timestamp FROM suite_results s JOIN runs r ON r.id = s.run_id "
+            "WHERE s.suite = ? AND s.fingerprint = ? AND s.passed = 1 ORDER BY r.id DESC LIMIT 1",
+            (suite, fingerprint)
+        ).fetchone()
+        if not row:
+            return None
+        tests = self.db.execute(
+            "SELECT nodeid, status, duration FROM test_results WHERE run_id = ? AND suite = ?", (row[0], suite)
+        ).fetchall()
+        return {'run_id': row[0], 'timestamp': row[1],
+                'tests': [{'nodeid': t[0], 'status': t[1], 'duration': t[2]} for t in tests]}
+
+    def runs(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Most recent runs, newest first"""
+        rows = self.db.execute(
+            "SELECT id, timestamp, git_commit, images, total_duration FROM runs ORDER BY id DESC LIMIT ?",
+            (limit,)
+        ).fetchall()
+        return [{'id': r[0], 'timestamp': r[1], 'git_commit': r[2], 'images': json.loads(r[3]),
+                 'total_duration': r[4]} for r in rows]
+
+    def suite_durations(self, last: int = 10) -> Dict[str, float]:
+        """Median duration per suite over its last runs"""
+        durations: Dict[str, List[float]] = {}
+        for suite, duration in self.db.execute(
+                "SELECT suite, duration FROM suite_results ORDER BY run_id DESC"):
+            if len(durations.setdefault(suite, [])) < last:
+                durations[suite].append(duration)
+        return {suite: statistics.median(values) for suite, values in durations.items()}
+
+    def recent_test_durations(self, runs: int = 20) -> Dict[str, List[float]]:
+        """Durations of every test over the last runs, oldest first, for sparklines"""
+        return self._recent("test_results", "nodeid", runs)
+
+    def recent_suite_durations(self, runs: int = 20) -> Dict[str, List[float]]:
+        """Durations of every suite over the last runs, oldest first"""
+        return self._recent("suite_results", "suite", runs)
+
+    def _recent(self, table: str, key: str, runs: int) -> Dict[str, List[float]]:
+        history: Dict[str, List[float]] = {}
+        for name, duration in self.db.execute(
+                f"SELECT {key}, duration FROM {table} "
+                f"WHERE run_id >= (SELECT MIN(id) FROM (SELECT id FROM runs ORDER BY id DESC LIMIT ?)) "
+                f"ORDER BY run_id", (runs,)):
+            history.setdefault(name, []).append(duration)
+        return history
+
+    def test_durations(self, nodeid: str, up_to_run: int, limit: int) -> List[float]:
+        """Passed-run durations of one test, newest first, up to and including a run"""
+        rows = self.db.execute(
+            "SELECT duration FROM test_results WHERE nodeid = ? AND status = 'passed' AND run_id <= ? "
+            "ORDER BY run_id DESC LIMIT ?", (nodeid, up_to_run, limit)
+        ).fetchall()
+        return [r[0] for r in rows]
+
+    def _suite_history(self, suite: str, up_to_run: int, limit: int) -> List[float]:
+        rows = self.db.execute(
+            "SELECT duration FROM suite_results WHERE suite = ? AND passed = 1 AND run_id <= ? "
+            "ORDER BY run_id DESC LIMIT ?", (suite, up_to_run, limit)
+        ).fetchall()
+        return [r[0] for r in rows]
+
+    def detect_regressions(self, run_id: int, recent: int = 3, baseline: int = 20,
+                           min_baseline: int = 10, alpha: float = 0.01,
+                           min_slowdown: float = 1.2, min_seconds: float = 0.05) -> List[Regression]:
+        """Tests and suites whose last `recent` passing runs are significantly slower than before
+
+        The `recent` newest passing durations (ending at run_id) are compared
+        with up to `baseline` passing durations before them. A result is only
+        flagged when the difference is significant at alpha, the median grew
+        by at least min_slowdown and by more than min_seconds, so noise in
+        sub-second tests does not drown out real Synapse or Element slowdowns.
+        """
+        keys = [(nodeid, 'test') for (nodeid,) in self.db.execute(
+            "SELECT nodeid FROM test_results WHERE run_id = ? AND status = 'passed'", (run_id,))]
+        keys += [(suite, 'suite') for (suite,) in self.db.execute(
+            "SELECT suite FROM suite_results WHERE run_id = ? AND passed = 1", (run_id,))]
+
+        regressions = []
+        for key, kind in keys:
+            if kind == 'test':
+                history = self.test_durations(key, run_id, recent + baseline)
+            else:
+                history = self._suite_history(key, run_id, recent + baseline)
+            recent_values, baseline_values = history[:recent], history[recent:]
+            if len(recent_values) < recent or len(baseline_values) < min_baseline:
+                continue
+
+            baseline_median = statistics.median(baseline_values)
+            recent_median = statistics.median(recent_values)
+            if recent_median - baseline_median < min_seconds:
+                continue
+            slowdown = recent_median / baseline_median if baseline_median > 0 else math.inf
+            if slowdown < min_slowdown:
+                continue
+
+            _, p_value = mann_whitney_u(baseline_values, recent_values)
+            if p_value < alpha:
+                regressions.append(Regression(
+                    key=key, kind=kind, baseline_median=baseline_median, recent_median=recent_median,
+                    slowdown=slowdown, p_value=p_value,
+                    baseline_runs=len(baseline_values), recent_runs=len(recent_values)
+                ))
+
+        return sorted(regressions, key=lambda r: r.p_value)
+
@@ -10,14 +10,22 @@ import argparse
 import subprocess
 import json
 import time
-import requests
 from pathlib import Path
-from typing import Dict, Any, List, Optional
-from dataclasses import dataclass, asdict
+from typing import Dict, Any, List, Optional, Tuple
+from dataclasses import dataclass, field, asdict
 from datetime import datetime
 import tempfile
 import shutil
 
+from benchmark_results import load_benchmark_results
+from html_report import write_html_report
+from run_history import RunHistory, DEFAULT_HISTORY_FILE, git_commit, stack_images
+from pytest_daemon import PytestDaemon, DEFAULT_DAEMON_ADDRESS, ping_daemon, run_on_daemon
+from pytest_stream import ResultListener
+from suite_fingerprint import SuiteFingerprinter, RELEVANT_ENV
+from suite_scheduler import SuiteJob, SuiteScheduler, classify_suite, historical_durations
+from service_readiness import StartupTimeline, wait_for_services, print_timeline
+
 
 @dataclass
 class TestResult:
@@ -28,6 +36,7 @@ class TestResult:
     duration: float
     message: Optional[str] = None
     details: Optional[str] = None
+    nodeid: Optional[str] = None
 
 
 @dataclass
@@ -41,6 +50,9 @@ class TestSuiteResult:
     errors: int
     duration: float
     tests: List[TestResult]
+    fingerprint: Optional[str] = None
+    cached_from: Optional[int] = None  # run id whose pass was reused instead of running
+    cacheable: bool = False  # results streamed from a full collection and pytest exited 0
 
 
 @dataclass
@@ -51,6 +63,8 @@ class TestRunReport:
     suites: List[TestSuiteResult]
     total_duration: float
     summary: Dict[str, int]
+    benchmarks: List[Dict[str, Any]] = field(default_factory=list)
+    regressions: List[Dict[str, Any]] = field(default_factory=list)
 
 
 class TestRunner:
@@ -59,9 +73,13 @@ class TestRunner:
     def __init__(self, config_file: Optional[str] = None):
         self.test_dir = Path(__file__).parent
         self.project_root = self.test_dir.parent
+        self.config_file = Path(config_file) if config_file and Path(config_file).exists() else None
         self.config = self._load_config(config_file)
         self.results: List[TestSuiteResult] = []
         self.start_time = time.time()
+        self.startup_timeline: Optional[StartupTimeline] = None
+        self.test_env: Dict[str, str] = {}
+        self._stack_images: Optional[Dict[str, str]] = None
     
     def _load_config(self, config_file: Optional[str]) -> Dict[str, Any]:
         """Load test configuration"""
@@ -73,8 +91,13 @@ class TestRunner:
             'test_user_password': 'TestPassword123!',
             'headless': True,
             'parallel_workers': 2,
+            'service_wait': 10,
+            'worker_budget': os.cpu_count() or 2,
             'report_format': 'html',
-            'output_dir': 'test-reports'
+            'output_dir': 'test-reports',
+            'history_db': None,  # defaults to <output_dir>/run_history.sqlite
+            'history_runs': 20,
+            'force': False
         }
         
         if config_file and Path(config_file).exists():
@@ -91,13 +114,15 @@ class TestRunner:
             'TEST_TIMEOUT': 'test_timeout',
             'TEST_USER_PASSWORD': 'test_user_password',
             'HEADLESS': 'headless',
-            'PARALLEL_WORKERS': 'parallel_workers'
+            'PARALLEL_WORKERS': 'parallel_workers',
+            'SERVICE_WAIT': 'service_wait',
+            'WORKER_BUDGET': 'worker_budget'
         }
         
         for env_var, config_key in env_overrides.items():
             if os.getenv(env_var):
                 value = os.getenv(env_var)
-                if config_key in ['test_timeout', 'parallel_workers']:
+                if config_key in ['test_timeout', 'parallel_workers', 'service_wait', 'worker_budget']:
                     value = int(value)
                 elif config_key == 'headless':
                     value = value.lower() == 'true'
@@ -105,8 +130,12 @@ class TestRunner:
         
         return default_config
     
-    def check_services_available(self) -> Dict[str, bool]:
-        """Check if required services are available"""
+    def check_services_available(self, deadline: float = 10.0) -> Dict[str, bool]:
+        """Check if required services are available
+        
+        All services are probed concurrently; the startup timeline is kept on
+        self.startup_timeline so the report can show when each came up.
+        """
         services = {
             'synapse': f"{self.config['synapse_url']}/health",
             'element': self.config['element_url'],
@@ -114,16 +143,8 @@ class TestRunner:
             'well_known': 'http://localhost:8090/.well-known/matrix/server'
         }
         
-        results = {}
-        
-        for service_name, url in services.items():
-            try:
-                response = requests.get(url, timeout=10)
-                results[service_name] = response.status_code in [200, 404]  # 404 ok for some
-            except requests.RequestException:
-                results[service_name] = False
-        
-        return results
+        self.startup_timeline = wait_for_services(services, deadline=deadline)
+        return {name: state.ready for name, state in self.startup_timeline.services.items()}
     
     def setup_test_environment(self) -> Dict[str, Any]:
         """Setup test environment and return environment info"""
@@ -148,88 +169,94 @@ class TestRunner:
         }
         
         os.environ.update(test_env)
+        self.test_env = test_env
         env_info['environment_variables'] = test_env
         
         return env_info
     
+    def suite_environment(self) -> Dict[str, str]:
+        """Environment every suite runs under: the test settings plus the fingerprinted variables we have"""
+        env = {name: os.environ[name] for name in RELEVANT_ENV if name in os.environ}
+        env.update(self.test_env)
+        return env
+    
     def run_pytest_suite(self, test_file: str, markers: List[str] = None, 
                         extra_args: List[str] = None) -> TestSuiteResult:
-        """Run a pytest test suite and parse results"""
+        """Run a pytest test suite, collecting results as they stream in"""
         suite_name = Path(test_file).stem
         
-        # Create temporary file for pytest report
-        temp_dir = tempfile.gettempdir()
-        report_file = os.path.join(temp_dir, f'pytest-report-{suite_name}-{int(time.time())}.json')
-        
-        cmd = [
-            sys.executable, '-m', 'pytest',
+        args = [
             str(self.test_dir / test_file),
-            '--json-report', f'--json-report-file={report_file}',
+            '-p', 'pytest_stream',
             '--tb=short',
-            '-v'
+            '-q'
         ]
         
         if markers:
             for marker in markers:
-                cmd.extend(['-m', marker])
+                args.extend(['-m', marker])
         
         if extra_args:
-            cmd.extend(extra_args)
+            args.extend(extra_args)
         
         # Add parallel execution if configured
         if self.config['parallel_workers'] > 1:
-            cmd.extend(['-n', str(self.config['parallel_workers'])])
+            args.extend(['-n', str(self.config['parallel_workers'])])
+        
+        tests: List[TestResult] = []
+        collected: Dict[str, Optional[int]] = {'count': None}
+        
+        def on_event(event: Dict[str, Any]):
+            if event.get('event') == 'collected':
+                collected['count'] = event['count']
+            elif event.get('event') == 'test':
+                test = TestResult(
+                    suite=suite_name,
+                    name=event['nodeid'].split('::')[-1],
+                    status=event['outcome'],
+                    duration=event.get('duration', 0),
+                    message=event.get('longrepr'),
+                    nodeid=event['nodeid']
+                )
+                tests.append(test)
+                self._print_test_progress(test, len(tests), collected['count'])
         
         print(f"Running {suite_name} tests...")
         start_time = time.time()
         
         try:
-            result = subprocess.run(
-                cmd, 
-                capture_output=True, 
-                text=True, 
-                timeout=self.config['test_timeout'],
-                cwd=self.test_dir
-            )
+            with ResultListener(on_event) as listener:
+                env = dict(self.suite_environment(), **listener.env)
+                if self.config.get('daemon'):
+                    returncode, output, timed_out = run_on_daemon(
+                        self.config['daemon'], args, env, self.config['test_timeout'])
+                else:
+                    returncode, output, timed_out = self._run_pytest_process(
+                        args, env, self.config['test_timeout'])
+                listener.close()
             
             duration = time.time() - start_time
             
-            # Parse JSON report if available
-            json_report_file = Path(report_file)
-            if json_report_file.exists():
-                try:
-                    with open(json_report_file, 'r') as f:
-                        report_data = json.load(f)
-                    
-                    # Clean up temp file
-                    json_report_file.unlink()
-                    return self._parse_pytest_json_report(suite_name, report_data, duration)
-                except Exception as e:
-                    print(f"Warning: Could not parse JSON report: {e}")
-                    # Fallback to parsing stdout
-                    return self._parse_pytest_output(suite_name, result, duration)
-            else:
-                # Fallback to parsing stdout
+            if not tests and not timed_out:
+                # Nothing streamed (pytest failed to start or the plugin did not load)
+                result = subprocess.CompletedProcess(args, returncode, stdout=output, stderr='')
                 return self._parse_pytest_output(suite_name, result, duration)
-                
-        except subprocess.TimeoutExpired:
-            duration = time.time() - start_time
-            return TestSuiteResult(
-                name=suite_name,
-                total=1,
-                passed=0,
-                failed=1,
-                skipped=0,
-                errors=0,
-                duration=duration,
-                tests=[TestResult(
+            
+            if timed_out:
+                # Keep everything that finished before the kill
+                tests.append(TestResult(
                     suite=suite_name,
                     name="timeout",
                     status="error",
                     duration=duration,
-                    message="Test suite timed out"
-                )]
-            )
+                    message=f"Test suite timed out after {self.config['test_timeout']}s "
+                            f"({len(tests)} of {collected['count'] or '?'} tests reported)"
+                ))
+            
+            suite = self._suite_from_tests(suite_name, tests, duration)
+            suite.cacheable = collected['count'] is not None and returncode == 0 and not timed_out
+            return suite
+        
         except Exception as e:
             duration = time.time() - start_time
             return TestSuiteResult(
@@ -249,29 +276,48 @@ class TestRunner:
                 )]
             )
     
-    def _parse_pytest_json_report(self, suite_name: str, report_data: Dict[str, Any], 
-                                 duration: float) -> TestSuiteResult:
-        """Parse pytest JSON report"""
-        summary = report_data.get('summary', {})
-        tests = []
-        
-        for test_data in report_data.get('tests', []):
-            test_result = TestResult(
-                suite=suite_name,
-                name=test_data.get('nodeid', '').split('::')[-1],
-                status=test_data.get('outcome', 'unknown'),
-                duration=test_data.get('duration', 0),
-                message=test_data.get('call', {}).get('longrepr', None)
+    def _run_pytest_process(self, args: List[str], env: Dict[str, str],
+                            timeout: float) -> Tuple[int, str, bool]:
+        """Run pytest in a fresh interpreter; returns (exit code, output tail, timed out)"""
+        # pytest's own output goes to a temp file rather than memory; results arrive
+        # through the stream, so only the tail is kept for the fallback summary parse
+        with tempfile.TemporaryFile() as output:
+            process = subprocess.Popen(
+                [sys.executable, '-m', 'pytest'] + args,
+                stdout=output,
+                stderr=subprocess.STDOUT,
+                cwd=self.test_dir,
+                env=dict(os.environ, **env)
             )
-            tests.append(test_result)
-        
+            timed_out = False
+            try:
+                returncode = process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                returncode = process.wait()
+                timed_out = True
+            
+            output.seek(0, os.SEEK_END)
+            output.seek(max(0, output.tell() - 64 * 1024))
+            return returncode, output.read().decode('utf-8', errors='replace'), timed_out
+    
+    def _print_test_progress(self, test: TestResult, done: int, collected: Optional[int]):
+        """Live per-test line: failures always, everything with --verbose"""
+        if test.status in ('passed', 'skipped') and not self.config.get('verbose'):
+            return
+        mark = {'passed': '✓', 'skipped': '⚠'}.get(test.status, '✗')
+        print(f"  {mark} {test.suite} [{done}/{collected or '?'}] {test.name}")
+    
+    def _suite_from_tests(self, suite_name: str, tests: List[TestResult],
+                          duration: float) -> TestSuiteResult:
+        """Build suite counts from streamed test results"""
         return TestSuiteResult(
             name=suite_name,
-            total=summary.get('total', 0),
-            passed=summary.get('passed', 0),
-            failed=summary.get('failed', 0),
-            skipped=summary.get('skipped', 0),
-            errors=summary.get('error', 0),
+            total=len(tests),
+            passed=sum(1 for t in tests if t.status == 'passed'),
+            failed=sum(1 for t in tests if t.status == 'failed'),
+            skipped=sum(1 for t in tests if t.status == 'skipped'),
+            errors=sum(1 for t in tests if t.status == 'error'),
             duration=duration,
             tests=tests
         )
@@ -348,6 +394,8 @@ class TestRunner:
         """Run all test suites and generate report"""
         if test_suites is None:
             test_suites = [
+                'test_local_synapse.py',
+                'test_runner_tooling.py',
                 'test_synapse_api.py',
                 'test_element_web.py', 
                 'test_element_call.py',
@@ -362,41 +410,41 @@ class TestRunner:
         env_info = self.setup_test_environment()
         print(f"Test environment: {env_info['timestamp']}")
         
-        # Check service availability
-        print("\nChecking service availability...")
-        service_status = self.check_services_available()
-        for service, available in service_status.items():
-            status = "✓" if available else "✗"
-            print(f"  {status} {service}")
+        # Decide what actually has to run before waiting on any service
+        jobs = self.plan_suites(test_suites)
+        results = {}
+        if not self.config['force']:
+            results = self.cached_results(jobs)
+            jobs_to_run = [job for job in jobs if job.name not in results]
+        else:
+            jobs_to_run = jobs
         
-        unavailable_services = [s for s, available in service_status.items() if not available]
-        if unavailable_services:
-            print(f"\n⚠ Warning: Some services unavailable: {', '.join(unavailable_services)}")
-            print("Some tests may fail or be skipped.")
+        # Check service availability
+        if jobs_to_run:
+            print("\nChecking service availability...")
+            service_status = self.check_services_available(self.config['service_wait'])
+            print_timeline(self.startup_timeline)
+            env_info['startup_timeline'] = self.startup_timeline.to_dict()
+            
+            unavailable_services = [s for s, available in service_status.items() if not available]
+            if unavailable_services:
+                print(f"\n⚠ Warning: Some services unavailable: {', '.join(unavailable_services)}")
+                print("Some tests may fail or be skipped.")
         
         # Run test suites
-        print(f"\nRunning {len(test_suites)} test suites...")
+        print(f"\nRunning {len(jobs_to_run)} test suites (worker budget {self.config['worker_budget']})...")
         print("-" * 30)
         
-        for test_suite in test_suites:
-            if not (self.test_dir / test_suite).exists():
-                print(f"⚠ Test suite not found: {test_suite}")
-                continue
-            
-            # Special handling for different test types
-            extra_args = []
-            markers = []
-            
-            if 'deployment' in test_suite:
-                markers.append('not slow')  # Skip slow tests by default
-            
-            result = self.run_pytest_suite(test_suite, markers, extra_args)
-            self.results.append(result)
-            
-            # Print immediate results
-            status_emoji = "✓" if result.failed == 0 and result.errors == 0 else "✗"
-            print(f"{status_emoji} {result.name}: {result.passed}/{result.total} passed "
-                  f"({result.duration:.1f}s)")
+        scheduler = SuiteScheduler(
+            self._run_job,
+            budget=self.config['worker_budget'],
+            on_complete=self._print_suite_result
+        )
+        results.update(scheduler.run(jobs_to_run))
+        
+        # Keep the requested suite order in the report regardless of completion order
+        for job in sorted(jobs, key=lambda j: test_suites.index(j.test_file)):
+            self.results.append(results[job.name])
         
         # Generate final report
         total_duration = time.time() - self.start_time
@@ -412,6 +460,101 @@ class TestRunner:
         
         return report
     
+    def plan_suites(self, test_suites: List[str]) -> List[SuiteJob]:
+        """Build scheduler jobs with resource classes and expected durations from past reports"""
+        history = historical_durations(Path(self.config['output_dir']))
+        if self.history_path().exists():
+            with RunHistory(self.history_path()) as run_history:
+                history.update(run_history.suite_durations())
+        fingerprinter = SuiteFingerprinter(self.test_dir, self.project_root, images=self.stack_images(),
+                                           config_file=self.config_file)
+        suite_env = self.suite_environment()
+        jobs = []
+        
+        for test_suite in test_suites:
+            path = self.test_dir / test_suite
+            if not path.exists():
+                print(f"⚠ Test suite not found: {test_suite}")
+                continue
+            
+            # Special handling for different test types
+            markers = []
+            if 'deployment' in test_suite:
+                markers.append('not slow')  # Skip slow tests by default
+            
+            jobs.append(SuiteJob(
+                test_file=test_suite,
+                resource_class=classify_suite(path),
+                workers=self.config['parallel_workers'],
+                expected_duration=history.get(path.stem),
+                fingerprint=fingerprinter.fingerprint(test_suite, markers, suite_env,
+                                                      workers=self.config['parallel_workers']),
+                markers=markers
+            ))
+        
+        return jobs
+    
+    def cached_results(self, jobs: List[SuiteJob]) -> Dict[str, TestSuiteResult]:
+        """cached-pass results for suites whose fingerprint matches an earlier passing run"""
+        if not self.history_path().exists():
+            return {}
+        
+        results = {}
+        with RunHistory(self.history_path()) as run_history:
+            for job in jobs:
+                hit = run_history.cached_pass(job.name, job.fingerprint)
+                if not hit:
+                    continue
+                tests = [TestResult(
+                    suite=job.name,
+                    name=t['nodeid'].split('::')[-1],
+                    status=t['status'],
+                    duration=t['duration'],
+                    nodeid=t['nodeid']
+                ) for t in hit['tests']]
+                result = self._suite_from_tests(job.name, tests, 0.0)
+                result.fingerprint = job.fingerprint
+                result.cached_from = hit['run_id']
+                results[job.name] = result
+                print(f"✓ {job.name}: cached-pass, inputs unchanged since run {hit['run_id']} "
+                      f"({hit['timestamp']})")
+        
+        return results
+    
+    def _run_job(self, job: SuiteJob) -> TestSuiteResult:
+        """Run one scheduled suite and tag it with its input fingerprint"""
+        result = self.run_pytest_suite(job.test_file, job.markers, job.extra_args)
+        # A pass parsed from pytest's summary text is not trusted enough to skip future runs
+        result.fingerprint = job.fingerprint if result.cacheable else None
+        return result
+    
+    def stack_images(self) -> Dict[str, str]:
+        """Running stack images, inspected once per run for both fingerprints and history"""
+        if self._stack_images is None:
+            self._stack_images = stack_images()
+        return self._stack_images
+    
+    def history_path(self) -> Path:
+        """SQLite run history location"""
+        return Path(self.config['history_db'] or Path(self.config['output_dir']) / DEFAULT_HISTORY_FILE)
+    
+    def record_history(self, report: TestRunReport):
+        """Append the run to the history and attach any significant slowdowns to the report"""
+        with RunHistory(self.history_path()) as run_history:
+            run_id = run_history.record_run(report, git_commit(self.project_root), self.stack_images())
+            regressions = run_history.detect_regressions(run_id, baseline=self.config['history_runs'])
+        
+        report.regressions = [asdict(r) for r in regressions]
+        print(f"Run {run_id} recorded in {self.history_path()}"
+              f"{f' ({len(regressions)} slowdown(s) flagged)' if regressions else ''}")
+    
+    def _print_suite_result(self, job: SuiteJob, result: TestSuiteResult):
+        """Print a suite result as soon as it finishes"""
+        status_emoji = "✓" if result.failed == 0 and result.errors == 0 else "✗"
+        expected = f", expected {job.expected_duration:.1f}s" if job.expected_duration is not None else ""
+        print(f"{status_emoji} {result.name}: {result.passed}/{result.total} passed "
+              f"({result.duration:.1f}s{expected}) [{job.resource_class}]")
+    
     def _calculate_summary(self) -> Dict[str, int]:
         """Calculate overall test summary"""
         summary = {
@@ -426,128 +569,48 @@ class TestRunner:
     
     def generate_html_report(self, report: TestRunReport, output_file: str):
         """Generate HTML test report"""
-        html_template = """
-<!DOCTYPE html>
-<html>
-<head>
-    <title>Matrix Family Server Test Report</title>
-    <style>
-        body { font-family: Arial, sans-serif; margin: 40px; }
-        .header { background: #f5f5f5; padding: 20px; border-radius: 5px; }
-        .summary { display: flex; gap: 20px; margin: 20px 0; }
-        .metric { background: #e9ecef; padding: 15px; border-radius: 5px; text-align: center; }
-        .metric.passed { background: #d4edda; color: #155724; }
-        .metric.failed { background: #f8d7da; color: #721c24; }
-        .suite { margin: 20px 0; border: 1px solid #dee2e6; border-radius: 5px; }
-        .suite-header { background: #f8f9fa; padding: 15px; font-weight: bold; }
-        .test-list { padding: 0; margin: 0; list-style: none; }
-        .test-item { padding: 10px 15px; border-bottom: 1px solid #dee2e6; }
-        .test-item:last-child { border-bottom: none; }
-        .status-passed { color: #28a745; }
-        .status-failed { color: #dc3545; }
-        .status-skipped { color: #6c757d; }
-        .status-error { color: #fd7e14; }
-        .details { font-family: monospace; font-size: 12px; background: #f8f9fa; padding: 10px; margin-top: 10px; }
-    </style>
-</head>
-<body>
-    <div class="header">
-        <h1>Matrix Family Server Test Report</h1>
-        <p><strong>Generated:</strong> {timestamp}</p>
-        <p><strong>Duration:</strong> {duration:.1f} seconds</p>
-        <p><strong>Environment:</strong> {platform}</p>
-    </div>
-    
-    <div class="summary">
-        <div class="metric">
-            <div style="font-size: 24px; font-weight: bold;">{total_suites}</div>
-            <div>Test Suites</div>
-        </div>
-        <div class="metric">
-            <div style="font-size: 24px; font-weight: bold;">{total_tests}</div>
-            <div>Total Tests</div>
-        </div>
-        <div class="metric passed">
-            <div style="font-size: 24px; font-weight: bold;">{total_passed}</div>
-            <div>Passed</div>
-        </div>
-        <div class="metric failed">
-            <div style="font-size: 24px; font-weight: bold;">{total_failed}</div>
-            <div>Failed</div>
-        </div>
-        <div class="metric">
-            <div style="font-size: 24px; font-weight: bold;">{total_skipped}</div>
-            <div>Skipped</div>
-        </div>
-        <div class="metric failed">
-            <div style="font-size: 24px; font-weight: bold;">{total_errors}</div>
-            <div>Errors</div>
-        </div>
-    </div>
-    
-    {suites_html}
-    
-    <div style="margin-top: 40px; font-size: 12px; color: #6c757d;">
-        Generated by Matrix Family Server Test Runner
-    </div>
-</body>
-</html>
-        """
+        test_history = suite_history = None
+        if self.history_path().exists():
+            with RunHistory(self.history_path()) as run_history:
+                test_history = run_history.recent_test_durations(self.config['history_runs'])
+                suite_history = run_history.recent_suite_durations(self.config['history_runs'])
         
-        # Generate suites HTML
-        suites_html = ""
-        for suite in report.suites:
-            suite_status = "passed" if suite.failed == 0 and suite.errors == 0 else "failed"
-            
-            tests_html = ""
-            for test in suite.tests:
-                status_class = f"status-{test.status}"
-                details_html = ""
-                if test.message:
-                    details_html = f'<div class="details">{test.message}</div>'
-                
-                tests_html += f"""
-                <li class="test-item">
-                    <span class="{status_class}">●</span> {test.name} 
-                    <span style="float: right;">{test.duration:.2f}s</span>
-                    {details_html}
-                </li>
-                """
-            
-            suites_html += f"""
-            <div class="suite">
-                <div class="suite-header {suite_status}">
-                    {suite.name} - {suite.passed}/{suite.total} passed ({suite.duration:.1f}s)
-                </div>
-                <ul class="test-list">
-                    {tests_html}
-                </ul>
-            </div>
-            """
-        
-        # Fill template
-        html_content = html_template.format(
-            timestamp=report.timestamp,
-            duration=report.total_duration,
-            platform=report.environment.get('platform', 'unknown'),
-            total_suites=report.summary['total_suites'],
-            total_tests=report.summary['total_tests'],
-            total_passed=report.summary['total_passed'],
-            total_failed=report.summary['total_failed'],
-            total_skipped=report.summary['total_skipped'],
-            total_errors=report.summary['total_errors'],
-            suites_html=suites_html
-        )
-        
-        # Write report
         output_path = Path(output_file)
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        
-        with open(output_path, 'w') as f:
-            f.write(html_content)
+        write_html_report(report, output_path, test_history, suite_history)
         
         print(f"HTML report generated: {output_path.absolute()}")
     
+    def load_benchmarks(self, report: TestRunReport, benchmarks_dir: str):
+        """Attach benchmark result files to the report"""
+        report.benchmarks = load_benchmark_results(benchmarks_dir)
+        if report.benchmarks:
+            print(f"Loaded {len(report.benchmarks)} benchmark result(s) from {benchmarks_dir}")
+    
+    def run_load_test(self, users: int, spawn_rate: float, run_time: str, output_dir: Path,
+                      benchmarks_dir: str) -> bool:
+        """Run the household Locust workload headless, writing CSV stats and a benchmark result"""
+        load_dir = output_dir / 'load'
+        load_dir.mkdir(parents=True, exist_ok=True)
+        
+        cmd = [
+            sys.executable, '-m', 'locust',
+            '-f', str(self.test_dir / 'load' / 'locustfile.py'),
+            '--headless',
+            '--users', str(users),
+            '--spawn-rate', str(spawn_rate),
+            '--run-time', run_time,
+            '--host', self.config['synapse_url'],
+            '--csv', str(load_dir / 'household'),
+            '--only-summary'
+        ]
+        env = dict(os.environ, LOAD_RESULTS_DIR=str(Path(benchmarks_dir).absolute()))
+        
+        print(f"\nRunning household load test: {users} users for {run_time}...")
+        result = subprocess.run(cmd, cwd=self.test_dir, env=env)
+        if result.returncode != 0:
+            print(f"⚠ Load test exited with code {result.returncode} (failed requests or missing locust)")
+        return result.returncode == 0
+    
     def generate_json_report(self, report: TestRunReport, output_file: str):
         """Generate JSON test report"""
         output_path = Path(output_file)
@@ -576,6 +639,8 @@ class TestRunner:
         print(f"Skipped: {summary['total_skipped']}")
         print(f"Errors: {summary['total_errors']}")
         print(f"Duration: {report.total_duration:.1f}s")
+        if report.benchmarks:
+            print(f"Benchmarks: {len(report.benchmarks)} result file(s)")
         
         # Calculate success rate
         if summary['total_tests'] > 0:
@@ -585,8 +650,16 @@ class TestRunner:
         print("\nPer Suite Results:")
         for suite in report.suites:
             status = "✓" if suite.failed == 0 and suite.errors == 0 else "✗"
+            cached = f", cached-pass from run {suite.cached_from}" if suite.cached_from is not None else ""
             print(f"  {status} {suite.name}: {suite.passed}/{suite.total} "
-                  f"({suite.duration:.1f}s)")
+                  f"({suite.duration:.1f}s{cached})")
+        
+        if report.regressions:
+            print("\nPerformance Regressions:")
+            for regression in report.regressions:
+                print(f"  ⚠ [{regression['kind']}] {regression['key']}: "
+                      f"{regression['baseline_median']:.2f}s -> {regression['recent_median']:.2f}s "
+                      f"({regression['slowdown']:.2f}x, p={regression['p_value']:.4f})")
         
         # Overall result
         overall_success = summary['total_failed'] == 0 and summary['total_errors'] == 0
@@ -608,27 +681,74 @@ def main():
     parser.add_argument('--no-services-check', action='store_true', 
                        help='Skip service availability check')
     parser.add_argument('--parallel', '-p', type=int, help='Number of parallel workers')
+    parser.add_argument('--worker-budget', '-j', type=int,
+                       help='Worker slots shared by concurrently running suites (1 runs suites one at a time)')
     parser.add_argument('--timeout', '-t', type=int, help='Test timeout in seconds')
+    parser.add_argument('--history-db', help='SQLite run history (default: <output-dir>/run_history.sqlite)')
+    parser.add_argument('--no-history', action='store_true', help='Do not record this run or check for slowdowns')
+    parser.add_argument('--force', action='store_true',
+                       help='Run every suite even if its inputs match an earlier passing run')
+    parser.add_argument('--serve-daemon', metavar='ADDR', nargs='?', const=DEFAULT_DAEMON_ADDRESS,
+                       help='Run a warm pytest worker daemon on host:port instead of running tests '
+                       f'(default {DEFAULT_DAEMON_ADDRESS})')
+    parser.add_argument('--daemon', metavar='ADDR', nargs='?', const=DEFAULT_DAEMON_ADDRESS,
+                       help='Run suites on a warm pytest daemon instead of fresh interpreters')
     parser.add_argument('--verbose', '-v', action='store_true', help='Verbose output')
+    parser.add_argument('--benchmarks-dir', help='Benchmark results to include in the report '
+                       '(default: <output-dir>/benchmarks)')
+    parser.add_argument('--load-users', type=int, default=0,
+                       help='Also run the household Locust workload with this many users')
+    parser.add_argument('--load-spawn-rate', type=float, default=5, help='Locust users started per second')
+    parser.add_argument('--load-duration', default='5m', help='Locust run time, e.g. 90s or 5m')
     
     args = parser.parse_args()
     
     # Create test runner
     runner = TestRunner(args.config)
     
+    if args.serve_daemon:
+        try:
+            PytestDaemon(runner.test_dir, args.serve_daemon).serve_forever()
+        except KeyboardInterrupt:
+            print("\nPytest daemon stopped")
+        sys.exit(0)
+    
     # Override config with command line args
     if args.parallel:
         runner.config['parallel_workers'] = args.parallel
     if args.timeout:
         runner.config['test_timeout'] = args.timeout
+    runner.config['verbose'] = args.verbose
+    if args.worker_budget:
+        runner.config['worker_budget'] = args.worker_budget
+    runner.config['output_dir'] = args.output_dir
+    if args.history_db:
+        runner.config['history_db'] = args.history_db
+    if args.force:
+        runner.config['force'] = True
+    if args.daemon:
+        status = ping_daemon(args.daemon)
+        if status:
+            runner.config['daemon'] = args.daemon
+            print(f"Using pytest daemon at {args.daemon} (pid {status['pid']})")
+        else:
+            print(f"⚠ No pytest daemon at {args.daemon}; running suites in fresh interpreters")
     
     try:
         # Run tests
         report = runner.run_all_tests(args.suites)
         
+        if not args.no_history:
+            runner.record_history(report)
+        
         # Generate reports
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         output_dir = Path(args.output_dir)
+        benchmarks_dir = args.benchmarks_dir or str(output_dir / 'benchmarks')
+        if args.load_users:
+            runner.run_load_test(args.load_users, args.load_spawn_rate, args.load_duration,
+                                 output_dir, benchmarks_dir)
+        runner.load_benchmarks(report, benchmarks_dir)
         
         if args.format in ['html', 'both']:
             html_file = output_dir / f'test_report_{timestamp}.html'
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Service Readiness Prober
+Polls every voice-stack service concurrently until healthy and records a startup timeline
+"""
+
+import asyncio
+import random
+import time
+from typing import Dict, Any, List, Optional, Sequence
+from dataclasses import dataclass, field, asdict
+
+import httpx
+
+
+# 404 is fine for services whose root or probe path has no content (admin UI, well-known)
+DEFAULT_OK_STATUSES = (200, 404)
+
+
+@dataclass
+class ServiceReadiness:
+    """Probe outcome for one service"""
+    name: str
+    url: str
+    ready: bool = False
+    ready_at: Optional[float] = None  # seconds after probing started
+    attempts: int = 0
+    last_status: Optional[int] = None
+    last_error: Optional[str] = None
+
+
+@dataclass
+class StartupTimeline:
+    """When each service became healthy, relative to the start of probing"""
+    started_at: float  # wall-clock epoch seconds
+    deadline: float
+    elapsed: float = 0.0
+    services: Dict[str, ServiceReadiness] = field(default_factory=dict)
+
+    @property
+    def all_ready(self) -> bool:
+        return all(s.ready for s in self.services.values())
+
+    def not_ready(self) -> List[str]:
+        """Names of services still unhealthy at the deadline"""
+        return [name for name, s in self.services.items() if not s.ready]
+
+    def ordered(self) -> List[ServiceReadiness]:
+        """Services in the order they became ready, unready ones last"""
+        return sorted(self.services.values(),
+                      key=lambda s: (not s.ready, s.ready_at if s.ready_at is not None else 0.0))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to a JSON-serialisable dict"""
+        return {
+            'started_at': self.started_at,
+            'deadline': self.deadline,
+            'elapsed': self.elapsed,
+            'services': [asdict(s) for s in self.ordered()]
+        }
+
+
+def backoff_delay(attempt: int, initial_delay: float, max_delay: float, jitter: float,
+                  rng: random.Random = random) -> float:
+    """Exponential delay before retry number attempt (1-based), with +/- jitter as a fraction"""
+    delay = min(max_delay, initial_delay * (2 ** (attempt - 1)))
+    return max(0.0, delay * (1 + rng.uniform(-jitter, jitter)))
+
+
+async def _probe(http: httpx.AsyncClient, state: ServiceReadiness, start: float, deadline: float,
+                 ok_statuses: Sequence[int], initial_delay: float, max_delay: float, jitter: float,
+                 request_timeout: float):
+    """Poll one service until it answers with an ok status or the deadline passes"""
+    loop = asyncio.get_running_loop()
+    while True:
+        remaining = start + deadline - loop.time()
+        if remaining <= 0:
+            return
+        state.attempts += 1
+        try:
+            response = await http.get(state.url, timeout=min(remaining, request_timeout))
+            state.last_status = response.status_code
+            state.last_error = None
+            if response.status_code in ok_statuses:
+                state.ready = True
+                state.ready_at = loop.time() - start
+                return
+        except httpx.HTTPError as e:
+            state.last_error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+
+        delay = backoff_delay(state.attempts, initial_delay, max_delay, jitter)
+        remaining = start + deadline - loop.time()
+        if remaining <= 0:
+            return
+        await asyncio.sleep(min(delay, remaining))
+
+
+async def probe_services(services: Dict[str, str], deadline: float = 180.0,
+                         initial_delay: float = 0.25, max_delay: float = 5.0, jitter: float = 0.2,
+                         request_timeout: float = 5.0,
+                         ok_statuses: Sequence[int] = DEFAULT_OK_STATUSES) -> StartupTimeline:
+    """Probe all services concurrently under one overall deadline
+
+    Each service is retried with exponential backoff and jitter, so a slow
+    Synapse does not hold up noticing that Element is already up, and the
+    time each one first answered healthy is recorded on the timeline.
+    """
+    timeline = StartupTimeline(started_at=time.time(), deadline=deadline)
+    timeline.services = {name: ServiceReadiness(name=name, url=url) for name, url in services.items()}
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    async with httpx.AsyncClient(follow_redirects=True) as http:
+        await asyncio.gather(*(
+            _probe(http, state, start, deadline, ok_statuses, initial_delay, max_delay, jitter, request_timeout)
+            for state in timeline.services.values()
+        ))
+    timeline.elapsed = loop.time() - start
+    return timeline
+
+
+def wait_for_services(services: Dict[str, str], deadline: float = 180.0, **kwargs) -> StartupTimeline:
+    """Blocking wrapper around probe_services for synchronous callers"""
+    return asyncio.run(probe_services(services, deadline=deadline, **kwargs))
+
+
+def print_timeline(timeline: StartupTimeline, indent: str = "  "):
+    """Print services in readiness order"""
+    for state in timeline.ordered():
+        if state.ready:
+            print(f"{indent}✓ {state.name} ready at {state.ready_at:.2f}s ({state.attempts} attempts)")
+        else:
+            reason = state.last_error or (f"HTTP {state.last_status}" if state.last_status else "no response")
+            print(f"{indent}✗ {state.name} not ready after {timeline.deadline:.0f}s ({reason})")
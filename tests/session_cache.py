@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Matrix Session Cache
+Persistent access-token cache so fixtures skip Synapse's password-hash login path
+"""
+
+import os
+import asyncio
+import json
+import time
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Any, Optional
+from dataclasses import dataclass, asdict
+
+import requests
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+DEFAULT_CACHE_FILE = Path.home() / '.cache' / 'voice-stack-tests' / 'sessions.json'
+
+
+@dataclass
+class CachedSession:
+    """Credentials for one user on one homeserver"""
+    synapse_url: str
+    username: str
+    user_id: str
+    access_token: str
+    device_id: Optional[str]
+    created_at: float
+    validated_at: float
+    device: str = ''  # cache namespace, e.g. 'element' for browser sessions
+
+
+@contextmanager
+def _file_lock(lock_path: Path):
+    """Exclusive inter-process lock, shared by pytest-xdist workers"""
+    with open(lock_path, 'a+') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class SessionCache:
+    """Credential cache keyed by (synapse_url, username, device)
+
+    Tokens older than ``ttl`` seconds are revalidated with /account/whoami
+    before reuse. A token Synapse answers 401 for (e.g. one a test logged
+    out) is dropped from the cache and replaced by a fresh login. Sessions
+    under different ``device`` names are separate Synapse devices, so a
+    browser test signing out cannot revoke the token API fixtures are using.
+    The file lock is only held while reading or writing the cache, never
+    across a login, so workers do not serialise on each other.
+    """
+
+    def __init__(self, cache_file: Optional[str] = None, ttl: Optional[float] = None):
+        self.cache_file = Path(cache_file or os.getenv('MATRIX_SESSION_CACHE', str(DEFAULT_CACHE_FILE)))
+        self.lock_file = self.cache_file.with_name(self.cache_file.name + '.lock')
+        self.ttl = ttl if ttl is not None else float(os.getenv('MATRIX_SESSION_TTL', '3600'))
+        self.http = requests.Session()
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def _key(synapse_url: str, username: str, device: str = '') -> str:
+        key = f"{synapse_url.rstrip('/')}|{username}"
+        return f"{key}|{device}" if device else key
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.cache_file, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, entries: Dict[str, Dict[str, Any]]):
+        # Write-then-rename so a crashed worker never leaves a truncated cache
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_file.parent, prefix='.sessions-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(entries, f, indent=2)
+        os.chmod(temp_path, 0o600)
+        os.replace(temp_path, self.cache_file)
+
+    def get(self, synapse_url: str, username: str, device: str = '') -> Optional[CachedSession]:
+        """Cached session without validation"""
+        with _file_lock(self.lock_file):
+            entry = self._read().get(self._key(synapse_url, username, device))
+        return CachedSession(**entry) if entry else None
+
+    def put(self, session: CachedSession):
+        """Store or replace a session"""
+        with _file_lock(self.lock_file):
+            entries = self._read()
+            entries[self._key(session.synapse_url, session.username, session.device)] = asdict(session)
+            self._write(entries)
+
+    def invalidate(self, synapse_url: str, username: str, device: str = ''):
+        """Forget a session, e.g. after the token was logged out"""
+        with _file_lock(self.lock_file):
+            entries = self._read()
+            if entries.pop(self._key(synapse_url, username, device), None) is not None:
+                self._write(entries)
+
+    def _whoami(self, session: CachedSession) -> Optional[bool]:
+        """True if the token works, False if Synapse rejected it, None if that could not be told"""
+        try:
+            resp = self.http.get(
+                f"{session.synapse_url}/_matrix/client/r0/account/whoami",
+                headers={"Authorization": f"Bearer {session.access_token}"},
+                timeout=10
+            )
+        except requests.RequestException:
+            return None
+        if resp.status_code == 401:
+            return False
+        if resp.status_code != 200:
+            return None
+        return resp.json().get("user_id") == session.user_id
+
+    def _login(self, synapse_url: str, username: str, password: str, device: str = '') -> CachedSession:
+        data = {
+            "type": "m.login.password",
+            "user": username,
+            "password": password
+        }
+        if device:
+            data["initial_device_display_name"] = f"voice-stack tests ({device})"
+        resp = self.http.post(f"{synapse_url}/_matrix/client/r0/login", json=data, timeout=30)
+        resp.raise_for_status()
+
+        result = resp.json()
+        now = time.time()
+        return CachedSession(
+            synapse_url=synapse_url,
+            username=username,
+            user_id=result["user_id"],
+            access_token=result["access_token"],
+            device_id=result.get("device_id"),
+            created_at=now,
+            validated_at=now,
+            device=device
+        )
+
+    def ensure_session(self, synapse_url: str, username: str, password: str,
+                       device: str = '') -> CachedSession:
+        """Return a usable session, logging in only when the cache has none that still works
+
+        Raises requests.HTTPError from the login if the user cannot log in
+        (403 when the user does not exist yet).
+        """
+        session = self.get(synapse_url, username, device)
+
+        if session is not None:
+            if time.time() - session.validated_at < self.ttl:
+                return session
+            valid = self._whoami(session)
+            if valid:
+                session.validated_at = time.time()
+                self.put(session)
+                return session
+            if valid is False:
+                # Drop it now so a failed login below cannot leave the dead token cached
+                self.invalidate(synapse_url, username, device)
+
+        session = self._login(synapse_url, username, password, device)
+        self.put(session)
+        return session
+
+
+# Browser sessions get their own Synapse device, since Element tests may sign out
+ELEMENT_DEVICE = 'element'
+
+ELEMENT_SESSION_SCRIPT = """
+(session) => {
+    // Inject once per tab, so a fallback to the login form is not overridden
+    if (window.sessionStorage.getItem('voice_stack_session_injected')) {
+        return;
+    }
+    window.sessionStorage.setItem('voice_stack_session_injected', 'true');
+    localStorage.setItem('mx_hs_url', session.synapse_url);
+    localStorage.setItem('mx_user_id', session.user_id);
+    localStorage.setItem('mx_device_id', session.device_id || '');
+    localStorage.setItem('mx_access_token', session.access_token);
+    localStorage.setItem('mx_has_access_token', 'true');
+    localStorage.setItem('mx_is_guest', 'false');
+}
+"""
+
+
+async def restore_element_session(page, element_url: str, synapse_url: str, username: str,
+                                  password: str, cache: Optional[SessionCache] = None,
+                                  timeout: int = 30000) -> bool:
+    """Log Element Web in from the session cache instead of through the login form
+
+    Returns False (after clearing the injected storage) if no session could be
+    obtained or Element did not reach the room list, so callers can fall back
+    to the UI login.
+    """
+    cache = cache or SessionCache()
+    try:
+        session = await asyncio.to_thread(cache.ensure_session, synapse_url, username, password, ELEMENT_DEVICE)
+    except requests.RequestException:
+        return False
+
+    await page.add_init_script(
+        f"({ELEMENT_SESSION_SCRIPT})({json.dumps(asdict(session))})"
+    )
+    await page.goto(element_url)
+
+    try:
+        await page.wait_for_selector('.mx_RoomList', timeout=timeout)
+        return True
+    except Exception:
+        await page.evaluate("() => localStorage.clear()")
+        # Most likely a token signed out within the TTL; log in afresh next time
+        await asyncio.to_thread(cache.invalidate, synapse_url, username, ELEMENT_DEVICE)
+        return False
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Suite Input Fingerprints
+Content hashes of everything a test suite depends on, so unchanged suites can reuse a previous pass
+"""
+
+import ast
+import hashlib
+import os
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Set
+
+from run_history import stack_images
+
+
+# Stack definition files every suite runs against, relative to the project root
+STACK_FILES = ('docker-compose.yml', 'Dockerfile.element')
+
+# Environment that changes what the suites talk to or how; values are only ever hashed
+RELEVANT_ENV = (
+    'SYNAPSE_URL', 'SYNAPSE_SERVER_NAME', 'ELEMENT_URL', 'TEST_USER_PASSWORD',
+    'REGISTRATION_SHARED_SECRET', 'SYNAPSE_ADMIN_TOKEN', 'SYNAPSE_ADMIN_PORT',
+    'WELL_KNOWN_PORT', 'COTURN_URL', 'COTURN_PORT', 'HEADLESS', 'TEST_PREFIX'
+)
+
+
+def local_modules(test_file: Path, search_dirs: List[Path]) -> Set[Path]:
+    """The test file plus every repository module it imports, transitively"""
+    found: Set[Path] = set()
+    pending = [test_file.resolve()]
+    while pending:
+        path = pending.pop()
+        if path in found:
+            continue
+        found.add(path)
+        try:
+            tree = ast.parse(path.read_text(errors='replace'), filename=str(path))
+        except (OSError, SyntaxError):
+            continue
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                top = name.split('.')[0]
+                for directory in search_dirs:
+                    candidate = directory / f"{top}.py"
+                    if candidate.exists():
+                        pending.append(candidate.resolve())
+                        break
+    return found
+
+
+def _file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+    except OSError:
+        return 'missing'
+    return digest.hexdigest()
+
+
+class SuiteFingerprinter:
+    """Computes suite fingerprints, caching the inputs shared by every suite in a run"""
+
+    def __init__(self, test_dir: Path, project_root: Path, images: Optional[Dict[str, str]] = None,
+                 config_file: Optional[Path] = None):
+        self.test_dir = test_dir.resolve()
+        self.project_root = project_root.resolve()
+        self.images = stack_images() if images is None else images
+        self.config_file = config_file
+        self._file_digests: Dict[Path, str] = {}
+
+    def _digest(self, path: Path) -> str:
+        if path not in self._file_digests:
+            self._file_digests[path] = _file_digest(path)
+        return self._file_digests[path]
+
+    def inputs(self, test_file: str, args: List[str], env: Optional[Mapping[str, str]] = None,
+               workers: int = 1) -> Dict[str, str]:
+        """Every fingerprint input as label -> content hash or value, for a suite run under env"""
+        env = os.environ if env is None else env
+        entries = {}
+        for path in sorted(local_modules(self.test_dir / test_file, [self.test_dir, self.project_root])):
+            entries[f"file:{path.relative_to(self.project_root)}"] = self._digest(path)
+        for name in STACK_FILES:
+            entries[f"file:{name}"] = self._digest(self.project_root / name)
+        for name in RELEVANT_ENV:
+            entries[f"env:{name}"] = hashlib.sha256(env.get(name, '').encode()).hexdigest()
+        for container, image in sorted(self.images.items()):
+            entries[f"image:{container}"] = image
+        if self.config_file:
+            entries["config"] = self._digest(Path(self.config_file).resolve())
+        entries["args"] = " ".join(args)
+        entries["workers"] = str(workers)
+        return entries
+
+    def fingerprint(self, test_file: str, args: List[str], env: Optional[Mapping[str, str]] = None,
+                    workers: int = 1) -> str:
+        """Single SHA-256 over the suite's inputs"""
+        digest = hashlib.sha256()
+        for label, value in sorted(self.inputs(test_file, args, env, workers).items()):
+            digest.update(f"{label}={value}\n".encode())
+        return digest.hexdigest()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Test Suite Scheduler
+Runs independent pytest suites concurrently under a worker budget, longest expected first
+"""
+
+import json
+import statistics
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Callable
+
+
+@dataclass(frozen=True)
+class ResourceClass:
+    """How expensive one pytest worker of a suite is, and how many such suites may overlap"""
+    name: str
+    cost: int  # budget slots per pytest worker
+    max_concurrent: Optional[int] = None  # suites of this class running at once
+
+
+# Playwright suites drive a real Chromium per worker (plus fake media devices for calls),
+# the rest are plain HTTP clients that mostly wait on the network
+RESOURCE_CLASSES = {
+    'browser': ResourceClass('browser', cost=2, max_concurrent=2),
+    'http': ResourceClass('http', cost=1)
+}
+
+
+def classify_suite(path: Path) -> str:
+    """Resource class of a test file: browser if it drives Playwright, otherwise http"""
+    try:
+        source = path.read_text(errors='replace')
+    except OSError:
+        return 'http'
+    return 'browser' if 'playwright' in source else 'http'
+
+
+def historical_durations(reports_dir: Path, last: int = 10) -> Dict[str, float]:
+    """Median duration per suite over the last JSON run reports in reports_dir"""
+    samples: Dict[str, List[float]] = {}
+    for report_file in sorted(Path(reports_dir).glob('test_report_*.json'))[-last:]:
+        try:
+            with open(report_file, 'r') as f:
+                report = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for suite in report.get('suites', []):
+            if suite.get('cached_from') is not None:
+                continue
+            samples.setdefault(suite['name'], []).append(suite.get('duration', 0.0))
+    return {name: statistics.median(durations) for name, durations in samples.items()}
+
+
+@dataclass
+class SuiteJob:
+    """One pytest suite waiting to run"""
+    test_file: str
+    resource_class: str
+    workers: int = 1
+    expected_duration: Optional[float] = None
+    fingerprint: Optional[str] = None
+    markers: List[str] = field(default_factory=list)
+    extra_args: List[str] = field(default_factory=list)
+
+    @property
+    def name(self) -> str:
+        return Path(self.test_file).stem
+
+    def cost(self, budget: int) -> int:
+        """Budget slots taken while running, capped so an oversized suite can still run alone"""
+        return min(budget, RESOURCE_CLASSES[self.resource_class].cost * max(1, self.workers))
+
+
+class SuiteScheduler:
+    """Greedy list scheduler over a fixed slot budget
+
+    Pending suites are ordered longest expected duration first (unknown
+    durations go first too, since they may be the long pole), and a suite
+    starts as soon as enough slots are free and its resource class is under
+    its concurrency cap. With a budget of 1 every suite runs on its own,
+    which is the old sequential behaviour.
+    """
+
+    def __init__(self, run_suite: Callable[[SuiteJob], Any], budget: int,
+                 on_complete: Optional[Callable[[SuiteJob, Any], None]] = None):
+        self.run_suite = run_suite
+        self.budget = max(1, budget)
+        self.on_complete = on_complete
+
+    @staticmethod
+    def order(jobs: List[SuiteJob]) -> List[SuiteJob]:
+        """Longest expected first; suites without history before everything else"""
+        return sorted(jobs, key=lambda j: (j.expected_duration is not None, -(j.expected_duration or 0.0)))
+
+    def _fits(self, job: SuiteJob, free: int, running: Dict[Future, SuiteJob]) -> bool:
+        limit = RESOURCE_CLASSES[job.resource_class].max_concurrent
+        same_class = sum(1 for j in running.values() if j.resource_class == job.resource_class)
+        return job.cost(self.budget) <= free and (limit is None or same_class < limit)
+
+    def run(self, jobs: List[SuiteJob]) -> Dict[str, Any]:
+        """Run every job and return results keyed by suite name"""
+        pending = self.order(jobs)
+        running: Dict[Future, SuiteJob] = {}
+        results: Dict[str, Any] = {}
+        free = self.budget
+
+        with ThreadPoolExecutor(max_workers=max(1, len(jobs))) as executor:
+            while pending or running:
+                for job in list(pending):
+                    if self._fits(job, free, running):
+                        pending.remove(job)
+                        free -= job.cost(self.budget)
+                        running[executor.submit(self.run_suite, job)] = job
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = running.pop(future)
+                    free += job.cost(self.budget)
+                    results[job.name] = future.result()
+                    if self.on_complete:
+                        self.on_complete(job, results[job.name])
+
+        return results
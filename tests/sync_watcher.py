@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Sync Watchers
+/sync long-poll loops that resolve "event seen" futures keyed by event_id
+"""
+
+import json
+import time
+import asyncio
+import threading
+import concurrent.futures
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Union
+from dataclasses import dataclass
+
+import requests
+
+
+@dataclass
+class EventSighting:
+    """An event observed through /sync"""
+    event_id: str
+    room_id: str
+    event: Dict[str, Any]
+    received_at: float  # time.time() when the sync response was processed
+    latency: Optional[float] = None  # seconds from send to receipt, when the send time is known
+
+
+class SyncState:
+    """next_batch tracking and event bookkeeping shared by both watchers"""
+
+    def __init__(self, max_remembered: int = 10000):
+        self.next_batch: Optional[str] = None
+        self.max_remembered = max_remembered
+        self.seen: 'OrderedDict[str, EventSighting]' = OrderedDict()
+        self.latencies: List[float] = []
+        self.sync_count = 0
+
+    def sync_params(self, timeout_ms: int, sync_filter: Optional[Union[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """Query parameters for the next /sync request"""
+        params: Dict[str, Any] = {"timeout": timeout_ms}
+        if self.next_batch:
+            params["since"] = self.next_batch
+        if sync_filter is not None:
+            params["filter"] = sync_filter if isinstance(sync_filter, str) else json.dumps(sync_filter)
+        return params
+
+    def ingest(self, response: Dict[str, Any]) -> List[EventSighting]:
+        """Record timeline events from a sync response and advance next_batch"""
+        received_at = time.time()
+        sightings = []
+
+        for room_id, room in response.get("rooms", {}).get("join", {}).items():
+            for event in room.get("timeline", {}).get("events", []):
+                event_id = event.get("event_id")
+                if not event_id or event_id in self.seen:
+                    continue
+
+                sighting = EventSighting(event_id=event_id, room_id=room_id, event=event,
+                                         received_at=received_at)
+                self.seen[event_id] = sighting
+                sightings.append(sighting)
+
+        while len(self.seen) > self.max_remembered:
+            self.seen.popitem(last=False)
+
+        self.next_batch = response.get("next_batch", self.next_batch)
+        self.sync_count += 1
+        return sightings
+
+    def with_latency(self, sighting: EventSighting, sent_at: Optional[float]) -> EventSighting:
+        """Attach send->receive latency to a sighting and record it"""
+        if sent_at is not None and sighting.latency is None:
+            sighting.latency = max(0.0, sighting.received_at - sent_at)
+            self.latencies.append(sighting.latency)
+        return sighting
+
+
+class SyncWatcher:
+    """Background-thread /sync watcher for the synchronous MatrixClient
+
+    The watcher uses its own requests.Session carrying the client's access
+    token, so long-polls never contend with the test thread's session.
+    """
+
+    def __init__(self, client, timeout_ms: int = 5000,
+                 sync_filter: Optional[Union[str, Dict[str, Any]]] = None):
+        self.client = client
+        self.timeout_ms = timeout_ms
+        self.sync_filter = sync_filter
+        self.state = SyncState()
+        self.last_error: Optional[Exception] = None
+
+        self.session = requests.Session()
+        self.session.headers.update({"Authorization": f"Bearer {client.access_token}"})
+
+        self._lock = threading.Lock()
+        self._waiters: Dict[str, List[concurrent.futures.Future]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> 'SyncWatcher':
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def sync_once(self, timeout_ms: Optional[int] = None) -> List[EventSighting]:
+        """Run a single /sync request and resolve any waiters"""
+        timeout_ms = self.timeout_ms if timeout_ms is None else timeout_ms
+        resp = self.session.get(
+            self.client._api_url("/client/r0/sync"),
+            params=self.state.sync_params(timeout_ms, self.sync_filter),
+            timeout=timeout_ms / 1000 + 30
+        )
+        resp.raise_for_status()
+
+        with self._lock:
+            sightings = self.state.ingest(resp.json())
+            for sighting in sightings:
+                for future in self._waiters.pop(sighting.event_id, []):
+                    if not future.done():
+                        future.set_result(sighting)
+        return sightings
+
+    def start(self) -> 'SyncWatcher':
+        """Catch up with an immediate sync, then long-poll in the background"""
+        self.sync_once(timeout_ms=0)
+        self._thread = threading.Thread(target=self._run, name="sync-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop after the current long-poll returns"""
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sync_once()
+                self.last_error = None
+            except requests.RequestException as e:
+                self.last_error = e
+                self._stop.wait(1)
+
+    def event_future(self, event_id: str) -> concurrent.futures.Future:
+        """Future resolved with the EventSighting once event_id arrives"""
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        with self._lock:
+            sighting = self.state.seen.get(event_id)
+            if sighting is not None:
+                future.set_result(sighting)
+            else:
+                self._waiters.setdefault(event_id, []).append(future)
+        return future
+
+    def wait_for_event(self, event_id: str, timeout: float = 10,
+                       sent_at: Optional[float] = None) -> EventSighting:
+        """Block until event_id is seen; pass sent_at (time.time()) to record delivery latency"""
+        try:
+            sighting = self.event_future(event_id).result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            raise TimeoutError(f"Event {event_id} not seen via /sync within {timeout}s "
+                               f"(last error: {self.last_error})")
+
+        with self._lock:
+            return self.state.with_latency(sighting, sent_at)
+
+
+class AsyncSyncWatcher:
+    """asyncio /sync watcher for AsyncMatrixClient"""
+
+    def __init__(self, client, timeout_ms: int = 30000,
+                 sync_filter: Optional[Union[str, Dict[str, Any]]] = None):
+        self.client = client
+        self.timeout_ms = timeout_ms
+        self.sync_filter = sync_filter
+        self.state = SyncState()
+        self.last_error: Optional[Exception] = None
+
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> 'AsyncSyncWatcher':
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+    async def sync_once(self, timeout_ms: Optional[int] = None) -> List[EventSighting]:
+        """Run a single /sync request and resolve any waiters"""
+        timeout_ms = self.timeout_ms if timeout_ms is None else timeout_ms
+        resp = await self.client.request(
+            "GET",
+            self.client._api_url("/client/r0/sync"),
+            params=self.state.sync_params(timeout_ms, self.sync_filter),
+            timeout=timeout_ms / 1000 + 30
+        )
+        resp.raise_for_status()
+
+        sightings = self.state.ingest(resp.json())
+        for sighting in sightings:
+            for future in self._waiters.pop(sighting.event_id, []):
+                if not future.done():
+                    future.set_result(sighting)
+        return sightings
+
+    async def start(self) -> 'AsyncSyncWatcher':
+        """Catch up with an immediate sync, then long-poll in a background task"""
+        await self.sync_once(timeout_ms=0)
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def stop(self):
+        """Cancel the long-poll loop"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sync_once()
+                self.last_error = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = e
+                await asyncio.sleep(1)
+
+    def event_future(self, event_id: str) -> asyncio.Future:
+        """Future resolved with the EventSighting once event_id arrives"""
+        future = asyncio.get_running_loop().create_future()
+        sighting = self.state.seen.get(event_id)
+        if sighting is not None:
+            future.set_result(sighting)
+        else:
+            self._waiters.setdefault(event_id, []).append(future)
+        return future
+
+    async def wait_for_event(self, event_id: str, timeout: float = 10,
+                             sent_at: Optional[float] = None) -> EventSighting:
+        """Wait until event_id is seen; pass sent_at (time.time()) to record delivery latency"""
+        try:
+            sighting = await asyncio.wait_for(self.event_future(event_id), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Event {event_id} not seen via /sync within {timeout}s "
+                               f"(last error: {self.last_error})")
+
+        return self.state.with_latency(sighting, sent_at)
@@ -10,7 +10,6 @@ import os
 import subprocess
 import tempfile
 import shutil
-import time
 import yaml
 import json
 import requests
@@ -18,6 +17,8 @@ from typing import Dict, Any, List, Optional
 from dataclasses import dataclass
 from pathlib import Path
 
+from service_readiness import StartupTimeline, wait_for_services
+
 
 @dataclass 
 class TestConfig:
@@ -35,6 +36,7 @@ class DeploymentTester:
         self.config = config
         self.test_dir: Optional[Path] = None
         self.containers_started: List[str] = []
+        self.startup_timeline: Optional[StartupTimeline] = None
     
     def setup_clean_environment(self) -> Path:
         """Create a clean test environment"""
@@ -356,7 +358,11 @@ LOG_LEVEL=INFO
             }
     
     def wait_for_services_ready(self, timeout: int = 180) -> Dict[str, Any]:
-        """Wait for all services to become ready"""
+        """Wait for all services to become ready
+        
+        Services are polled concurrently with backoff under one overall
+        deadline; the full timeline is kept on self.startup_timeline.
+        """
         services = {
             'synapse': 'http://localhost:8008/health',
             'element': 'http://localhost:8080',
@@ -364,36 +370,22 @@ LOG_LEVEL=INFO
             'well_known': 'http://localhost:8090/.well-known/matrix/server'
         }
         
-        results = {}
-        start_time = time.time()
+        print(f"Waiting for {', '.join(services)} to be ready...")
+        self.startup_timeline = wait_for_services(services, deadline=timeout)
         
-        for service_name, health_url in services.items():
-            print(f"Waiting for {service_name} to be ready...")
-            
-            service_ready = False
-            service_start = time.time()
-            
-            while time.time() - start_time < timeout and time.time() - service_start < 60:
-                try:
-                    response = requests.get(health_url, timeout=10)
-                    if response.status_code in [200, 404]:  # 404 is ok for some services
-                        service_ready = True
-                        break
-                except requests.RequestException:
-                    pass
-                
-                time.sleep(5)
-            
-            results[service_name] = {
-                'ready': service_ready,
-                'response_time': time.time() - service_start,
-                'url': health_url
+        results = {}
+        for state in self.startup_timeline.ordered():
+            results[state.name] = {
+                'ready': state.ready,
+                'response_time': state.ready_at if state.ready else self.startup_timeline.elapsed,
+                'url': state.url,
+                'attempts': state.attempts
             }
             
-            if service_ready:
-                print(f"✓ {service_name} ready in {results[service_name]['response_time']:.1f}s")
+            if state.ready:
+                print(f"✓ {state.name} ready in {state.ready_at:.1f}s")
             else:
-                print(f"⚠ {service_name} not ready after timeout")
+                print(f"⚠ {state.name} not ready after timeout")
         
         return results
     
@@ -17,6 +17,8 @@ try:
 except ImportError:
     pytest.skip("Playwright not installed", allow_module_level=True)
 
+from session_cache import restore_element_session
+
 
 @dataclass
 class TestConfig:
@@ -26,6 +28,7 @@ class TestConfig:
     server_name: str = os.getenv('SYNAPSE_SERVER_NAME', 'matrix.byte-box.org')
     coturn_url: str = os.getenv('COTURN_URL', 'turn:localhost:3478')
     test_user_password: str = os.getenv('TEST_USER_PASSWORD', 'TestPassword123!')
+    reuse_sessions: bool = os.getenv('REUSE_SESSIONS', 'true').lower() == 'true'
     headless: bool = os.getenv('HEADLESS', 'false').lower() == 'true'  # Default to visible for call tests
     slow_mo: int = int(os.getenv('SLOW_MO', '500'))  # Slower for call tests
 
@@ -43,6 +46,11 @@ class ElementCallTester:
     
     async def login_user(self, username: str, password: str):
         """Login user to Element Web"""
+        # Reuse a cached access token instead of the login form when possible
+        if self.config.reuse_sessions and await restore_element_session(
+                self.page, self.config.element_url, self.config.synapse_url, username, password):
+            return
+        
         await self.page.goto(self.config.element_url)
         
         # Wait for login form
@@ -18,6 +18,8 @@ try:
 except ImportError:
     pytest.skip("Playwright not installed", allow_module_level=True)
 
+from session_cache import restore_element_session
+
 
 @dataclass
 class TestConfig:
@@ -26,6 +28,7 @@ class TestConfig:
     synapse_url: str = os.getenv('SYNAPSE_URL', 'http://localhost:8008')
     server_name: str = os.getenv('SYNAPSE_SERVER_NAME', 'matrix.byte-box.org')
     test_user_password: str = os.getenv('TEST_USER_PASSWORD', 'TestPassword123!')
+    reuse_sessions: bool = os.getenv('REUSE_SESSIONS', 'true').lower() == 'true'
     headless: bool = os.getenv('HEADLESS', 'true').lower() == 'true'
     slow_mo: int = int(os.getenv('SLOW_MO', '100'))  # Slow down for debugging
 
@@ -41,8 +44,13 @@ class ElementWebTester:
         """Wait for element with timeout"""
         return await self.page.wait_for_selector(selector, timeout=timeout)
     
-    async def login_user(self, username: str, password: str):
+    async def login_user(self, username: str, password: str, use_session_cache: bool = True):
         """Login user to Element Web"""
+        # Reuse a cached access token instead of the login form when possible
+        if use_session_cache and self.config.reuse_sessions and await restore_element_session(
+                self.page, self.config.element_url, self.config.synapse_url, username, password):
+            return
+        
         # Navigate to Element
         await self.page.goto(self.config.element_url)
         
@@ -237,8 +245,8 @@ class TestElementWeb:
         """Test user login functionality"""
         tester = ElementWebTester(page, config)
         
-        # Login with test user
-        await tester.login_user("test_alice", config.test_user_password)
+        # Login with test user through the form, which is what this test covers
+        await tester.login_user("test_alice", config.test_user_password, use_session_cache=False)
         
         # Verify successful login
         await tester.wait_for_element('.mx_RoomList')
@@ -370,7 +378,8 @@ class TestElementWeb:
         """Test user logout"""
         tester = ElementWebTester(page, config)
         
-        await tester.login_user("test_alice", config.test_user_password)
+        # Sign out a session of its own, not the cached one other tests reuse
+        await tester.login_user("test_alice", config.test_user_password, use_session_cache=False)
         
         # Open user menu
         await page.click('[aria-label="User menu"]')
@@ -0,0 +1,493 @@
+#!/usr/bin/env python3
+"""
+Offline Client Tests
+Exercises MatrixClient and AsyncMatrixClient against the in-process Synapse stand-in
+"""
+
+import asyncio
+import hashlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+import pytest
+import requests
+
+from async_matrix_client import AsyncMatrixClient, create_http_pool
+from benchmark_delivery import DeliveryBenchmark
+from benchmark_media import MediaBenchmark
+from bulk_provisioning import BulkProvisioner, generate_users, provision_clients
+from local_synapse import LocalSynapseThread, StandInConfig
+import matrix_common
+from matrix_common import MediaDigest, TransactionIdAllocator
+from rate_limit import RateLimitConfig, RateLimitController, endpoint_key
+from service_readiness import probe_services
+from session_cache import SessionCache, ELEMENT_DEVICE
+from test_synapse_api import TestConfig, MatrixClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from synapse_admin_export import AdminAPIError, SynapseAdminClient, export_inventory  # noqa: E402
+from synapse_retention import RetentionPolicy, plan_purge, execute_plan  # noqa: E402
+
+
+class TestLocalSynapse:
+    """Client behaviour that does not need a running Docker stack"""
+
+    @pytest.fixture(scope="class")
+    def standin(self):
+        with LocalSynapseThread(StandInConfig(server_name='localhost')) as standin:
+            yield standin
+
+    @pytest.fixture(scope="class")
+    def config(self, standin):
+        return TestConfig(synapse_url=standin.url, server_name='localhost', registration_secret='test_secret')
+
+    @pytest.fixture(scope="class")
+    def user_clients(self, config):
+        clients = []
+        for username in ("alice", "bob"):
+            client = MatrixClient(config)
+            client.register_user(username, config.test_user_password)
+            client.login(username, config.test_user_password)
+            clients.append(client)
+        return clients
+
+    def test_registration_is_shared_secret_only(self, config):
+        """Test open registration is rejected and duplicate users report M_USER_IN_USE"""
+        resp = requests.post(f"{config.synapse_url}/_matrix/client/r0/register",
+                             json={"username": "mallory", "password": "x"})
+        assert resp.status_code == 403
+
+        client = MatrixClient(config)
+        client.register_user("duplicate", "pw")
+        with pytest.raises(requests.HTTPError) as exc_info:
+            client.register_user("duplicate", "pw")
+        assert exc_info.value.response.json()["errcode"] == "M_USER_IN_USE"
+
+    def test_login_and_whoami(self, config, user_clients):
+        """Test tokens from login resolve to the right user"""
+        alice = user_clients[0]
+        assert alice.whoami()["user_id"] == "@alice:localhost"
+
+        with pytest.raises(requests.HTTPError):
+            MatrixClient(config).login("alice", "wrong password")
+
+    def test_session_cache_drops_logged_out_tokens(self, standin, config, user_clients, tmp_path):
+        """Test cached tokens are rechecked on reuse and browser sessions use their own device"""
+        cache = SessionCache(str(tmp_path / "sessions.json"), ttl=0)
+        api = cache.ensure_session(config.synapse_url, "alice", config.test_user_password)
+        browser = cache.ensure_session(config.synapse_url, "alice", config.test_user_password, ELEMENT_DEVICE)
+        assert browser.access_token != api.access_token
+        assert browser.device_id != api.device_id
+        assert cache.ensure_session(config.synapse_url, "alice", config.test_user_password).access_token == api.access_token
+
+        # Signing the browser session out leaves the API token alone and gets replaced on next use
+        del standin.server.tokens[browser.access_token]
+        assert cache.ensure_session(config.synapse_url, "alice", config.test_user_password).access_token == api.access_token
+        renewed = cache.ensure_session(config.synapse_url, "alice", config.test_user_password, ELEMENT_DEVICE)
+        assert renewed.access_token != browser.access_token
+        assert cache.get(config.synapse_url, "alice", ELEMENT_DEVICE).access_token == renewed.access_token
+
+    def test_session_cache_trusts_fresh_entries_and_drops_rejected_ones(self, standin, config, user_clients, tmp_path):
+        """Test whoami is skipped within the TTL and a 401 drops the entry even when login then fails"""
+        cache = SessionCache(str(tmp_path / "sessions.json"), ttl=3600)
+        session = cache.ensure_session(config.synapse_url, "alice", config.test_user_password)
+        whoami_calls = []
+        real_get = cache.http.get
+        cache.http.get = lambda *args, **kwargs: whoami_calls.append(args) or real_get(*args, **kwargs)
+
+        del standin.server.tokens[session.access_token]
+        assert cache.ensure_session(config.synapse_url, "alice", config.test_user_password) == session
+        assert whoami_calls == []
+
+        cache.ttl = 0
+        with pytest.raises(requests.HTTPError):
+            cache.ensure_session(config.synapse_url, "alice", "wrong password")
+        assert len(whoami_calls) == 1
+        assert cache.get(config.synapse_url, "alice") is None
+
+    def test_message_round_trip_via_sync(self, user_clients):
+        """Test sends reach another member's /sync and /messages"""
+        alice, bob = user_clients
+        room_id = alice.create_room("Stand-in Room")["room_id"]
+        alice.session.post(alice._api_url(f"/client/r0/rooms/{room_id}/invite"), json={"user_id": bob.user_id})
+        bob.session.post(bob._api_url(f"/client/r0/rooms/{room_id}/join")).raise_for_status()
+
+        with bob.sync_watcher(timeout_ms=2000) as watcher:
+            sent_at = time.time()
+            event_id = alice.send_message(room_id, "hello bob")["event_id"]
+            sighting = watcher.wait_for_event(event_id, timeout=5, sent_at=sent_at)
+
+        assert sighting.event["content"]["body"] == "hello bob"
+        bodies = [e["content"].get("body") for e in bob.get_messages(room_id, limit=5)["chunk"]]
+        assert bodies[0] == "hello bob"
+
+    def test_rapid_sends_and_txn_idempotency(self, user_clients):
+        """Test distinct transaction IDs make distinct events and a retried one does not"""
+        alice = user_clients[0]
+        room_id = alice.create_room("Rapid Room")["room_id"]
+
+        event_ids = [alice.send_message(room_id, f"msg {i}")["event_id"] for i in range(20)]
+        assert len(set(event_ids)) == 20
+
+        url = alice._api_url(f"/client/r0/rooms/{room_id}/send/m.room.message/retry-1")
+        first = alice.session.put(url, json={"msgtype": "m.text", "body": "once"}).json()
+        second = alice.session.put(url, json={"msgtype": "m.text", "body": "once"}).json()
+        assert first["event_id"] == second["event_id"]
+
+    def test_txn_ids_unique_within_one_millisecond(self, monkeypatch):
+        """Test IDs stay unique across threads and allocators while the clock stands still"""
+        monkeypatch.setattr(matrix_common.time, "time", lambda: 1700000000.0)
+        allocators = [TransactionIdAllocator(), TransactionIdAllocator()]
+        ids = []
+        lock = threading.Lock()
+
+        def allocate(allocator):
+            batch = [allocator.next_id() for _ in range(500)]
+            with lock:
+                ids.extend(batch)
+
+        threads = [threading.Thread(target=allocate, args=(allocators[i % 2],)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(ids) == 4000
+        assert len(set(ids)) == len(ids)
+
+    def test_streamed_media_round_trip(self, user_clients):
+        """Test chunked uploads and streamed downloads keep the same digest"""
+        alice = user_clients[0]
+        payload = os.urandom(3 * 1024 * 1024 + 17)
+
+        upload, sent = alice.upload_media_stream(io.BytesIO(payload), "application/octet-stream", "blob.bin")
+        received = alice.download_media_to(upload["content_uri"])
+
+        assert sent == received
+        assert received == MediaDigest(sha256=hashlib.sha256(payload).hexdigest(), size=len(payload))
+
+    def test_presence_and_state(self, user_clients):
+        """Test presence updates and room state round trips"""
+        alice, bob = user_clients
+        alice.session.put(alice._api_url(f"/client/r0/presence/{alice.user_id}/status"),
+                          json={"presence": "unavailable", "status_msg": "lunch"}).raise_for_status()
+        presence = bob.session.get(bob._api_url(f"/client/r0/presence/{alice.user_id}/status")).json()
+        assert presence["presence"] == "unavailable"
+        assert presence["status_msg"] == "lunch"
+
+        room_id = alice.create_room("State Room", "before")["room_id"]
+        alice.session.put(alice._api_url(f"/client/r0/rooms/{room_id}/state/m.room.topic"),
+                          json={"topic": "after"}).raise_for_status()
+        state = alice.session.get(alice._api_url(f"/client/r0/rooms/{room_id}/state")).json()
+        topic = next(e for e in state if e["type"] == "m.room.topic")
+        assert topic["content"]["topic"] == "after"
+
+    def test_history_iterator_pages_both_directions(self, user_clients):
+        """Test the history iterator follows pagination tokens to the end of the room"""
+        alice, _ = user_clients
+        room_id = alice.create_room("History Room")["room_id"]
+        for i in range(120):
+            alice.send_message(room_id, f"history {i}")
+
+        history = alice.history(room_id, page_size=25, lazy_load_members=True)
+        backwards = [e["content"]["body"] for e in history if e["type"] == "m.room.message"]
+        assert backwards == [f"history {i}" for i in reversed(range(120))]
+        assert history.stats.pages >= 5
+        assert history.stats.events_per_s > 0
+        assert alice.user_id in history.members
+
+        forwards = [e["content"]["body"] for e in alice.history(room_id, direction="f", page_size=50)
+                    if e["type"] == "m.room.message"]
+        assert forwards == [f"history {i}" for i in range(120)]
+
+        first_page = alice.history(room_id, page_size=25, max_events=30, prefetch=False)
+        assert len(list(first_page)) == 30
+        resumed = alice.history(room_id, page_size=25, from_token=first_page.next_token)
+        assert len([e for e in resumed if e["type"] == "m.room.message"]) == 120 - 50
+
+    @pytest.mark.asyncio
+    async def test_async_history_iterator(self, config):
+        """Test async iteration and prefetch over a pipelined-seeded room"""
+        async with create_http_pool() as http:
+            sender, = await provision_clients(config, http, ["history_sender"], "pw")
+            room = await sender.create_room("Async History Room")
+            await sender.send_messages(room["room_id"], [f"async {i}" for i in range(60)], in_flight=1)
+
+            history = sender.history(room["room_id"], page_size=16)
+            bodies = [e["content"]["body"] async for e in history if e["type"] == "m.room.message"]
+
+        assert bodies == [f"async {i}" for i in reversed(range(60))]
+        assert history.stats.to_dict()["pages"] == history.stats.pages
+
+    @pytest.mark.asyncio
+    async def test_media_benchmark_counts_failed_downloads(self, config):
+        """Test a missing media ID is recorded as a download failure instead of ending the sweep"""
+        async with create_http_pool() as http:
+            client, = await provision_clients(config, http, ["media_bench"], "pw")
+            benchmark = MediaBenchmark(client)
+            latencies, failures = [], Counter()
+            digest = await benchmark._timed_download({'content_uri': "mxc://localhost/nope"},
+                                                     asyncio.Semaphore(1), latencies, failures)
+
+        assert digest is None
+        assert latencies == []
+        assert failures == {'404 M_NOT_FOUND': 1}
+
+    @pytest.mark.asyncio
+    async def test_bulk_provisioning_is_idempotent(self, config):
+        """Test a repeated provisioning run reports every user as existing"""
+        users = generate_users("standin_bulk_", 25, "pw")
+
+        first = await BulkProvisioner(config, concurrency=8).provision(users)
+        second = await BulkProvisioner(config, concurrency=8).provision(users)
+
+        assert (first.created, first.failed) == (25, 0)
+        assert (second.existing, second.failed) == (25, 0)
+
+    @pytest.mark.asyncio
+    async def test_async_pipelined_sends_all_delivered(self, config):
+        """Test every pipelined send is acked in submission order and reaches the other member"""
+        async with create_http_pool() as http:
+            sender, recipient = await provision_clients(config, http, ["pipe_sender", "pipe_recipient"], "pw")
+            room = await sender.create_room("Pipeline Room")
+            await sender.invite_user(room["room_id"], recipient.user_id)
+            await recipient.join_room(room["room_id"])
+
+            messages = [f"pipelined {i}" for i in range(50)]
+            sync_filter = {"room": {"timeline": {"limit": 100}}}
+            async with recipient.sync_watcher(timeout_ms=2000, sync_filter=sync_filter) as watcher:
+                acks = await sender.send_messages(room["room_id"], messages, in_flight=16, ordered=False)
+                await asyncio.gather(*(watcher.wait_for_event(a.event_id, timeout=5) for a in acks))
+
+            history = await recipient.get_messages(room["room_id"], limit=50)
+
+        assert all(a.error is None for a in acks)
+        assert [a.sequence for a in acks] == list(range(len(messages)))
+        assert sorted(e["content"]["body"] for e in history["chunk"]) == sorted(messages)
+
+    @pytest.mark.asyncio
+    async def test_search_matches_all_terms_and_room_filter(self, config):
+        """Test /search over a seeded corpus, with and without a room filter"""
+        async with create_http_pool() as http:
+            searcher, = await provision_clients(config, http, ["search_user"], "pw")
+            kitchen = (await searcher.create_room("Kitchen"))["room_id"]
+            garden = (await searcher.create_room("Garden"))["room_id"]
+            await searcher.send_message_batches({
+                kitchen: ["dinner at six", "pizza for dinner tonight", "milk please"],
+                garden: ["dinner outside tonight", "mow the lawn"]
+            })
+
+            everywhere = await searcher.search("dinner")
+            both_terms = await searcher.search("dinner tonight")
+            kitchen_only = await searcher.search("dinner", rooms=[kitchen])
+
+        assert everywhere["count"] == 3
+        assert {r["result"]["content"]["body"] for r in both_terms["results"]} == {
+            "pizza for dinner tonight", "dinner outside tonight"
+        }
+        assert {r["result"]["room_id"] for r in kitchen_only["results"]} == {kitchen}
+
+    def test_admin_export_walks_every_page(self, standin, config, user_clients):
+        """Test the admin inventory export pages through all users, rooms and media"""
+        admin = MatrixClient(config)
+        admin.register_user("export_admin", "pw", admin=True)
+        admin.login("export_admin", "pw")
+        for i in range(3):
+            admin.create_room(f"Export Room {i}")
+            admin.upload_media_stream(io.BytesIO(b"x" * (i + 1)), "image/png", f"{i}.png")
+
+        stream = io.StringIO()
+        client = SynapseAdminClient(config.synapse_url, admin.access_token)
+        counts = export_inventory(client, ["users", "rooms", "media"], stream, details=True, page_size=2)
+        records = [json.loads(line) for line in stream.getvalue().splitlines()]
+
+        server = standin.server
+        assert counts == {"users": len(server.users), "rooms": len(server.rooms), "media": len(server.media)}
+        assert {r["name"] for r in records if r["kind"] == "user"} == set(server.users)
+        own_media = [r for r in records if r["kind"] == "media" and r["user_id"] == admin.user_id]
+        assert sorted(r["media_length"] for r in own_media) == [1, 2, 3]
+
+        with pytest.raises(AdminAPIError):
+            SynapseAdminClient(config.synapse_url, user_clients[0].access_token).get("/_synapse/admin/v2/users")
+
+    def test_retention_purges_history_and_old_media(self, standin, config):
+        """Test a retention plan purges room history and deletes media older than the cutoff"""
+        admin = MatrixClient(config)
+        admin.register_user("retention_admin", "pw", admin=True)
+        admin.login("retention_admin", "pw")
+        room_id = admin.create_room("Retention Room")["room_id"]
+        keep_id = admin.create_room("Kept Room")["room_id"]
+        for i in range(5):
+            admin.send_message(room_id, f"old {i}")
+            admin.send_message(keep_id, f"kept {i}")
+        upload, _ = admin.upload_media_stream(io.BytesIO(b"old photo"), "image/jpeg", "old.jpg")
+        media_id = upload["content_uri"].rsplit("/", 1)[1]
+
+        client = SynapseAdminClient(config.synapse_url, admin.access_token)
+        policy = RetentionPolicy(history_days=0, local_media_days=0, remote_media_days=0, keep_rooms={keep_id})
+        plan = plan_purge(client, policy, now_ms=int(time.time() * 1000) + 1000)
+        assert room_id in {r["room_id"] for r in plan.rooms}
+        assert keep_id not in {r["room_id"] for r in plan.rooms}
+        assert media_id in {m["media_id"] for m in plan.local_media}
+
+        results = execute_plan(client, plan, policy)
+        assert all(r.success for r in results)
+
+        def bodies(rid):
+            return [e["content"]["body"] for e in admin.history(rid) if e["type"] == "m.room.message"]
+
+        assert bodies(room_id) == ["old 4"]  # the latest event always survives
+        assert len(bodies(keep_id)) == 5
+        assert media_id not in standin.server.media
+
+    def test_rate_limited_sends_are_retried(self, standin, user_clients):
+        """Test 429s are retried after retry_after_ms and counted"""
+        alice = user_clients[0]
+        room_id = alice.create_room("Throttled Room")["room_id"]
+
+        standin.server.config.message_rate, standin.server.config.message_burst = 50, 3
+        try:
+            event_ids = [alice.send_message(room_id, f"throttled {i}")["event_id"] for i in range(10)]
+        finally:
+            standin.server.config.message_rate = 0.0
+
+        summary = alice.rate_limiter.summary()
+        endpoint = endpoint_key("PUT", alice._api_url(f"/client/r0/rooms/{room_id}/send/m.room.message/x"))
+        assert len(set(event_ids)) == 10
+        assert summary["throttled"] > 0
+        assert summary["retries"] == summary["throttled"]
+        assert summary["gave_up"] == 0
+        assert endpoint in summary["throttled_endpoints"]
+
+    def test_rate_limit_does_not_grow_on_errors(self):
+        """Test transport errors and 5xx shrink the endpoint limit while successes grow it"""
+        class _Response:
+            def __init__(self, status_code):
+                self.status_code, self.content, self.headers = status_code, b"{}", {}
+
+        def connection_reset():
+            raise requests.ConnectionError("connection reset")
+
+        limiter = RateLimitController(RateLimitConfig(initial_concurrency=8, min_concurrency=1))
+        endpoint = "PUT /_matrix/client/r0/rooms/{roomId}/send/m.room.message/{key}"
+
+        limiter.call(endpoint, lambda: _Response(200))
+        grown = limiter.endpoint_stats()[endpoint].limit
+        assert grown > 8
+
+        for _ in range(3):
+            with pytest.raises(requests.ConnectionError):
+                limiter.call(endpoint, connection_reset)
+            assert limiter.endpoint_stats()[endpoint].limit < grown
+            grown = limiter.endpoint_stats()[endpoint].limit
+
+        assert limiter.call(endpoint, lambda: _Response(503)).status_code == 503
+        stats = limiter.endpoint_stats()[endpoint]
+        assert stats.limit < grown
+        assert stats.errors == 4
+        assert stats.throttled == 0
+
+    @pytest.mark.asyncio
+    async def test_async_rate_limit_shrinks_concurrency(self, standin, config):
+        """Test pipelined sends back off to the server's rate instead of failing"""
+        async with create_http_pool() as http:
+            sender, = await provision_clients(config, http, ["throttle_sender"], "pw")
+            room = await sender.create_room("Async Throttled Room")
+
+            standin.server.config.message_rate, standin.server.config.message_burst = 100, 5
+            try:
+                acks = await sender.send_messages(room["room_id"], [f"m{i}" for i in range(40)], in_flight=16,
+                                                  ordered=False)
+            finally:
+                standin.server.config.message_rate = 0.0
+
+        summary = sender.rate_limiter.summary()
+        assert all(a.error is None for a in acks)
+        assert summary["throttled"] > 0
+        assert min(e["min_limit"] for e in summary["throttled_endpoints"].values()) < 16
+
+    @pytest.mark.asyncio
+    async def test_ordered_sends_survive_throttling(self, standin, config):
+        """Test the default send path keeps timeline order while 429s are being retried"""
+        async with create_http_pool() as http:
+            sender, = await provision_clients(config, http, ["ordered_sender"], "pw")
+            rooms = [(await sender.create_room(f"Ordered Room {i}"))["room_id"] for i in range(2)]
+            batches = {room_id: [f"{room_id} #{i}" for i in range(30)] for room_id in rooms}
+
+            standin.server.config.message_rate, standin.server.config.message_burst = 200, 3
+            try:
+                single = await sender.send_messages(rooms[0], [f"single #{i}" for i in range(30)], in_flight=8)
+                batched = await sender.send_message_batches(batches, in_flight=8)
+            finally:
+                standin.server.config.message_rate = 0.0
+
+            timelines = {room_id: (await sender.get_messages(room_id, limit=100, direction="f"))["chunk"]
+                         for room_id in rooms}
+
+        assert sender.rate_limiter.summary()["throttled"] > 0
+        assert all(a.error is None for a in single + [a for acks in batched.values() for a in acks])
+        bodies = {room_id: [e["content"]["body"] for e in chunk if e["type"] == "m.room.message"]
+                  for room_id, chunk in timelines.items()}
+        assert bodies[rooms[0]] == [f"single #{i}" for i in range(30)] + batches[rooms[0]]
+        assert bodies[rooms[1]] == batches[rooms[1]]
+
+    @pytest.mark.asyncio
+    async def test_injected_latency(self, standin, config):
+        """Test configured latency is applied to every response"""
+        standin.server.config.latency = 0.05
+        try:
+            async with AsyncMatrixClient(config) as client:
+                start = time.perf_counter()
+                await client.http.get(f"{config.synapse_url}/_matrix/client/versions")
+                elapsed = time.perf_counter() - start
+        finally:
+            standin.server.config.latency = 0.0
+
+        assert elapsed >= 0.05
+
+    @pytest.mark.asyncio
+    async def test_delivery_benchmark_paces_open_loop(self, standin, config):
+        """Test slow sends do not hold back later ones, so the target rate is still met"""
+        async with create_http_pool() as http:
+            sender, recipient = await provision_clients(config, http, ["pace_sender", "pace_recipient"], "pw")
+            benchmark = DeliveryBenchmark(sender, [recipient], delivery_timeout=5)
+            room_id = await benchmark.setup_room(1)
+
+            standin.server.config.latency = 0.2
+            try:
+                start = time.perf_counter()
+                metrics = await benchmark.run_case(room_id, 1, rate=50, messages=10)
+                elapsed = time.perf_counter() - start
+            finally:
+                standin.server.config.latency = 0.0
+
+        # Sent one after another the ten 200ms sends alone would take two seconds
+        assert elapsed < 1.5
+        assert (metrics['send_errors'], metrics['deliveries'], metrics['timeouts']) == (0, 10, 0)
+        assert metrics['target_rate'] == 50
+        assert metrics['achieved_rate'] > 25
+
+    @pytest.mark.asyncio
+    async def test_readiness_probe_records_timeline(self, config):
+        """Test services are probed concurrently and unreachable ones give up at the deadline"""
+        timeline = await probe_services({
+            'synapse': f"{config.synapse_url}/health",
+            'missing': 'http://127.0.0.1:9/health'
+        }, deadline=1.0, initial_delay=0.05)
+
+        assert timeline.services['synapse'].ready
+        assert timeline.services['synapse'].ready_at < 0.5
+        assert timeline.not_ready() == ['missing']
+        assert timeline.services['missing'].attempts > 1
+        assert timeline.elapsed < 1.5
+        assert [s['name'] for s in timeline.to_dict()['services']] == ['synapse', 'missing']
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+"""
+Test Runner Tooling Tests
+Offline checks of the suite scheduler and the other pieces run_tests.py is built from
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+import pytest_stream
+import run_tests
+from html_report import write_html_report
+from pytest_daemon import ping_daemon, run_on_daemon
+from pytest_stream import ResultListener
+from run_history import RunHistory, mann_whitney_u
+from suite_fingerprint import SuiteFingerprinter, local_modules
+from suite_scheduler import RESOURCE_CLASSES, SuiteJob, SuiteScheduler
+
+
+class _RecordingSuite:
+    """Fake suite runner that tracks which jobs overlap"""
+
+    def __init__(self, budget: int, duration: float = 0.05):
+        self.budget = budget
+        self.duration = duration
+        self.lock = threading.Lock()
+        self.running = []
+        self.started = []
+        self.peak_slots = 0
+        self.peak_by_class = {}
+
+    def __call__(self, job: SuiteJob):
+        with self.lock:
+            self.running.append(job)
+            self.started.append(job.name)
+            self.peak_slots = max(self.peak_slots, sum(j.cost(self.budget) for j in self.running))
+            same_class = sum(1 for j in self.running if j.resource_class == job.resource_class)
+            self.peak_by_class[job.resource_class] = max(self.peak_by_class.get(job.resource_class, 0), same_class)
+        time.sleep(self.duration)
+        with self.lock:
+            self.running.remove(job)
+        return f"{job.name} done"
+
+
+def _record_run(history: RunHistory, duration: float, suite: str = 'test_demo') -> int:
+    """Store a one-test passing run of the given duration"""
+    test = run_tests.TestResult(suite=suite, name='test_case', status='passed', duration=duration,
+                                nodeid=f"{suite}.py::test_case")
+    result = run_tests.TestSuiteResult(name=suite, total=1, passed=1, failed=0, skipped=0, errors=0,
+                                       duration=duration, tests=[test])
+    report = run_tests.TestRunReport(timestamp='2026-01-01T00:00:00', environment={}, suites=[result],
+                                     total_duration=duration, summary={})
+    return history.record_run(report)
+
+
+@pytest.fixture
+def fingerprint_project(tmp_path):
+    """Minimal project: a suite importing a helper that imports another helper, plus an unrelated module"""
+    tests = tmp_path / "tests"
+    tests.mkdir()
+    (tmp_path / "docker-compose.yml").write_text("services: {}\n")
+    (tests / "test_suite.py").write_text("import os\nfrom helper import thing\nfrom . import relative\n")
+    (tests / "helper.py").write_text("import other\nthing = 1\n")
+    (tests / "other.py").write_text("VALUE = 1\n")
+    (tests / "unrelated.py").write_text("import helper\n")
+    return tmp_path
+
+
+@pytest.fixture
+def pytest_daemon():
+    """A PytestDaemon serving from the tests directory on an ephemeral localhost port"""
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        address = f"127.0.0.1:{probe.getsockname()[1]}"
+    daemon = subprocess.Popen(
+        [sys.executable, '-c', f"from pytest_daemon import PytestDaemon; PytestDaemon('.', {address!r}).serve_forever()"],
+        cwd=Path(__file__).resolve().parent, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = time.monotonic() + 30
+        while ping_daemon(address) is None:
+            assert daemon.poll() is None and time.monotonic() < deadline, "daemon did not start"
+            time.sleep(0.1)
+        yield address
+    finally:
+        daemon.terminate()
+        daemon.wait(timeout=10)
+
+
+def _process_gone(pid: int, timeout: float = 5) -> bool:
+    """Whether pid exits (or is left a zombie) within the timeout"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            os.kill(pid, 0)
+            with open(f"/proc/{pid}/stat") as stat:
+                if stat.read().rpartition(')')[2].split()[0] == 'Z':
+                    return True
+        except (ProcessLookupError, FileNotFoundError):
+            return True
+        time.sleep(0.05)
+    return False
+
+class TestRunnerTooling:
+    """Runner helpers that do not need a running Docker stack"""
+
+    def test_scheduler_orders_longest_first(self):
+        """Test suites without history go first, then longest expected duration"""
+        jobs = [
+            SuiteJob('test_short.py', 'http', expected_duration=5.0),
+            SuiteJob('test_long.py', 'http', expected_duration=120.0),
+            SuiteJob('test_new.py', 'http'),
+            SuiteJob('test_medium.py', 'http', expected_duration=30.0)
+        ]
+        assert [j.name for j in SuiteScheduler.order(jobs)] == ['test_new', 'test_long', 'test_medium', 'test_short']
+
+        # With a budget of 1 the suites run one at a time in that order
+        suite = _RecordingSuite(budget=1, duration=0.01)
+        results = SuiteScheduler(suite, budget=1).run(jobs)
+        assert suite.started == ['test_new', 'test_long', 'test_medium', 'test_short']
+        assert suite.peak_slots == 1
+        assert results['test_long'] == "test_long done"
+
+    def test_scheduler_stays_within_budget(self):
+        """Test running suites never hold more slots than the budget"""
+        jobs = [SuiteJob(f'test_{i}.py', 'http', workers=2) for i in range(6)]
+        suite = _RecordingSuite(budget=5)
+        completed = []
+        SuiteScheduler(suite, budget=5, on_complete=lambda job, result: completed.append(job.name)).run(jobs)
+
+        assert jobs[0].cost(5) == 2
+        assert suite.peak_slots == 4  # two 2-slot suites fit in 5, a third does not
+        assert sorted(completed) == sorted(j.name for j in jobs)
+
+    def test_scheduler_caps_browser_suites(self):
+        """Test the browser resource class limits how many Playwright suites overlap"""
+        assert RESOURCE_CLASSES['browser'].max_concurrent == 2
+        jobs = [SuiteJob(f'test_browser_{i}.py', 'browser') for i in range(4)]
+        jobs += [SuiteJob(f'test_http_{i}.py', 'http') for i in range(4)]
+        suite = _RecordingSuite(budget=100)
+        results = SuiteScheduler(suite, budget=100).run(jobs)
+
+        assert len(results) == 8
+        assert suite.peak_by_class['browser'] == 2
+        assert suite.peak_by_class['http'] == 4
+
+    def test_scheduler_runs_oversized_suite_alone(self):
+        """Test a suite costing more than the whole budget still runs once nothing else is"""
+        big = SuiteJob('test_big.py', 'browser', workers=8, expected_duration=60.0)
+        small = SuiteJob('test_small.py', 'http', expected_duration=1.0)
+        assert big.cost(4) == 4
+
+        suite = _RecordingSuite(budget=4)
+        results = SuiteScheduler(suite, budget=4).run([small, big])
+
+        assert set(results) == {'test_big', 'test_small'}
+        assert suite.started == ['test_big', 'test_small']
+        assert suite.peak_slots == 4
+
+    def test_mann_whitney_u_known_values(self):
+        """Test U and the one-sided p-value against hand-computed cases"""
+        baseline = [float(v) for v in range(1, 11)]
+
+        # Every recent value above every baseline value: U = n1 * n2
+        u, p = mann_whitney_u(baseline, [11.0, 12.0, 13.0])
+        assert u == 30
+        assert p == pytest.approx(0.00712, abs=1e-4)
+
+        # Recent values spread through the baseline: U at its mean, no evidence of a slowdown
+        u, p = mann_whitney_u(baseline, [2.5, 5.5, 8.5])
+        assert u == 15
+        assert p == pytest.approx(0.5337, abs=1e-4)
+
+        # Ties share average ranks and shrink the variance
+        u, p = mann_whitney_u([1.0, 1.0, 2.0, 2.0], [2.0, 3.0])
+        assert u == 7
+        assert p == pytest.approx(0.1056, abs=1e-4)
+
+        # All values equal: no variance, so never significant
+        assert mann_whitney_u([1.0] * 10, [1.0] * 3) == (15, 1.0)
+
+    def test_detect_regressions_flags_clear_slowdown(self, tmp_path):
+        """Test three slow runs after ten steady ones are flagged for the test and the suite"""
+        with RunHistory(tmp_path / "history.sqlite") as history:
+            for i in range(10):
+                _record_run(history, 1.0 + i * 0.01)
+            for duration in (2.0, 2.1, 2.2):
+                run_id = _record_run(history, duration)
+            regressions = history.detect_regressions(run_id)
+
+        assert {(r.key, r.kind) for r in regressions} == {('test_demo.py::test_case', 'test'), ('test_demo', 'suite')}
+        regression = regressions[0]
+        assert regression.baseline_runs == 10
+        assert regression.recent_runs == 3
+        assert regression.baseline_median == pytest.approx(1.045)
+        assert regression.recent_median == 2.1
+        assert regression.p_value == pytest.approx(0.00712, abs=1e-4)
+
+    def test_detect_regressions_ignores_noise(self, tmp_path):
+        """Test recent runs inside the baseline spread are not flagged"""
+        durations = [1.0, 1.3, 0.9, 1.2, 1.1, 0.95, 1.25, 1.05, 1.15, 1.0, 1.2, 1.1, 1.3]
+        with RunHistory(tmp_path / "history.sqlite") as history:
+            for duration in durations:
+                run_id = _record_run(history, duration)
+            assert history.detect_regressions(run_id) == []
+
+    def test_detect_regressions_needs_enough_baseline(self, tmp_path):
+        """Test a slowdown with fewer than min_baseline earlier runs is not reported"""
+        with RunHistory(tmp_path / "history.sqlite") as history:
+            for i in range(5):
+                _record_run(history, 1.0 + i * 0.01)
+            for duration in (2.0, 2.1, 2.2):
+                run_id = _record_run(history, duration)
+
+            assert history.detect_regressions(run_id) == []
+            # U = 15 of 15 with n2 = 5 is p ~ 0.018, so it only shows up at a looser alpha
+            flagged = history.detect_regressions(run_id, min_baseline=5, alpha=0.05)
+            assert [r.baseline_runs for r in flagged] == [5, 5]
+            assert flagged[0].p_value == pytest.approx(0.0184, abs=1e-3)
+
+    def test_stream_sends_one_event_per_test(self, tmp_path):
+        """Test a failing call plus a broken teardown arrive as a single result"""
+        (tmp_path / "test_phases.py").write_text(
+            "import pytest\n"
+            "\n"
+            "@pytest.fixture\n"
+            "def broken_teardown():\n"
+            "    yield\n"
+            "    raise RuntimeError('teardown broke')\n"
+            "\n"
+            "def test_fails_then_teardown_breaks(broken_teardown):\n"
+            "    assert False, 'call failed'\n"
+            "\n"
+            "def test_passes_then_teardown_breaks(broken_teardown):\n"
+            "    pass\n"
+            "\n"
+            "def test_passes():\n"
+            "    pass\n"
+            "\n"
+            "@pytest.mark.skip(reason='not today')\n"
+            "def test_skipped():\n"
+            "    pass\n"
+        )
+        events = []
+        with ResultListener(events.append) as listener:
+            env = dict(os.environ, PYTHONPATH=str(Path(__file__).resolve().parent), **listener.env)
+            subprocess.run([sys.executable, '-m', 'pytest', 'test_phases.py', '-p', 'pytest_stream', '-q'],
+                           cwd=tmp_path, env=env, capture_output=True, timeout=60)
+            listener.close()
+
+        results = {e['nodeid'].split('::')[-1]: e for e in events if e['event'] == 'test'}
+        assert len(results) == len([e for e in events if e['event'] == 'test'])
+        assert {name: e['outcome'] for name, e in results.items()} == {
+            'test_fails_then_teardown_breaks': 'failed',
+            'test_passes_then_teardown_breaks': 'error',
+            'test_passes': 'passed',
+            'test_skipped': 'skipped'
+        }
+        message = results['test_fails_then_teardown_breaks']['longrepr']
+        assert 'call failed' in message and 'teardown broke' in message
+        assert [e['count'] for e in events if e['event'] == 'collected'] == [4]
+
+    def test_stream_reports_xdist_collection_once(self, monkeypatch):
+        """Test the collected count comes from the first xdist worker to finish collecting"""
+        class _Recorder:
+            def __init__(self):
+                self.events = []
+
+            def emit(self, event):
+                self.events.append(event)
+
+        recorder = _Recorder()
+        monkeypatch.setattr(pytest_stream, '_emitter', recorder)
+        monkeypatch.setattr(pytest_stream, '_collected_count', None)
+        pytest_stream.pytest_xdist_node_collection_finished(node=None, ids=['a', 'b', 'c'])
+        pytest_stream.pytest_xdist_node_collection_finished(node=None, ids=['a', 'b', 'c'])
+        assert recorder.events == [{'event': 'collected', 'count': 3}]
+
+    def test_html_report_renders_large_runs_escaped(self, tmp_path):
+        """Test a few thousand results render with every suite present and test output escaped"""
+        suites = []
+        for s in range(4):
+            name = f"test_suite_{s}"
+            tests = [
+                run_tests.TestResult(
+                    suite=name, name=f"test_case_{i}[<script>alert({i})</script>]",
+                    status='failed' if i % 100 == 0 else 'passed', duration=i / 1000,
+                    message="expected <b>ok</b> & got \"nothing\"" if i % 100 == 0 else None,
+                    nodeid=f"{name}.py::test_case_{i}"
+                )
+                for i in range(1000)
+            ]
+            failed = sum(1 for t in tests if t.status == 'failed')
+            suites.append(run_tests.TestSuiteResult(
+                name=name, total=len(tests), passed=len(tests) - failed, failed=failed, skipped=0,
+                errors=0, duration=1.0, tests=tests
+            ))
+        report = run_tests.TestRunReport(
+            timestamp='2026-01-01T00:00:00', environment={'platform': 'linux'}, suites=suites,
+            total_duration=4.0, summary={'total_suites': 4, 'total_tests': 4000, 'total_passed': 3960,
+                                         'total_failed': 40, 'total_skipped': 0, 'total_errors': 0}
+        )
+        history = {f"test_suite_0.py::test_case_{i}": [0.1, 0.2, 0.15] for i in range(1000)}
+
+        output = tmp_path / "report.html"
+        write_html_report(report, output, test_history=history)
+        html = output.read_text(encoding='utf-8')
+
+        for suite in suites:
+            assert f"{suite.name} - {suite.passed}/{suite.total} passed" in html
+        assert html.count('<td data-value="test_case_') == 4000
+        assert "<script>alert(" not in html
+        assert "test_case_999[&lt;script&gt;alert(999)&lt;/script&gt;]" in html
+        assert "<b>ok</b>" not in html
+        assert html.count("expected &lt;b&gt;ok&lt;/b&gt; &amp; got &#34;nothing&#34;") == 40
+        assert html.count('<polyline class="spark"') == 1000
+
+    def test_only_streamed_passes_are_cacheable(self, tmp_path, monkeypatch):
+        """Test a suite is fingerprinted for reuse only when its results streamed and pytest exited 0"""
+        (tmp_path / "test_streamed.py").write_text("def test_ok():\n    pass\n")
+        runner = run_tests.TestRunner()
+        runner.config['parallel_workers'] = 1
+        job = SuiteJob(str(tmp_path / "test_streamed.py"), 'http', fingerprint='abc123')
+
+        streamed = runner._run_job(job)
+        assert (streamed.passed, streamed.cacheable, streamed.fingerprint) == (1, True, 'abc123')
+
+        # Nothing streamed, so the result comes from parsing pytest's summary line
+        monkeypatch.setattr(runner, '_run_pytest_process', lambda args, env, timeout: (0, "1 passed in 0.01s", False))
+        parsed = runner._run_job(job)
+        assert (parsed.passed, parsed.cacheable, parsed.fingerprint) == (1, False, None)
+
+    def test_stack_images_inspected_once_per_run(self, tmp_path, monkeypatch):
+        """Test fingerprinting and history share a single docker inspection"""
+        calls = []
+        monkeypatch.setattr(run_tests, 'stack_images', lambda: calls.append(1) or {'synapse': 'sha256:aaa'})
+        runner = run_tests.TestRunner()
+        runner.config['output_dir'] = str(tmp_path)
+
+        jobs = runner.plan_suites(["test_runner_tooling.py"])
+        assert jobs and jobs[0].fingerprint
+        runner.record_history(run_tests.TestRunReport(timestamp='2026-01-01T00:00:00', environment={}, suites=[],
+                                                      total_duration=0.0, summary={}))
+
+        assert len(calls) == 1
+        with RunHistory(runner.history_path()) as history:
+            assert history.runs(1)[0]['images'] == {'synapse': 'sha256:aaa'}
+
+    def test_daemon_runs_suite_and_streams_results(self, pytest_daemon, tmp_path):
+        """Test a suite run on the daemon reports its exit code and streams every result"""
+        (tmp_path / "test_trivial.py").write_text(
+            "def test_passes():\n"
+            "    pass\n"
+            "\n"
+            "def test_fails():\n"
+            "    assert False\n"
+        )
+        events = []
+        with ResultListener(events.append) as listener:
+            exitcode, output, timed_out = run_on_daemon(
+                pytest_daemon, [str(tmp_path / "test_trivial.py"), '-p', 'pytest_stream', '-q'], listener.env, 60)
+            listener.close()
+
+        assert (exitcode, timed_out) == (1, False)
+        assert "1 failed, 1 passed" in output
+        assert [e['count'] for e in events if e['event'] == 'collected'] == [2]
+        assert {e['nodeid'].split('::')[-1]: e['outcome'] for e in events if e['event'] == 'test'} == {
+            'test_passes': 'passed',
+            'test_fails': 'failed'
+        }
+
+    @pytest.mark.skipif(not hasattr(os, 'killpg'), reason="process groups are POSIX only")
+    def test_daemon_timeout_kills_process_group(self, pytest_daemon, tmp_path):
+        """Test a timed-out suite is killed along with the processes it started"""
+        pid_file = tmp_path / "grandchild.pid"
+        (tmp_path / "test_hangs.py").write_text(
+            "import subprocess, sys, time\n"
+            "\n"
+            "def test_hangs():\n"
+            "    worker = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(300)'])\n"
+            f"    open({str(pid_file)!r}, 'w').write(str(worker.pid))\n"
+            "    time.sleep(300)\n"
+        )
+        started = time.monotonic()
+        exitcode, output, timed_out = run_on_daemon(pytest_daemon, [str(tmp_path / "test_hangs.py"), '-q'], {}, 5)
+
+        assert (exitcode, output, timed_out) == (-9, '', True)
+        assert time.monotonic() - started < 10
+        assert _process_gone(int(pid_file.read_text()))
+        deadline = time.monotonic() + 5
+        while ping_daemon(pytest_daemon)['running'] and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert ping_daemon(pytest_daemon)['running'] == []
+
+    def test_fingerprint_walks_local_imports(self, fingerprint_project):
+        """Test the AST walk finds the suite's repository modules transitively and nothing else"""
+        tests = fingerprint_project / "tests"
+        found = local_modules(tests / "test_suite.py", [tests, fingerprint_project])
+        assert {path.name for path in found} == {"test_suite.py", "helper.py", "other.py"}
+
+    def test_fingerprint_tracks_every_input(self, fingerprint_project):
+        """Test helper edits, env, images, workers and the config file change the fingerprint"""
+        tests = fingerprint_project / "tests"
+        config_file = fingerprint_project / "test_config.yaml"
+        config_file.write_text("parallel_workers: 2\n")
+        env = {'SYNAPSE_URL': 'http://localhost:8008', 'TEST_USER_PASSWORD': 'secret'}
+
+        def fingerprint(env=env, images=None, workers=2):
+            fingerprinter = SuiteFingerprinter(tests, fingerprint_project, images=images or {'synapse': 'sha256:aaa'},
+                                               config_file=config_file)
+            return fingerprinter.fingerprint("test_suite.py", ["-m", "not slow"], env, workers=workers)
+
+        base = fingerprint()
+        assert fingerprint() == base
+
+        inputs = SuiteFingerprinter(tests, fingerprint_project, images={}).inputs("test_suite.py", [], env)
+        assert 'secret' not in inputs.values()
+        assert set(inputs) >= {"file:tests/helper.py", "file:tests/other.py", "file:docker-compose.yml",
+                               "env:TEST_USER_PASSWORD", "args", "workers"}
+
+        assert fingerprint(env=dict(env, SYNAPSE_URL='http://other:8008')) != base
+        assert fingerprint(env=dict(env, UNRELATED='x')) == base
+        assert fingerprint(images={'synapse': 'sha256:bbb'}) != base
+        assert fingerprint(workers=4) != base
+
+        (tests / "unrelated.py").write_text("import helper\nCHANGED = True\n")
+        assert fingerprint() == base
+
+        (tests / "other.py").write_text("VALUE = 2\n")
+        edited_helper = fingerprint()
+        assert edited_helper != base
+
+        config_file.write_text("parallel_workers: 4\n")
+        assert fingerprint() != edited_helper
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -10,10 +10,21 @@ import json
 import time
 import os
 import tempfile
-from typing import Dict, Any, Optional
+import hashlib
+from typing import Dict, Any, Optional, Tuple, Union, Iterable, BinaryIO
 from dataclasses import dataclass
 from pathlib import Path
+from urllib.parse import quote
 import mimetypes
+from concurrent.futures import ThreadPoolExecutor
+
+from matrix_common import (
+    TransactionIdAllocator, HashingReader, MediaDigest, parse_mxc_url, MEDIA_CHUNK_SIZE
+)
+from rate_limit import RateLimitController, endpoint_key
+from room_history import RoomHistory
+from session_cache import SessionCache, CachedSession
+from sync_watcher import SyncWatcher
 
 
 @dataclass
@@ -34,6 +45,9 @@ class MatrixClient:
         self.session = requests.Session()
         self.access_token: Optional[str] = None
         self.user_id: Optional[str] = None
+        self.device_id: Optional[str] = None
+        self.txn_ids = TransactionIdAllocator()
+        self.rate_limiter = RateLimitController()
         
     def _api_url(self, endpoint: str) -> str:
         """Build full API URL"""
@@ -42,6 +56,14 @@ class MatrixClient:
     def _admin_api_url(self, endpoint: str) -> str:
         """Build full admin API URL"""
         return f"{self.config.synapse_url}/_synapse/admin{endpoint}"
+    
+    def _request(self, method: str, url: str, retry: bool = True, **kwargs) -> requests.Response:
+        """Send a request through the rate-limit controller, which retries 429s after retry_after_ms"""
+        return self.rate_limiter.call(
+            endpoint_key(method, url),
+            lambda: self.session.request(method, url, **kwargs),
+            retry=retry
+        )
         
     def register_user(self, username: str, password: str, admin: bool = False) -> Dict[str, Any]:
         """Register a new user using registration shared secret"""
@@ -49,7 +71,7 @@ class MatrixClient:
         import hashlib
         
         # Get nonce
-        nonce_resp = self.session.get(self._api_url("/client/r0/admin/register"))
+        nonce_resp = self._request("GET", self._api_url("/client/r0/admin/register"))
         nonce_resp.raise_for_status()
         nonce = nonce_resp.json()["nonce"]
         
@@ -75,7 +97,7 @@ class MatrixClient:
             "mac": mac.hexdigest()
         }
         
-        resp = self.session.post(self._api_url("/client/r0/admin/register"), json=data)
+        resp = self._request("POST", self._api_url("/client/r0/admin/register"), json=data)
         resp.raise_for_status()
         return resp.json()
     
@@ -87,19 +109,34 @@ class MatrixClient:
             "password": password
         }
         
-        resp = self.session.post(self._api_url("/client/r0/login"), json=data)
+        resp = self._request("POST", self._api_url("/client/r0/login"), json=data)
         resp.raise_for_status()
         
         result = resp.json()
         self.access_token = result["access_token"]
         self.user_id = result["user_id"]
+        self.device_id = result.get("device_id")
         
         # Set authorization header for future requests
         self.session.headers.update({"Authorization": f"Bearer {self.access_token}"})
         
         return result
     
-    def create_room(self, name: str, topic: str = None, public: bool = False) -> Dict[str, Any]:
+    def restore_session(self, session: CachedSession):
+        """Use cached credentials instead of logging in"""
+        self.access_token = session.access_token
+        self.user_id = session.user_id
+        self.device_id = session.device_id
+        self.session.headers.update({"Authorization": f"Bearer {self.access_token}"})
+    
+    def whoami(self) -> Dict[str, Any]:
+        """Return the user_id (and device_id) the access token belongs to"""
+        resp = self._request("GET", self._api_url("/client/r0/account/whoami"))
+        resp.raise_for_status()
+        return resp.json()
+    
+    def create_room(self, name: str, topic: str = None, public: bool = False,
+                    invite: Optional[Iterable[str]] = None) -> Dict[str, Any]:
         """Create a new room"""
         data = {
             "name": name,
@@ -109,71 +146,165 @@ class MatrixClient:
         
         if topic:
             data["topic"] = topic
+        if invite:
+            data["invite"] = list(invite)
             
-        resp = self.session.post(self._api_url("/client/r0/createRoom"), json=data)
+        resp = self._request("POST", self._api_url("/client/r0/createRoom"), json=data)
+        resp.raise_for_status()
+        return resp.json()
+    
+    def invite_user(self, room_id: str, user_id: str) -> Dict[str, Any]:
+        """Invite a user to a room"""
+        resp = self._request(
+            "POST",
+            self._api_url(f"/client/r0/rooms/{room_id}/invite"),
+            json={"user_id": user_id}
+        )
+        resp.raise_for_status()
+        return resp.json()
+    
+    def join_room(self, room_id_or_alias: str) -> Dict[str, Any]:
+        """Join a room by ID or alias"""
+        resp = self._request(
+            "POST",
+            self._api_url(f"/client/r0/join/{quote(room_id_or_alias, safe='!:@')}"),
+            json={}
+        )
+        resp.raise_for_status()
+        return resp.json()
+    
+    def set_presence(self, presence: str, status_msg: Optional[str] = None) -> None:
+        """Set this user's presence (online, unavailable or offline)"""
+        data = {"presence": presence}
+        if status_msg is not None:
+            data["status_msg"] = status_msg
+        
+        resp = self._request(
+            "PUT",
+            self._api_url(f"/client/r0/presence/{self.user_id}/status"),
+            json=data
+        )
+        resp.raise_for_status()
+    
+    def sync(self, since: Optional[str] = None, timeout_ms: int = 0,
+             sync_filter: Optional[Union[str, Dict[str, Any]]] = None,
+             set_presence: Optional[str] = None) -> Dict[str, Any]:
+        """Run a single /sync request (use sync_watcher() to wait for events)"""
+        params: Dict[str, Any] = {"timeout": timeout_ms}
+        if since:
+            params["since"] = since
+        if sync_filter is not None:
+            params["filter"] = sync_filter if isinstance(sync_filter, str) else json.dumps(sync_filter)
+        if set_presence:
+            params["set_presence"] = set_presence
+        
+        resp = self._request(
+            "GET",
+            self._api_url("/client/r0/sync"),
+            params=params,
+            timeout=timeout_ms / 1000 + 30
+        )
         resp.raise_for_status()
         return resp.json()
     
     def send_message(self, room_id: str, message: str, msg_type: str = "m.text") -> Dict[str, Any]:
         """Send message to room"""
-        txn_id = int(time.time() * 1000)
+        txn_id = self.txn_ids.next_id()
         
         data = {
             "msgtype": msg_type,
             "body": message
         }
         
-        resp = self.session.put(
+        resp = self._request(
+            "PUT",
             self._api_url(f"/client/r0/rooms/{room_id}/send/m.room.message/{txn_id}"),
             json=data
         )
         resp.raise_for_status()
         return resp.json()
     
-    def get_messages(self, room_id: str, limit: int = 10) -> Dict[str, Any]:
-        """Get messages from room"""
-        params = {"limit": limit, "dir": "b"}
-        resp = self.session.get(
+    def sync_watcher(self, timeout_ms: int = 5000, sync_filter: Optional[Dict[str, Any]] = None) -> SyncWatcher:
+        """Create a /sync watcher for this client (use as a context manager)"""
+        return SyncWatcher(self, timeout_ms=timeout_ms, sync_filter=sync_filter)
+    
+    def get_messages(self, room_id: str, limit: int = 10, from_token: Optional[str] = None,
+                     direction: str = "b", message_filter: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Get one page of messages from room; pass the response's "end" as from_token for the next"""
+        params = {"limit": limit, "dir": direction}
+        if from_token:
+            params["from"] = from_token
+        if message_filter:
+            params["filter"] = json.dumps(message_filter)
+        resp = self._request(
+            "GET",
             self._api_url(f"/client/r0/rooms/{room_id}/messages"),
             params=params
         )
         resp.raise_for_status()
         return resp.json()
     
+    def history(self, room_id: str, **kwargs) -> RoomHistory:
+        """Iterate the room's timeline across pages (see RoomHistory for options)"""
+        return RoomHistory(self, room_id, **kwargs)
+    
     def upload_media(self, file_path: str) -> Dict[str, Any]:
         """Upload media file"""
-        with open(file_path, 'rb') as f:
-            content = f.read()
-            
         content_type = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
         filename = Path(file_path).name
         
-        resp = self.session.post(
+        with open(file_path, 'rb') as f:
+            result, _ = self.upload_media_stream(f, content_type, filename)
+        return result
+    
+    def upload_media_stream(self, source: Union[BinaryIO, Iterable[bytes]], content_type: str,
+                            filename: str, size: Optional[int] = None) -> Tuple[Dict[str, Any], MediaDigest]:
+        """Stream media from a file object or chunk generator, hashing as it is sent"""
+        reader = HashingReader(source, size=size)
+        
+        # A streamed body cannot be replayed, so a 429 is reported rather than retried
+        resp = self._request(
+            "POST",
             self._api_url("/media/r0/upload"),
-            data=content,
+            retry=False,
+            data=reader,
             headers={"Content-Type": content_type},
             params={"filename": filename}
         )
         resp.raise_for_status()
-        return resp.json()
+        return resp.json(), reader.digest
     
     def download_media(self, mxc_url: str) -> bytes:
         """Download media from MXC URL"""
-        # Parse mxc://server/media_id
-        if not mxc_url.startswith("mxc://"):
-            raise ValueError("Invalid MXC URL")
-            
-        parts = mxc_url[6:].split("/", 1)
-        if len(parts) != 2:
-            raise ValueError("Invalid MXC URL format")
-            
-        server_name, media_id = parts
+        server_name, media_id = parse_mxc_url(mxc_url)
         
-        resp = self.session.get(
+        resp = self._request(
+            "GET",
             self._api_url(f"/media/r0/download/{server_name}/{media_id}")
         )
         resp.raise_for_status()
         return resp.content
+    
+    def download_media_to(self, mxc_url: str, sink: Optional[BinaryIO] = None,
+                          chunk_size: int = MEDIA_CHUNK_SIZE) -> MediaDigest:
+        """Stream media into sink (or discard it), returning its digest"""
+        server_name, media_id = parse_mxc_url(mxc_url)
+        sha256 = hashlib.sha256()
+        size = 0
+        
+        with self._request(
+            "GET",
+            self._api_url(f"/media/r0/download/{server_name}/{media_id}"),
+            stream=True
+        ) as resp:
+            resp.raise_for_status()
+            for chunk in resp.iter_content(chunk_size=chunk_size):
+                sha256.update(chunk)
+                size += len(chunk)
+                if sink is not None:
+                    sink.write(chunk)
+        
+        return MediaDigest(sha256=sha256.hexdigest(), size=size)
 
 
 class TestMatrixSynapse:
@@ -185,24 +316,30 @@ class TestMatrixSynapse:
         return TestConfig()
     
     @pytest.fixture(scope="class")
-    def admin_client(self, config):
+    def session_cache(self):
+        """Access tokens shared across runs and xdist workers"""
+        return SessionCache()
+    
+    @pytest.fixture(scope="class")
+    def admin_client(self, config, session_cache):
         """Admin client for user management"""
         client = MatrixClient(config)
         
-        # Register admin user for testing
+        # Reuse a cached token; register the admin user only if login fails
         try:
-            admin_user = client.register_user("test_admin", config.test_user_password, admin=True)
-            client.login("test_admin", config.test_user_password)
+            client.restore_session(session_cache.ensure_session(
+                config.synapse_url, "test_admin", config.test_user_password))
         except requests.HTTPError as e:
-            if e.response.status_code == 400:  # User might already exist
-                client.login("test_admin", config.test_user_password)
-            else:
+            if e.response.status_code != 403:  # User does not exist yet
                 raise
+            client.register_user("test_admin", config.test_user_password, admin=True)
+            client.restore_session(session_cache.ensure_session(
+                config.synapse_url, "test_admin", config.test_user_password))
                 
         return client
     
     @pytest.fixture(scope="class")
-    def user_clients(self, config):
+    def user_clients(self, config, session_cache):
         """Create test user clients"""
         clients = []
         usernames = ["alice", "bob"]
@@ -210,15 +347,16 @@ class TestMatrixSynapse:
         for username in usernames:
             client = MatrixClient(config)
             
-            # Register user
+            # Reuse a cached token; register the user only if login fails
             try:
-                client.register_user(f"test_{username}", config.test_user_password)
-                client.login(f"test_{username}", config.test_user_password)
+                client.restore_session(session_cache.ensure_session(
+                    config.synapse_url, f"test_{username}", config.test_user_password))
             except requests.HTTPError as e:
-                if e.response.status_code == 400:  # User might already exist
-                    client.login(f"test_{username}", config.test_user_password)
-                else:
+                if e.response.status_code != 403:  # User does not exist yet
                     raise
+                client.register_user(f"test_{username}", config.test_user_password)
+                client.restore_session(session_cache.ensure_session(
+                    config.synapse_url, f"test_{username}", config.test_user_password))
                     
             clients.append(client)
             
@@ -294,13 +432,18 @@ class TestMatrixSynapse:
         resp = bob.session.post(bob._api_url(f"/client/r0/rooms/{room_id}/join"))
         assert resp.status_code == 200
         
-        # Alice sends message
-        test_message = "Hello from Alice!"
-        msg_response = alice.send_message(room_id, test_message)
-        assert "event_id" in msg_response
-        
-        # Wait a moment for message to propagate
-        time.sleep(1)
+        with bob.sync_watcher() as watcher:
+            # Alice sends message
+            test_message = "Hello from Alice!"
+            sent_at = time.time()
+            msg_response = alice.send_message(room_id, test_message)
+            assert "event_id" in msg_response
+            
+            # Wait for the message to reach Bob's /sync
+            sighting = watcher.wait_for_event(msg_response["event_id"], timeout=10, sent_at=sent_at)
+            assert sighting.room_id == room_id
+            assert sighting.event["content"]["body"] == test_message
+            assert sighting.latency is not None
         
         # Bob retrieves messages
         messages = bob.get_messages(room_id, limit=5)
@@ -316,6 +459,39 @@ class TestMatrixSynapse:
                 
         assert found_message, "Test message not found in room history"
     
+    def test_rapid_message_sends_not_deduplicated(self, user_clients):
+        """Test concurrent sends from one client in the same millisecond get distinct events"""
+        alice = user_clients[0]
+        
+        room = alice.create_room("Rapid Send Test Room")
+        room_id = room["room_id"]
+        
+        # Several threads share the client, so transaction IDs are allocated in the same millisecond
+        messages = [f"Rapid message {i}" for i in range(40)]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            event_ids = [r["event_id"] for r in pool.map(lambda m: alice.send_message(room_id, m), messages)]
+        
+        assert len(set(event_ids)) == len(event_ids)
+        bodies = [e["content"]["body"] for e in alice.history(room_id, page_size=50)
+                  if e.get("type") == "m.room.message"]
+        assert sorted(bodies) == sorted(messages)
+    
+    def test_room_history_pagination(self, user_clients):
+        """Test history iteration follows /messages tokens past the first page"""
+        alice = user_clients[0]
+        
+        room = alice.create_room("History Test Room")
+        room_id = room["room_id"]
+        
+        for i in range(30):
+            alice.send_message(room_id, f"History message {i}")
+        
+        history = alice.history(room_id, page_size=10)
+        bodies = [e["content"]["body"] for e in history if e.get("type") == "m.room.message"]
+        
+        assert bodies == [f"History message {i}" for i in reversed(range(30))]
+        assert history.stats.pages > 3
+    
     def test_media_upload_download(self, user_clients):
         """Test media upload and download"""
         alice = user_clients[0]
@@ -327,20 +503,43 @@ class TestMatrixSynapse:
         
         try:
             # Upload media
-            upload_result = alice.upload_media(temp_file)
+            with open(temp_file, 'rb') as f:
+                upload_result, uploaded = alice.upload_media_stream(f, "text/plain", Path(temp_file).name)
             assert "content_uri" in upload_result
+            assert uploaded == MediaDigest.of_file(temp_file)
             
             mxc_url = upload_result["content_uri"]
             assert mxc_url.startswith("mxc://")
             
             # Download media
-            downloaded_content = alice.download_media(mxc_url)
-            assert b"This is a test file for media upload" in downloaded_content
+            downloaded = alice.download_media_to(mxc_url)
+            assert downloaded == uploaded
             
         finally:
             # Cleanup
             os.unlink(temp_file)
     
+    def test_streamed_media_round_trip(self, user_clients):
+        """Test generator upload and streamed download compare by digest"""
+        alice = user_clients[0]
+        
+        chunk = os.urandom(64 * 1024)
+        chunk_count = 32
+        
+        upload_result, uploaded = alice.upload_media_stream(
+            (chunk for _ in range(chunk_count)),
+            "application/octet-stream",
+            "streamed.bin",
+            size=len(chunk) * chunk_count
+        )
+        assert uploaded.size == len(chunk) * chunk_count
+        
+        with tempfile.TemporaryFile() as sink:
+            downloaded = alice.download_media_to(upload_result["content_uri"], sink)
+            assert sink.tell() == uploaded.size
+        
+        assert downloaded == uploaded
+    
     def test_room_media_sharing(self, user_clients):
         """Test media sharing in rooms"""
         alice, bob = user_clients
@@ -364,7 +563,7 @@ class TestMatrixSynapse:
             mxc_url = upload_result["content_uri"]
             
             # Send media message
-            txn_id = int(time.time() * 1000)
+            txn_id = alice.txn_ids.next_id()
             media_message = {
                 "msgtype": "m.file",
                 "body": "test_file.txt",
@@ -382,8 +581,8 @@ class TestMatrixSynapse:
             assert resp.status_code == 200
             
             # Bob can download the shared media
-            downloaded_content = bob.download_media(mxc_url)
-            assert b"Shared test file content" in downloaded_content
+            downloaded = bob.download_media_to(mxc_url)
+            assert downloaded == MediaDigest.of_file(temp_file)
             
         finally:
             os.unlink(temp_file)
@@ -450,6 +649,26 @@ class TestMatrixSynapse:
         assert topic_event is not None
         assert topic_event["content"]["topic"] == "Updated room topic"
 
+    @pytest.mark.asyncio
+    async def test_async_client_shared_pool(self, config, user_clients):
+        """Test async clients sharing one connection pool"""
+        import asyncio
+        from async_matrix_client import AsyncMatrixClient, create_http_pool
+
+        async with create_http_pool() as http:
+            clients = [AsyncMatrixClient(config, http=http) for _ in user_clients]
+            await asyncio.gather(*(
+                client.login(sync_client.user_id, config.test_user_password)
+                for client, sync_client in zip(clients, user_clients)
+            ))
+
+            rooms = await asyncio.gather(*(
+                client.create_room(f"Async Pool Room {i}") for i, client in enumerate(clients)
+            ))
+
+        assert all(client.access_token for client in clients)
+        assert len({room["room_id"] for room in rooms}) == len(clients)
+
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
\ No newline at end of file